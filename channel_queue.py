@@ -0,0 +1,72 @@
+import asyncio
+from collections import deque
+
+SHED_POLICIES = ("drop_oldest", "reject")
+
+
+class ChannelQueue:
+    """채널별 작업 대기열 (채널 안에서는 한 번에 하나씩, 순서대로 처리)
+
+    처리 중에 들어온 메시지는 모아 두었다가 다음 차례에 한 번에 handler로 넘긴다.
+    그래서 여러 사람이 연달아 보낸 메시지도 API 호출 한 번으로 답한다.
+    대기 중인 메시지가 max_depth를 넘으면 shed_policy에 따라
+    가장 오래된 대기 메시지를 버리거나(drop_oldest) 새 메시지를 받지 않는다(reject).
+    """
+
+    def __init__(self, handler, max_depth=10, shed_policy="drop_oldest"):
+        if shed_policy not in SHED_POLICIES:
+            raise ValueError(f"지원하지 않는 shed_policy: {shed_policy} ({', '.join(SHED_POLICIES)})")
+        self.handler = handler  # async def handler(channel_id, items)
+        self.max_depth = max_depth
+        self.shed_policy = shed_policy
+        self.pending = {}  # 채널 ID -> deque (처리를 기다리는 항목)
+        self.workers = {}  # 채널 ID -> 처리 중인 Task
+        self.stats = {
+            "submitted": 0,  # 받은 항목 수
+            "batches": 0,  # handler 호출 수
+            "coalesced": 0,  # 다른 항목과 합쳐서 처리된 항목 수
+            "shed": 0,  # 대기열이 가득 차서 버린 항목 수
+            "max_depth": 0  # 채널 하나의 최대 대기 항목 수
+        }
+
+    def depth(self, channel_id=None):
+        """대기 중인 항목 수 (channel_id가 없으면 전체)"""
+        if channel_id is not None:
+            return len(self.pending.get(channel_id, ()))
+        return sum(len(queue) for queue in self.pending.values())
+
+    def submit(self, channel_id, item):
+        """항목 추가 (대기열이 가득 차서 받지 않았으면 False)"""
+        queue = self.pending.setdefault(channel_id, deque())
+        if len(queue) >= self.max_depth:
+            self.stats["shed"] += 1
+            if self.shed_policy == "reject":
+                return False
+            queue.popleft()
+        queue.append(item)
+        self.stats["submitted"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(queue))
+
+        if channel_id not in self.workers:
+            self.workers[channel_id] = asyncio.ensure_future(self._run(channel_id))
+        return True
+
+    async def _run(self, channel_id):
+        try:
+            while self.pending.get(channel_id):
+                items = list(self.pending.pop(channel_id))
+                self.stats["batches"] += 1
+                if len(items) > 1:
+                    self.stats["coalesced"] += len(items)
+                try:
+                    await self.handler(channel_id, items)
+                except Exception as e:
+                    # 한 번 실패해도 이 채널의 다음 메시지는 계속 처리
+                    print(f"채널 {channel_id} 작업 처리 중 오류: {e}")
+        finally:
+            del self.workers[channel_id]
+
+    async def join(self):
+        """진행 중인 작업이 모두 끝날 때까지 대기 (종료/테스트용)"""
+        while self.workers:
+            await asyncio.gather(*self.workers.values(), return_exceptions=True)
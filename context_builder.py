@@ -0,0 +1,107 @@
+from functools import lru_cache
+
+
+def estimate_tokens(text):
+    """토큰 수 추정 (영문/숫자는 약 4자당 1토큰, 한글/한자 등은 약 1자당 1토큰)"""
+    if not isinstance(text, str):
+        text = str(text)
+    ascii_count = len(text.encode("ascii", "ignore"))
+    return ascii_count // 4 + (len(text) - ascii_count) + 1
+
+
+@lru_cache(maxsize=64)
+def estimate_prompt_tokens(prompt):
+    """시스템 프롬프트처럼 자주 반복되는 긴 텍스트의 토큰 수 (결과 캐시)"""
+    return estimate_tokens(prompt)
+
+
+def message_tokens(message):
+    """메시지 하나의 토큰 수 추정 (역할 구분 등 부가 토큰 포함)"""
+    return estimate_tokens(message.get("content", "")) + 4
+
+
+def merge_consecutive(messages):
+    """같은 역할의 메시지가 연속되면 하나로 합침 (user/assistant 교대 유지)"""
+    merged = []
+    for message in messages:
+        if merged and merged[-1]["role"] == message["role"]:
+            merged[-1] = {
+                "role": message["role"],
+                "content": f"{merged[-1]['content']}\n\n{message['content']}"
+            }
+        else:
+            merged.append(message)
+    return merged
+
+
+def build_messages(permanent, permanent_tokens, recent, recent_tokens, budget):
+    """입력 토큰 한도에 맞춰 API에 보낼 메시지 목록 구성
+
+    고정 대화는 항상 포함하고, 최근 대화는 최신 메시지부터 한도 안에서 채운다.
+    가장 최근 메시지(방금 받은 질문)는 한도를 넘더라도 항상 포함한다.
+    반환값: (메시지 목록, 추정 토큰 수, 제외된 최근 메시지 수)
+    """
+    remaining = budget - permanent_tokens
+    kept = []
+    used = 0
+    for message, tokens in zip(reversed(recent), reversed(recent_tokens)):
+        if kept and used + tokens > remaining:
+            break
+        kept.append(message)
+        used += tokens
+    kept.reverse()
+
+    # 고정 대화 다음에 오는 첫 메시지의 역할이 교대 순서에 맞도록 앞쪽을 정리
+    expected_role = "assistant" if permanent and permanent[-1]["role"] == "user" else "user"
+    while len(kept) > 1 and kept[0]["role"] != expected_role:
+        used -= recent_tokens[len(recent) - len(kept)]
+        kept.pop(0)
+
+    messages = merge_consecutive(list(permanent) + kept)
+    return messages, permanent_tokens + used, len(recent) - len(kept)
+
+
+def cacheable_system(prompt):
+    """시스템 프롬프트를 프롬프트 캐시 대상 블록으로 변환"""
+    return [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+def add_cache_breakpoint(messages, index):
+    """index번째 메시지까지를 프롬프트 캐시 대상으로 표시 (원본 메시지는 바꾸지 않음)"""
+    if index < 0 or index >= len(messages):
+        return messages
+    message = messages[index]
+    content = message["content"]
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = [dict(block) for block in content]
+    blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    messages = list(messages)
+    messages[index] = {"role": message["role"], "content": blocks}
+    return messages
+
+
+def message_text(message):
+    """메시지의 텍스트 내용 (블록 목록이면 텍스트 블록만 이어 붙임)"""
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    return "\n".join(block.get("text", "") for block in content if block.get("type") == "text")
+
+
+def append_reference(messages, text):
+    """마지막 메시지 뒤에 참고 자료 텍스트 블록 추가 (원본 메시지는 바꾸지 않음)
+
+    시스템 프롬프트와 고정 대화는 그대로 두므로 프롬프트 캐시 접두사가 유지된다.
+    """
+    message = messages[-1]
+    content = message["content"]
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = [dict(block) for block in content]
+    blocks.append({"type": "text", "text": text})
+    messages = list(messages)
+    messages[-1] = {"role": message["role"], "content": blocks}
+    return messages
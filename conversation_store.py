@@ -0,0 +1,211 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+
+from context_builder import message_tokens
+from response_cache import digest
+
+
+class ChannelContext:
+    """채널 하나의 대화 상태 (설정 + 고정 대화 + 최근 대화)"""
+    __slots__ = (
+        "channel_id", "system_prompt", "permanent_history", "recent_history",
+        "temperature", "max_tokens", "max_input_tokens", "faq_threshold", "is_active", "last_used", "size",
+        "recent_tokens", "_permanent_tokens", "_permanent_source", "_permanent_digest", "_permanent_digest_source"
+    )
+
+    def __init__(self, channel_id, system_prompt=None, permanent_history=None, recent_history=(),
+                 temperature=0.7, max_tokens=4000, is_active=True, history_limit=20, max_input_tokens=None,
+                 faq_threshold=None):
+        self.channel_id = channel_id
+        self.system_prompt = system_prompt  # None이면 전역 매뉴얼 사용
+        self.permanent_history = permanent_history or []
+        # 최근 대화는 고정 크기 링 버퍼 (오래된 메시지는 자동으로 밀려남)
+        self.recent_history = deque(recent_history, maxlen=history_limit)
+        # 최근 대화 메시지별 토큰 수 (매 호출마다 다시 세지 않도록 함께 보관)
+        self.recent_tokens = deque(
+            (message_tokens(message) for message in self.recent_history), maxlen=history_limit
+        )
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.max_input_tokens = max_input_tokens  # None이면 기본 입력 토큰 한도 사용
+        self.faq_threshold = faq_threshold  # None이면 기본 FAQ 임계값 사용, 0이면 FAQ 바로 답변 끔
+        self._permanent_tokens = 0
+        self._permanent_source = None
+        self._permanent_digest = None
+        self._permanent_digest_source = None
+        self.is_active = is_active
+        self.last_used = time.monotonic()
+        self.size = 0  # 메모리 사용량 (ConversationStore가 추가/밀려남/초기화 때 차이만큼 갱신)
+
+    def permanent_token_count(self):
+        """고정 대화 토큰 수 (고정 대화가 바뀌었을 때만 다시 계산)"""
+        if self._permanent_source is not self.permanent_history:
+            self._permanent_tokens = sum(message_tokens(message) for message in self.permanent_history)
+            self._permanent_source = self.permanent_history
+        return self._permanent_tokens
+
+    def permanent_digest(self):
+        """고정 대화 해시 (응답 캐시 키용, 고정 대화가 바뀌었을 때만 다시 계산)"""
+        if self._permanent_digest_source is not self.permanent_history:
+            self._permanent_digest = digest(self.permanent_history)
+            self._permanent_digest_source = self.permanent_history
+        return self._permanent_digest
+
+    def estimate_size(self):
+        """대화 내용 기준 대략적인 메모리 사용량 (글자 수, 처음부터 다시 계산: 설정 변경/일관성 확인용)"""
+        size = len(self.system_prompt or "")
+        for message in self.permanent_history:
+            size += len(str(message.get("content", "")))
+        for message in self.recent_history:
+            size += len(message["content"])
+        return size
+
+
+class ConversationStore:
+    """채널 컨텍스트를 처음 사용할 때 DB에서 불러오고, LRU/TTL/메모리 한도 기준으로 내보냄
+
+    내보낸 채널의 변경 내용은 DatabaseManager의 쓰기 대기열에 남아 있으므로
+    다음 백업 때 DB에 저장되고, 다시 사용할 때 그대로 복원된다.
+    """
+
+    def __init__(self, db, max_channels=1000, ttl=3600, history_limit=20, memory_budget=50_000_000):
+        self.db = db
+        self.max_channels = max_channels  # 메모리에 유지할 최대 채널 수
+        self.ttl = ttl  # 이 시간(초) 동안 사용되지 않은 채널은 다시 불러옴
+        self.history_limit = history_limit  # 채널별 최근 대화 개수
+        self.memory_budget = memory_budget  # 전체 대화 내용 한도 (글자 수)
+        self.total_size = 0
+        self.channels = OrderedDict()  # 채널 ID -> ChannelContext (오래된 순)
+        self.loading = {}  # 불러오는 중인 채널 ID -> Task (중복 조회 방지)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def peek(self, channel_id):
+        """불러오지 않고 메모리에 있는 컨텍스트만 조회"""
+        return self.channels.get(channel_id)
+
+    async def get(self, channel_id):
+        """채널 컨텍스트 조회 (없거나 만료되었으면 DB에서 불러옴)"""
+        now = time.monotonic()
+        context = self.channels.get(channel_id)
+        if context is not None:
+            if now - context.last_used <= self.ttl:
+                context.last_used = now
+                self.channels.move_to_end(channel_id)
+                return context
+            del self.channels[channel_id]
+            self.total_size -= context.size
+
+        task = self.loading.get(channel_id)
+        if task is None:
+            task = asyncio.ensure_future(self._hydrate(channel_id))
+            self.loading[channel_id] = task
+            task.add_done_callback(lambda _: self.loading.pop(channel_id, None))
+        # 기다리던 쪽이 취소되어도 불러오기는 끝까지 진행
+        return await asyncio.shield(task)
+
+    async def _hydrate(self, channel_id):
+        """DB의 설정/최근 대화에 아직 저장되지 않은 변경분을 덧씌워 컨텍스트 생성
+
+        백업/설정 저장이 대기열을 꺼내 DB에 쓰는 도중에 읽으면 변경분이 DB와 대기열 어디에도 없거나
+        양쪽에 다 있을 수 있으므로, 쓰기가 없을 때 읽고 읽는 사이 쓰기가 시작됐으면 다시 읽는다.
+        """
+        while True:
+            await self.db.writes_idle.wait()
+            generation = self.db.write_generation
+            system_prompt, permanent_history, temperature, max_tokens, is_active, max_input_tokens, faq_threshold = \
+                await self.db.load_channel_context(channel_id)
+            recent = await self.db.load_channel_history(channel_id, self.history_limit)
+            if self.db.write_generation == generation:
+                break
+
+        pending = self.db.pending_settings.get(channel_id, {})
+        if "system_prompt" in pending:
+            system_prompt = pending["system_prompt"]
+        if "permanent_history" in pending:
+            permanent_history = json.loads(pending["permanent_history"])
+        temperature = pending.get("temperature", temperature)
+        max_tokens = pending.get("max_tokens", max_tokens)
+        max_input_tokens = pending.get("max_input_tokens", max_input_tokens)
+        faq_threshold = pending.get("faq_threshold", faq_threshold)
+
+        for role, content in self.db.pending_messages.get(channel_id, []):
+            if role == "clear":
+                recent = []
+            else:
+                recent.append({"role": role, "content": content})
+
+        context = ChannelContext(
+            channel_id,
+            system_prompt=system_prompt,
+            permanent_history=permanent_history,
+            recent_history=recent,
+            temperature=0.7 if temperature is None else temperature,
+            max_tokens=4000 if max_tokens is None else max_tokens,
+            is_active=True if is_active is None else is_active,
+            history_limit=self.history_limit,
+            max_input_tokens=max_input_tokens,
+            faq_threshold=faq_threshold
+        )
+        self.channels[channel_id] = context
+        self.update_size(context)
+        return context
+
+    def append(self, context, message):
+        """최근 대화에 메시지 추가 (DB 백업 대기열에도 기록)"""
+        history = context.recent_history
+        # 링 버퍼가 가득 차 있으면 가장 오래된 메시지가 밀려남
+        delta = len(message["content"]) - (len(history[0]["content"]) if len(history) == history.maxlen else 0)
+        history.append(message)
+        context.recent_tokens.append(message_tokens(message))
+        self.db.queue_message(context.channel_id, message)
+        self._resize(context, delta)
+
+    def clear(self, context):
+        """최근 대화 초기화"""
+        delta = -sum(len(message["content"]) for message in context.recent_history)
+        context.recent_history.clear()
+        context.recent_tokens.clear()
+        self.db.clear_channel_history(context.channel_id)
+        self._resize(context, delta)
+
+    def _resize(self, context, delta):
+        context.size += delta
+        if self.channels.get(context.channel_id) is context:
+            self.total_size += delta
+        self._evict()
+
+    def update_size(self, context):
+        """시스템 프롬프트/고정 대화를 바꾼 뒤 메모리 사용량을 다시 계산하고 한도 확인"""
+        size = context.estimate_size()
+        if self.channels.get(context.channel_id) is context:
+            self.total_size += size - context.size
+        context.size = size
+        self._evict()
+
+    def check_sizes(self):
+        """차이로 갱신한 메모리 사용량을 처음부터 다시 계산한 값과 비교해 맞춤 (어긋난 글자 수 반환)"""
+        drift = 0
+        for context in self.channels.values():
+            size = context.estimate_size()
+            drift += size - context.size
+            context.size = size
+        self.total_size += drift
+        return drift
+
+    def _evict(self):
+        """오래 사용되지 않은 채널과, 채널 수나 메모리 한도를 넘는 만큼 가장 오래된 채널을 내보냄"""
+        now = time.monotonic()
+        while len(self.channels) > 1:
+            context = next(iter(self.channels.values()))
+            if not (
+                len(self.channels) > self.max_channels
+                or self.total_size > self.memory_budget
+                or now - context.last_used > self.ttl
+            ):
+                break
+            self.channels.popitem(last=False)
+            self.total_size -= context.size
@@ -0,0 +1,229 @@
+"""So sánh thời gian tải trang khuyến mãi: cách cũ (requests.get tuần tự + html.parser)
+với get_promotions.py (aiohttp song song, lxml, bỏ qua trang không đổi bằng ETag/Last-Modified).
+
+Chạy trên server HTTP nội bộ giả lập (có độ trễ, ETag, Last-Modified) nên không cần mạng:
+    python crawl_hk/benchmark.py --pages 40 --latency 0.2
+
+Chỉ đo phần trích nội dung (thời gian parse, kích thước kết quả mỗi trang) trên các trang lưu sẵn:
+    python crawl_hk/benchmark.py --extract [--fixtures crawl_hk/fixtures/promotions]
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from bs4 import BeautifulSoup
+
+from extract import BoilerplateFilter, StreamingExtractor, extract
+from get_promotions import fetch_all
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "promotions")
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>Promotion {index}</title><style>body {{ margin: 0 }}</style>
+<script>window.dataLayer = [];</script></head>
+<body>
+<nav><a href="/">Home</a><a href="/en/event/ongoing">Events</a></nav>
+<main>
+<h1>Promotion {index}: Ulthera Prime + Thermage FLX</h1>
+{sections}
+</main>
+<footer>Skinbeam Hong Kong</footer>
+<noscript>Enable JavaScript</noscript>
+</body></html>
+"""
+
+
+def make_page(index, sections=30):
+    body = "\n".join(
+        f"<section><h2>Offer {index}-{i}</h2><p>HK$ {1000 + i * 37} <b>{i % 50}% off</b></p>"
+        f"<ul><li>Valid until 2025-12-31</li><li>Limited to first-time customers</li></ul></section>"
+        for i in range(sections)
+    )
+    return PAGE_TEMPLATE.format(index=index, sections=body).encode("utf-8")
+
+
+class FixtureServer:
+    """Server giả lập trang khuyến mãi (độ trễ cố định, hỗ trợ ETag/If-Modified-Since -> 304)"""
+
+    def __init__(self, pages=40, latency=0.2, sections=30):
+        self.pages = {f"/en/event/{i}": make_page(i, sections) for i in range(pages)}
+        self.latency = latency
+        self.last_modified = formatdate(time.time() - 3600, usegmt=True)
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.latency)
+                body = server.pages.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag or self.headers.get("If-Modified-Since") == server.last_modified:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", server.last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def urls(self):
+        host, port = self.httpd.server_address
+        return [f"http://{host}:{port}{path}" for path in self.pages]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def legacy_clean_text(html):
+    """Cách cũ: BeautifulSoup html.parser, lấy hết chữ trong <body> (cả menu, footer...)"""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "meta", "noscript", "head", "link"]):
+        tag.decompose()
+    body = soup.body or soup
+    text = body.get_text(separator="\n", strip=True)
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def legacy_get_clean_text(url):
+    """Cách cũ: requests.get không dùng session + BeautifulSoup html.parser"""
+    return legacy_clean_text(requests.get(url, timeout=10).text)
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - started) / repeat * 1000
+
+
+def streamed(content, chunk_size=16 * 1024):
+    """Giống lúc tải thật: đưa HTML vào parser từng đoạn"""
+    extractor = StreamingExtractor("utf-8")
+    for start in range(0, len(content), chunk_size):
+        extractor.feed(content[start:start + chunk_size])
+    return extractor.close()
+
+
+def benchmark_extract(folder, repeat):
+    """Thời gian parse và kích thước kết quả mỗi trang: cách cũ (html.parser, cả trang) và extract.py"""
+    paths = sorted(glob.glob(os.path.join(folder, "*.html")))
+    if not paths:
+        raise SystemExit(f"Không có file .html trong {folder}")
+    rows, records = [], []
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        legacy, legacy_ms = timed(lambda: legacy_clean_text(content.decode("utf-8")), repeat)
+        record, extract_ms = timed(lambda: extract(content), repeat)
+        _, stream_ms = timed(lambda: streamed(content), repeat)
+        records.append(record)
+        rows.append([os.path.basename(path), len(content), legacy_ms, extract_ms, stream_ms, len(legacy.encode())])
+
+    # Bỏ dòng lặp lại giữa các trang như get_promotions.py / crawl_pipeline.py
+    boilerplate = BoilerplateFilter()
+    boilerplate.learn(record["text"] for record in records)
+    for row, record in zip(rows, records):
+        record["text"] = boilerplate.apply(record["text"])
+        row += [len(record["text"].encode()), len(json.dumps(record, ensure_ascii=False).encode()),
+                f"{len(record['prices'])}/{len(record['discounts'])}/{len(record['dates'])}"]
+
+    print(f"{len(paths)} trang trong {folder}, lặp {repeat} lần; {len(boilerplate.lines)} dòng lặp lại bị bỏ")
+    header = ["trang", "HTML", "cũ ms", "mới ms", "stream ms", "chữ cũ", "chữ mới", "JSON mới", "giá/giảm/ngày"]
+    print(" | ".join(header))
+    for name, size, legacy_ms, extract_ms, stream_ms, legacy_size, text_size, json_size, fields in rows:
+        print(f"{name} | {size / 1024:.1f}KB | {legacy_ms:.2f} | {extract_ms:.2f} | {stream_ms:.2f} | "
+              f"{legacy_size}B | {text_size}B ({text_size / legacy_size:.0%}) | {json_size}B | {fields}")
+    total = [sum(row[i] for row in rows) / len(rows) for i in (2, 3, 4, 5, 6)]
+    print(f"Trung bình: cũ {total[0]:.2f}ms -> mới {total[1]:.2f}ms (stream {total[2]:.2f}ms), "
+          f"chữ {total[3]:.0f}B -> {total[4]:.0f}B")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh thời gian tải trang khuyến mãi cũ/mới trên server giả lập")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2, help="độ trễ mỗi request (giây)")
+    parser.add_argument("--sections", type=int, default=30, help="độ dài trang (số mục khuyến mãi)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--per-host", type=int, default=8, help="server nội bộ nên cho phép nhiều kết nối")
+    parser.add_argument("--interval", type=float, default=0.0)
+    parser.add_argument("--extract", action="store_true", help="chỉ đo phần trích nội dung trên các trang lưu sẵn")
+    parser.add_argument("--fixtures", default=FIXTURES, help="thư mục trang HTML lưu sẵn (cho --extract)")
+    parser.add_argument("--repeat", type=int, default=50, help="số lần lặp khi đo thời gian parse")
+    args = parser.parse_args()
+
+    if args.extract:
+        benchmark_extract(args.fixtures, args.repeat)
+        return
+
+    with FixtureServer(args.pages, args.latency, args.sections) as server:
+        urls = server.urls
+
+        started = time.perf_counter()
+        legacy = {url: legacy_get_clean_text(url) for url in urls}
+        legacy_seconds = time.perf_counter() - started
+
+        options = dict(concurrency=args.concurrency, per_host=args.per_host, interval=args.interval)
+        validators = {}
+        output = io.StringIO()
+        started = time.perf_counter()
+        cold = asyncio.run(fetch_all(urls, output, validators, **options))
+        cold_seconds = time.perf_counter() - started
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        legacy_size = sum(len(text) for text in legacy.values()) / len(legacy)
+        new_size = sum(len(record.get("text", "")) for record in records) / max(len(records), 1)
+
+        started = time.perf_counter()
+        warm = asyncio.run(fetch_all(urls, io.StringIO(), validators, **options))
+        warm_seconds = time.perf_counter() - started
+
+        # Chỉ tính phần xử lý HTML (không tính mạng)
+        page = next(iter(server.pages.values()))
+        _, bs4_ms = timed(lambda: legacy_clean_text(page.decode("utf-8")), args.repeat)
+        _, lxml_ms = timed(lambda: extract(page), args.repeat)
+
+    print(f"Trang: {args.pages}, độ trễ: {args.latency}s, kích thước: {len(page) / 1024:.0f}KB")
+    print(f"- Cũ (tuần tự, requests + html.parser): {legacy_seconds:.2f}s")
+    print(f"- Mới, lần đầu: {cold_seconds:.2f}s (x{legacy_seconds / cold_seconds:.1f}), "
+          f"{cold['fetched']} trang, chữ mỗi trang {legacy_size:.0f} -> {new_size:.0f} ký tự")
+    print(f"- Mới, chạy lại (304): {warm_seconds:.2f}s (x{legacy_seconds / warm_seconds:.1f}), "
+          f"{warm['unchanged']} trang không đổi")
+    print(f"- Xử lý HTML mỗi trang: html.parser {bs4_ms:.2f}ms, lxml (extract.py) {lxml_ms:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
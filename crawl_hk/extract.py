@@ -0,0 +1,285 @@
+"""Trích nội dung chính của trang khuyến mãi
+
+- Parse dần từng đoạn khi đang tải (lxml HTMLPullParser), không cần giữ cả trang dạng chuỗi.
+- Chỉ giữ khối nội dung chính: bỏ menu/header/footer/cookie..., ưu tiên <main>/<article>,
+  nếu không có thì đi xuống khối chứa phần lớn chữ của trang.
+- Giá (HK$), giảm giá (% off, 折, 半價) và ngày được tách thành dữ liệu có cấu trúc.
+- BoilerplateFilter bỏ các dòng lặp lại trên nhiều trang (điều khoản chung, hotline...).
+"""
+import json
+import os
+import re
+from datetime import date
+
+from lxml import etree
+
+# Các thẻ không có nội dung để đọc
+DROP_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "form", "button", "select", "head")
+
+# Khung trang (menu, header, footer...): chỉ bỏ khi nằm ngoài <main>/<article>,
+# vì header/footer của bài viết thường chứa tiêu đề và thời hạn khuyến mãi
+LAYOUT_TAGS = ("nav", "header", "footer", "aside")
+LAYOUT_PATTERN = re.compile(r"(?:^|[-_\s])(?:nav|navbar|navigation|menu|header|footer|sidebar|banner|contentinfo)(?:$|[-_\s])", re.I)
+# Tiện ích lặp lại trên mọi trang: bỏ ở bất kỳ đâu
+WIDGET_PATTERN = re.compile(
+    r"(?:^|[-_\s])(?:breadcrumbs?|cookies?|consent|popup|modal|dialog|share|social|newsletter|subscribe|related)(?:$|[-_\s])",
+    re.I
+)
+MAIN_XPATH = "//main | //article | //*[@role='main']"
+
+# Xuống dòng khi gặp các thẻ khối (thẻ inline như <b>, <span> nối liền trong cùng dòng)
+BLOCK_TAGS = {
+    "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "figure", "h1", "h2", "h3",
+    "h4", "h5", "h6", "hr", "li", "main", "ol", "p", "pre", "section", "table", "tr", "ul"
+}
+# Ô của bảng: cùng một hàng thì nối thành một dòng "ô 1 | ô 2 | ..." (giữ giá đi cùng tên gói)
+CELL_TAGS = {"td", "th"}
+
+# Đi xuống khối con nếu nó chứa ít nhất tỉ lệ này số chữ (không tính chữ trong link) của khối cha
+MAIN_SHARE = 0.7
+
+PRICE_PATTERN = re.compile(
+    r"(?:HK\$|HKD|\$)\s*(\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|(\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?\s*(?:元|HKD)",
+    re.I
+)
+DISCOUNT_PATTERN = re.compile(
+    r"(\d{1,2}(?:\.\d+)?)\s*%\s*(?:off|discount|折扣)|(?:save|減|-)\s*(\d{1,2}(?:\.\d+)?)\s*%|"
+    r"(\d{1,2}(?:\.\d)?)\s*折|(半價)",
+    re.I
+)
+MONTHS = {name: index for index, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+DATE_PATTERN = re.compile(
+    r"(?P<iy>\d{4})[-/.](?P<im>\d{1,2})[-/.](?P<id>\d{1,2})"
+    r"|(?P<cy>\d{4})\s*年\s*(?P<cm>\d{1,2})\s*月\s*(?P<cd>\d{1,2})\s*日"
+    r"|(?P<dd>\d{1,2})/(?P<dm>\d{1,2})/(?P<dy>\d{4})"
+    r"|(?P<td>\d{1,2})(?:st|nd|rd|th)?\s+(?P<tm>[A-Za-z]{3})[a-z]*\.?,?\s+(?P<ty>\d{4})"
+    r"|(?P<mm>[A-Za-z]{3})[a-z]*\.?\s+(?P<md>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<my>\d{4})"
+)
+
+
+def _is_boilerplate(element):
+    label = f"{element.get('id', '')} {element.get('class', '')} {element.get('role', '')}"
+    if WIDGET_PATTERN.search(label):
+        return True
+    if element.tag not in LAYOUT_TAGS and not LAYOUT_PATTERN.search(label):
+        return False
+    return next(element.iterancestors("main", "article"), None) is None
+
+
+def _strip(root):
+    """Bỏ thẻ không đọc được và các khối boilerplate (giữ phần tail là chữ nằm sau thẻ)"""
+    etree.strip_elements(root, etree.Comment, etree.ProcessingInstruction, *DROP_TAGS, with_tail=False)
+    for element in list(root.iter(*LAYOUT_TAGS, "div", "section", "ul", "p")):
+        if element.tag not in ("main", "article") and _is_boilerplate(element):
+            _remove(element)
+
+
+def _remove(element):
+    parent = element.getparent()
+    if parent is None:
+        return
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + element.tail
+        else:
+            parent.text = (parent.text or "") + element.tail
+    parent.remove(element)
+
+
+def _text_lengths(root):
+    """Số chữ (không tính chữ trong link) của mỗi phần tử, tính từ dưới lên trong một lần duyệt"""
+    lengths = {}
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            continue
+        own = 0 if element.tag == "a" else len((element.text or "").strip())
+        own += sum(len((child.tail or "").strip()) for child in element)
+        lengths[element] = own
+    for element in reversed(list(lengths)):
+        parent = element.getparent()
+        if parent is not None and parent in lengths and element.tag != "a":
+            lengths[parent] += lengths[element]
+    return lengths
+
+
+def _main_block(root):
+    """Khối nội dung chính: <main>/<article> dài nhất, nếu không có thì đi xuống khối con chứa phần lớn chữ"""
+    lengths = _text_lengths(root)
+    candidates = [element for element in root.xpath(MAIN_XPATH) if lengths.get(element)]
+    if candidates:
+        return max(candidates, key=lengths.get)
+    body = root.find("body")
+    block = body if body is not None else root
+    while True:
+        total = lengths.get(block, 0)
+        children = [child for child in block if isinstance(child.tag, str)]
+        best = max(children, key=lambda child: lengths.get(child, 0), default=None)
+        if best is None or not total or lengths.get(best, 0) < total * MAIN_SHARE:
+            return block
+        block = best
+
+
+def _lines(element):
+    """Chữ của khối, mỗi đoạn (thẻ khối) hoặc hàng bảng một dòng, gộp khoảng trắng"""
+    parts = []
+
+    def walk(node):
+        block = node.tag in BLOCK_TAGS
+        if block:
+            parts.append("\n")
+        elif node.tag in CELL_TAGS:
+            parts.append("\t")
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            if isinstance(child.tag, str):
+                walk(child)
+            if child.tail:
+                parts.append(child.tail)
+        if block:
+            parts.append("\n")
+
+    walk(element)
+    lines = (
+        " | ".join(cell for cell in (" ".join(piece.split()) for piece in line.split("\t")) if cell)
+        for line in "".join(parts).split("\n")
+    )
+    return [line for line in lines if line]
+
+
+def _number(value):
+    return float(value.replace(",", ""))
+
+
+def parse_prices(line):
+    return [_number(amount or local) for amount, local in PRICE_PATTERN.findall(line)]
+
+
+def parse_discounts(line):
+    """Phần trăm được giảm (8折 = trả 80% -> giảm 20%, 75折 -> giảm 25%, 半價 -> giảm 50%)"""
+    discounts = []
+    for off, save, fold, half in DISCOUNT_PATTERN.findall(line):
+        if half:
+            discounts.append(50.0)
+        elif fold:
+            paid = _number(fold)
+            discounts.append(round(100 - (paid * 10 if paid < 10 else paid), 1))
+        else:
+            discounts.append(_number(off or save))
+    return [value for value in discounts if 0 < value < 100]
+
+
+def parse_dates(line):
+    """Ngày dạng ISO (YYYY-MM-DD); ngày kiểu 31/12/2025 đọc theo thứ tự ngày/tháng của HK"""
+    dates = []
+    for match in DATE_PATTERN.finditer(line):
+        groups = match.groupdict()
+        for prefix in ("i", "c", "d", "t", "m"):
+            if groups[f"{prefix}y"]:
+                year, month, day = groups[f"{prefix}y"], groups[f"{prefix}m"], groups[f"{prefix}d"]
+                break
+        if not month.isdigit():
+            month = MONTHS.get(month[:3].lower())
+            if month is None:
+                continue
+        try:
+            dates.append(date(int(year), int(month), int(day)).isoformat())
+        except ValueError:
+            continue
+    return dates
+
+
+def is_structured(line):
+    """Dòng có giá/giảm giá/ngày: không bao giờ bị coi là boilerplate dù lặp lại nhiều trang"""
+    return bool(PRICE_PATTERN.search(line) or DISCOUNT_PATTERN.search(line) or DATE_PATTERN.search(line))
+
+
+def extract_tree(root):
+    """Cây HTML -> {title, text, prices, discounts, dates}"""
+    if root is None:
+        return {"title": "", "text": "", "prices": [], "discounts": [], "dates": []}
+    title = " ".join(" ".join(root.xpath("//h1[1]//text()") or root.xpath("//title//text()")).split())
+    _strip(root)
+    lines = _lines(_main_block(root))
+
+    prices, discounts, dates = [], [], []
+    for line in lines:
+        prices.extend({"amount": amount, "currency": "HKD", "context": line} for amount in parse_prices(line))
+        discounts.extend({"percent": percent, "context": line} for percent in parse_discounts(line))
+        dates.extend(parse_dates(line))
+    return {
+        "title": title,
+        "text": "\n".join(lines),
+        "prices": prices,
+        "discounts": discounts,
+        "dates": sorted(set(dates))
+    }
+
+
+class StreamingExtractor:
+    """Nhận HTML từng đoạn (bytes hoặc str) trong lúc tải, close() trả về kết quả extract_tree"""
+
+    def __init__(self, encoding=None):
+        self.parser = etree.HTMLPullParser(events=(), encoding=encoding, remove_comments=True, remove_pis=True)
+
+    def feed(self, data):
+        self.parser.feed(data)
+
+    def close(self):
+        try:
+            root = self.parser.close()
+        except etree.XMLSyntaxError:
+            root = None  # trang rỗng
+        return extract_tree(root)
+
+
+def extract(content, encoding=None):
+    """HTML đầy đủ (bytes/str) -> {title, text, prices, discounts, dates}"""
+    extractor = StreamingExtractor(encoding)
+    if content:
+        extractor.feed(content)
+    return extractor.close()
+
+
+class BoilerplateFilter:
+    """Bỏ các dòng lặp lại trên nhiều trang khuyến mãi
+
+    learn() ghi nhớ dòng xuất hiện trên ít nhất ratio số trang (và ít nhất min_pages trang);
+    danh sách được lưu lại để lượt sau lọc được cả khi chỉ vài trang thay đổi.
+    """
+
+    def __init__(self, lines=(), min_pages=3, ratio=0.5):
+        self.lines = set(lines)
+        self.min_pages = min_pages
+        self.ratio = ratio
+
+    @classmethod
+    def load(cls, path, **options):
+        if not path or not os.path.exists(path):
+            return cls(**options)
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **options)
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(sorted(self.lines), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def learn(self, texts):
+        texts = list(texts)
+        if len(texts) < self.min_pages:
+            return set()
+        counts = {}
+        for text in texts:
+            for line in set(text.split("\n")):
+                counts[line] = counts.get(line, 0) + 1
+        threshold = max(self.min_pages, len(texts) * self.ratio)
+        found = {line for line, count in counts.items() if count >= threshold and line and not is_structured(line)}
+        self.lines |= found
+        return found
+
+    def apply(self, text):
+        return "\n".join(line for line in text.split("\n") if line not in self.lines)
@@ -1,48 +1,237 @@
+import argparse
+import asyncio
 import json
-import requests
-from bs4 import BeautifulSoup
+import os
+import time
+from urllib.parse import urlsplit
 
-def get_clean_text(url):
-    try:
-        response = requests.get(url, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
+import aiohttp
 
-        # Xoá các thẻ không cần thiết
-        for tag in soup(["script", "style", "meta", "noscript", "head", "link"]):
-            tag.decompose()
+from extract import BoilerplateFilter, StreamingExtractor
 
-        # Lấy phần thân trang
-        body = soup.body
-        if not body:
-            body = soup  # fallback nếu không có thẻ <body>
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-        # Lấy text, bỏ khoảng trắng thừa
-        text = body.get_text(separator="\n", strip=True)
+# Đọc response theo từng đoạn và parse ngay, không giữ cả trang trong bộ nhớ
+CHUNK_SIZE = 64 * 1024
 
-        # Lọc bỏ dòng trống
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        cleaned_text = "\n".join(lines)
 
-        return cleaned_text
+async def read_page(response):
+    """Parse HTML trong lúc tải, trả về {title, text, prices, discounts, dates} (xem extract.py)"""
+    chunks = response.content.iter_chunked(CHUNK_SIZE)
+    first = await anext(chunks, b"")
+    # Không có charset trong header và trang không khai báo <meta charset> thì coi là UTF-8
+    encoding = response.charset or (None if b"charset" in first[:4096].lower() else "utf-8")
+    extractor = StreamingExtractor(encoding)
+    extractor.feed(first)
+    async for chunk in chunks:
+        extractor.feed(chunk)
+    return await asyncio.to_thread(extractor.close)
 
-    except Exception as e:
-        return f"❌ Lỗi: {e}"
 
-all_promotions = []
+class HostThrottle:
+    """Giới hạn mỗi host: tối đa per_host kết nối và cách nhau ít nhất interval giây giữa hai lần gửi"""
 
-with open("/Users/hehe/Documents/VSC/links_click_discovered.json", "r", encoding="utf-8") as f:
-    links = json.load(f)
+    def __init__(self, per_host=2, interval=0.2):
+        self.per_host = per_host
+        self.interval = interval
+        self.hosts = {}  # host -> [semaphore, lock, thời điểm gửi gần nhất]
 
-for url in links:  # links là danh sách URL đã lọc
-    print(f"📥 Đang xử lý: {url}")
-    text = get_clean_text(url)
-    all_promotions.append({
-        "url": url,
-        "text": text
-    })
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = [asyncio.Semaphore(self.per_host), asyncio.Lock(), 0.0]
+        return state
 
-# Ghi ra file JSON
-with open("clean_promotions.json", "w", encoding="utf-8") as f:
-    json.dump(all_promotions, f, ensure_ascii=False, indent=2)
+    async def acquire(self, host):
+        semaphore, lock, _ = state = self._state(host)
+        await semaphore.acquire()
+        async with lock:
+            wait = state[2] + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            state[2] = time.monotonic()
 
-print("🎉 Đã lưu tất cả vào clean_promotions.json")
+    def release(self, host):
+        self.hosts[host][0].release()
+
+
+def load_validators(path):
+    """ETag/Last-Modified đã lưu từ lần chạy trước (url -> {...})"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_records(path):
+    """Kết quả lần chạy trước trong file JSONL (url -> record, bỏ các dòng lỗi)"""
+    if not path or not os.path.exists(path):
+        return {}
+    records = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if "error" not in record:
+                    records[record["url"]] = record
+    return records
+
+
+def save_validators(path, validators):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(validators, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+async def fetch(session, throttle, url, validators, timeout=10, retries=2):
+    """Tải một trang (gửi If-None-Match/If-Modified-Since nếu đã có)
+
+    Trả về (status, nội dung đã trích, headers); status 304 nghĩa là trang không đổi.
+    """
+    headers = {}
+    saved = validators.get(url) or {}
+    if saved.get("etag"):
+        headers["If-None-Match"] = saved["etag"]
+    if saved.get("last_modified"):
+        headers["If-Modified-Since"] = saved["last_modified"]
+
+    host = urlsplit(url).netloc
+    for attempt in range(retries + 1):
+        await throttle.acquire(host)
+        try:
+            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status in (429, 500, 502, 503, 504) and attempt < retries:
+                    retry_after = response.headers.get("Retry-After", "")
+                    delay = float(retry_after) if retry_after.isdigit() else 2 ** attempt
+                else:
+                    page = await read_page(response) if response.status < 300 else None
+                    return response.status, page, response.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+            delay = 2 ** attempt
+        finally:
+            throttle.release(host)
+        await asyncio.sleep(delay)
+
+
+async def fetch_all(urls, output, validators=None, concurrency=8, per_host=2, interval=0.2, timeout=10):
+    """Tải song song và ghi từng kết quả ra JSONL ngay khi xong (không gom hết vào bộ nhớ)
+
+    Trang không đổi (304) được bỏ qua, không ghi ra output. validators được cập nhật tại chỗ.
+    """
+    validators = {} if validators is None else validators
+    stats = {"fetched": 0, "unchanged": 0, "errors": 0}
+    urls = list(dict.fromkeys(urls))  # bỏ link trùng, giữ thứ tự
+    todo = asyncio.Queue()
+    for url in urls:
+        todo.put_nowait(url)
+
+    throttle = HostThrottle(per_host, interval)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def worker():
+            while True:
+                try:
+                    url = todo.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    status, page, headers = await fetch(session, throttle, url, validators, timeout)
+                    if status == 304:
+                        stats["unchanged"] += 1
+                        print(f"⏭️ Không đổi: {url}")
+                        continue
+                    if status >= 400:
+                        raise ValueError(f"HTTP {status}")
+                    record = {"url": url, **page}
+                    validators[url] = {
+                        "etag": headers.get("ETag"),
+                        "last_modified": headers.get("Last-Modified")
+                    }
+                    stats["fetched"] += 1
+                    print(f"📥 Đã xử lý: {url}")
+                except Exception as e:
+                    stats["errors"] += 1
+                    record = {"url": url, "error": str(e) or type(e).__name__}
+                    print(f"❌ Lỗi: {url}: {record['error']}")
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(urls)) or 1)))
+    return stats
+
+
+def strip_boilerplate(path, boilerplate):
+    """Bỏ các dòng lặp lại trên nhiều trang (menu/điều khoản chung...) khỏi file JSONL vừa tải"""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    boilerplate.learn(record["text"] for record in records if "text" in record)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in records:
+            if "text" in record:
+                record["text"] = boilerplate.apply(record["text"])
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return len(boilerplate.lines)
+
+
+async def run(links_path, output_path, state_path=None, full=False, boilerplate_path=None, **options):
+    with open(links_path, "r", encoding="utf-8") as f:
+        links = json.load(f)
+
+    previous = {} if full else load_records(output_path)
+    # Chỉ gửi ETag/Last-Modified cho trang còn nội dung cũ trong output, nếu không trang 304 sẽ bị mất
+    validators = {url: saved for url, saved in load_validators(state_path).items() if url in previous}
+    tmp = f"{output_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as output:
+        stats = await fetch_all(links, output, validators, **options)
+
+    # Ghi bản đầy đủ theo thứ tự link: trang không đổi (304) hoặc lỗi giữ nội dung lần trước
+    with open(tmp, encoding="utf-8") as f:
+        fetched = {record["url"]: record for record in map(json.loads, f)}
+    with open(tmp, "w", encoding="utf-8") as f:
+        for url in dict.fromkeys(links):
+            record = fetched.get(url)
+            if (record is None or "error" in record) and url in previous:
+                record = previous[url]
+            if record is not None:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, output_path)
+    if boilerplate_path:
+        boilerplate = BoilerplateFilter.load(boilerplate_path)
+        stats["boilerplate"] = strip_boilerplate(output_path, boilerplate)
+        boilerplate.save(boilerplate_path)
+    if state_path:
+        save_validators(state_path, validators)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tải nội dung các trang khuyến mãi (JSONL)")
+    parser.add_argument("--links", default=os.path.join(BASE_DIR, "links_click_discovered.json"),
+                        help="file JSON danh sách link (get_url_promotions.py)")
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "clean_promotions.jsonl"))
+    parser.add_argument("--state", default=os.path.join(BASE_DIR, "promotions_cache.json"),
+                        help="file lưu ETag/Last-Modified để bỏ qua trang không đổi")
+    parser.add_argument("--boilerplate", default=os.path.join(BASE_DIR, "promotions_boilerplate.json"),
+                        help="file lưu các dòng lặp lại trên nhiều trang (bỏ khỏi nội dung); '' để tắt")
+    parser.add_argument("--full", action="store_true", help="tải lại tất cả, không gửi ETag/Last-Modified")
+    parser.add_argument("--concurrency", type=int, default=8, help="số request đồng thời tối đa")
+    parser.add_argument("--per-host", type=int, default=2, help="số request đồng thời tối đa mỗi host")
+    parser.add_argument("--interval", type=float, default=0.2, help="khoảng cách tối thiểu giữa hai request cùng host (giây)")
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args(argv)
+
+    stats = asyncio.run(run(
+        args.links, args.output, args.state, args.full, args.boilerplate,
+        concurrency=args.concurrency, per_host=args.per_host, interval=args.interval, timeout=args.timeout
+    ))
+    print(f"🎉 Đã lưu vào {args.output}: {stats['fetched']} trang mới/thay đổi, "
+          f"{stats['unchanged']} không đổi, {stats['errors']} lỗi")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,174 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import argparse
 import json
-import time
+import os
+import re
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit, urlunsplit
 
-# Setup trình duyệt
-options = Options()
-# options.add_argument("--headless")  # Bỏ ghi chú nếu muốn chạy ẩn
+import lxml.html
+import requests
 
-driver = webdriver.Chrome(options=options)
-wait = WebDriverWait(driver, 10)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_URL = "https://skinbeam.hk/en/event/ongoing"
+FIXTURE = os.path.join(BASE_DIR, "fixtures", "event_list.html")
 
-base_url = "https://skinbeam.hk/en/event/ongoing"
-driver.get(base_url)
+# Link trang chi tiết sự kiện (bỏ các trang danh sách như /event/ongoing và mẫu route như /event/[status])
+DETAIL_PATTERN = r"/event/(?!ongoing|ended|past|upcoming)[^/?#\[]+/?$"
 
-wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "cursor-pointer")))
+# Thuộc tính có thể chứa link trên các phần tử click được (ngoài <a href>)
+LINK_ATTRIBUTES = ("href", "data-href", "data-url", "data-link")
 
-links = []
+# JS: bấm nút "xem thêm"/"trang sau" nếu có, không thì cuộn xuống cuối (trả về false nếu không còn gì để tải)
+LOAD_MORE_JS = """
+const pattern = /^(load more|more|view more|next|see more|xem thêm|更多|載入更多|下一頁)$/i;
+const button = Array.from(document.querySelectorAll("button, a, [role=button], .cursor-pointer"))
+    .find(el => pattern.test(el.innerText.trim()) && !el.disabled && el.offsetParent !== null);
+if (button) { button.scrollIntoView(true); button.click(); return true; }
+const before = document.documentElement.scrollTop;
+window.scrollTo(0, document.body.scrollHeight);
+return document.documentElement.scrollTop > before;
+"""
 
-# Duyệt qua từng phần tử có class "cursor-pointer"
-for index in range(20):  # Giới hạn tạm 20 mục để tránh quá tải
+
+def normalize(url):
+    """Bỏ fragment và dấu / cuối để so sánh link"""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip("/") or "/", parts.query, ""))
+
+
+def _json_urls(value):
+    """Tìm các chuỗi trông giống URL/đường dẫn trong dữ liệu JSON của trang (vd. __NEXT_DATA__)"""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _json_urls(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _json_urls(item)
+    elif isinstance(value, str) and (value.startswith("/") or value.startswith("http")):
+        yield value
+
+
+def extract_links(html, base_url, pattern=DETAIL_PATTERN):
+    """Lấy tất cả link chi tiết sự kiện từ HTML (đã render hoặc tải thẳng) trong một lần duyệt
+
+    Nguồn: <a href>, data-href/data-url/data-link của phần tử click được, và JSON nhúng trong trang.
+    Chỉ giữ link cùng host khớp pattern, bỏ trùng, giữ thứ tự xuất hiện.
+    """
+    doc = lxml.html.fromstring(html)
+    host = urlsplit(base_url).netloc
+    regex = re.compile(pattern)
+    candidates = []
+
+    for attribute in LINK_ATTRIBUTES:
+        candidates.extend(doc.xpath(f"//*[@{attribute}]/@{attribute}"))
+    for script in doc.xpath('//script[@type="application/json" or @type="application/ld+json" or @id="__NEXT_DATA__"]'):
+        try:
+            candidates.extend(_json_urls(json.loads(script.text or "")))
+        except ValueError:
+            continue
+
+    links = {}
+    for candidate in candidates:
+        url = normalize(urljoin(base_url, candidate.strip()))
+        parts = urlsplit(url)
+        if parts.netloc == host and regex.search(parts.path) and url != normalize(base_url):
+            links.setdefault(url, None)
+    return list(links)
+
+
+def discover_static(url, pattern=DETAIL_PATTERN, max_pages=20):
+    """Không dùng trình duyệt: tải HTML (và các trang rel=next) rồi lấy link"""
+    links = {}
+    session = requests.Session()
+    for _ in range(max_pages):
+        if url.startswith("file:"):
+            html = Path(urlsplit(url).path).read_text(encoding="utf-8")
+        else:
+            response = session.get(url, timeout=10)
+            response.raise_for_status()
+            html = response.text
+        for link in extract_links(html, url, pattern):
+            links.setdefault(link, None)
+        next_links = lxml.html.fromstring(html).xpath('//a[@rel="next"]/@href | //link[@rel="next"]/@href')
+        if not next_links:
+            break
+        url = urljoin(url, next_links[0])
+    return list(links)
+
+
+def discover_browser(url, pattern=DETAIL_PATTERN, max_pages=20, timeout=10, headless=True):
+    """Mở trang một lần, bấm "xem thêm"/cuộn để tải hết danh sách rồi lấy link từ DOM đã render
+
+    Số lần điều hướng không tăng theo số link (trước đây: click từng mục rồi back).
+    """
+    from selenium import webdriver
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    driver = webdriver.Chrome(options=options)
     try:
-        # Reload lại element list mỗi vòng lặp (DOM sẽ reload sau mỗi back)
-        items = wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "cursor-pointer")))
-        item = items[index]
-        driver.execute_script("arguments[0].scrollIntoView(true);", item)
-        time.sleep(1)
-        driver.execute_script("arguments[0].click();", item)  # Dùng JavaScript click tránh lỗi tương tác
+        driver.get(url)
+        WebDriverWait(driver, timeout).until(EC.presence_of_all_elements_located((By.CLASS_NAME, "cursor-pointer")))
+        count_js = "return document.getElementsByClassName('cursor-pointer').length;"
+        for _ in range(max_pages - 1):
+            before = driver.execute_script(count_js)
+            if not driver.execute_script(LOAD_MORE_JS):
+                break
+            try:
+                WebDriverWait(driver, timeout, poll_frequency=0.2).until(
+                    lambda d: d.execute_script(count_js) > before
+                )
+            except TimeoutException:
+                break  # không có mục mới -> đã hết danh sách
+        return extract_links(driver.page_source, driver.current_url, pattern)
+    finally:
+        driver.quit()
+
+
+def check_fixture():
+    """Kiểm tra extract_links với trang HTML lưu sẵn (fixtures/event_list.html)"""
+    with open(os.path.join(BASE_DIR, "fixtures", "event_list.expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    # Link trong fixture là của trang thật nên dùng BASE_URL làm gốc
+    links = [urlsplit(link).path for link in extract_links(Path(FIXTURE).read_text(encoding="utf-8"), BASE_URL)]
+    missing = [link for link in expected if link not in links]
+    extra = [link for link in links if link not in expected]
+    print(f"{'✅' if not missing and not extra else '❌'} {len(links)} link, thiếu {missing}, thừa {extra}")
+    return not missing and not extra
 
-        # Chờ trang mới load
-        wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        time.sleep(1)
 
-        current_url = driver.current_url
-        print(f"✅ {index + 1}. URL:", current_url)
-        links.append(current_url)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lấy danh sách link trang khuyến mãi")
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "links_click_discovered.json"))
+    parser.add_argument("--pattern", default=DETAIL_PATTERN, help="regex đường dẫn trang chi tiết")
+    parser.add_argument("--max-pages", type=int, default=20, help="số lần tải thêm/trang sau tối đa")
+    parser.add_argument("--static", action="store_true", help="không dùng trình duyệt (tải HTML + JSON nhúng)")
+    parser.add_argument("--show", action="store_true", help="hiện cửa sổ trình duyệt")
+    parser.add_argument("--check", action="store_true", help="chỉ kiểm tra với fixtures/event_list.html")
+    args = parser.parse_args(argv)
 
-        driver.back()
-        wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "cursor-pointer")))
+    if args.check:
+        raise SystemExit(0 if check_fixture() else 1)
 
-    except Exception as e:
-        print(f"⚠️ Lỗi ở mục {index + 1}: {e}")
-        driver.get(base_url)  # Reload lại trang gốc nếu gặp lỗi
-        wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "cursor-pointer")))
+    if args.static:
+        links = discover_static(args.url, args.pattern, args.max_pages)
+    else:
+        links = discover_browser(args.url, args.pattern, args.max_pages, headless=not args.show)
+    for index, link in enumerate(links, 1):
+        print(f"✅ {index}. URL:", link)
 
-# Lưu kết quả
-links = links[2:]
-with open("links_click_discovered.json", "w", encoding="utf-8") as f:
-    json.dump(links, f, ensure_ascii=False, indent=2)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(links, f, ensure_ascii=False, indent=2)
+    print(f"🎉 Đã lưu {len(links)} link vào {args.output}")
 
-print("🎉 Đã lưu danh sách link vào links_click_discovered.json")
 
-driver.quit()
+if __name__ == "__main__":
+    main()
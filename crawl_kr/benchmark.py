@@ -0,0 +1,150 @@
+"""So sánh thời gian crawl: cách cũ (1 trình duyệt, sleep cố định, find_element từng card)
+với crawler.py (nhiều trình duyệt song song, chờ theo điều kiện, lấy card bằng 1 lần execute_script).
+
+Chạy trên trang HTML lưu sẵn (fixtures/category.html, tạo từ price.json) nên không cần mạng:
+    python crawl_kr/benchmark.py --workers 4 --delay 0.3
+"""
+import argparse
+import html
+import json
+import os
+import time
+from pathlib import Path
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from crawler import BASE_DIR, DriverPool, crawl, make_driver
+
+FIXTURE = os.path.join(BASE_DIR, "fixtures", "category.html")
+
+# Trang giả lập: click tab thì xoá card cũ, chờ ?delay= giây (giống tải dữ liệu) rồi vẽ card mới
+FIXTURE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Category fixture</title></head>
+<body>
+<div class="tabs">
+{tabs}
+</div>
+<div id="cards"></div>
+<script id="data" type="application/json">{data}</script>
+<script>
+const data = JSON.parse(document.getElementById("data").textContent);
+const delay = parseFloat(new URLSearchParams(location.search).get("delay") || "0.3") * 1000;
+const container = document.getElementById("cards");
+const span = (cls, value) => value ? `<span class="${{cls}}">${{value}}</span>` : "";
+function show(index) {{
+    document.querySelectorAll(".category-btn").forEach((tab, i) => tab.classList.toggle("active", i === index));
+    container.innerHTML = "";
+    setTimeout(() => {{
+        container.innerHTML = data[index].treatments.map(t => `
+            <div class="treatment-card" data-name="${{t.name.replace(/"/g, "&quot;")}}">
+              <div class="treatment-price">
+                ${{span("discount", t.discount)}}${{span("original-price", t.origin_price)}}
+                ${{span("price", t.price)}}${{span("vat-notice", t.vat_notice)}}
+              </div>
+            </div>`).join("");
+    }}, delay);
+}}
+document.querySelectorAll(".category-btn").forEach((tab, i) => tab.addEventListener("click", () => show(i)));
+show(0);
+</script>
+</body>
+</html>
+"""
+
+
+def make_fixture(json_path=os.path.join(BASE_DIR, "price.json"), html_path=FIXTURE):
+    """Tạo trang HTML giả lập từ file JSON đã crawl"""
+    with open(json_path, encoding="utf-8") as f:
+        data = json.load(f)
+    tabs = "\n".join(f'  <button class="category-btn">{html.escape(tab["tab"])}</button>' for tab in data)
+    os.makedirs(os.path.dirname(html_path), exist_ok=True)
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(FIXTURE_TEMPLATE.format(
+            tabs=tabs,
+            data=json.dumps(data, ensure_ascii=False).replace("</", "<\\/")
+        ))
+    return data
+
+
+def legacy_crawl(url):
+    """Cách crawl cũ (Crawl_price.py trước đây), chỉ chạy ngầm để so sánh công bằng"""
+    driver = make_driver(headless=True)
+    wait = WebDriverWait(driver, 10)
+    try:
+        driver.get(url)
+        wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "category-btn")))
+        tabs = driver.find_elements(By.CLASS_NAME, "category-btn")
+        all_results = []
+        for i in range(len(tabs)):
+            tabs = driver.find_elements(By.CLASS_NAME, "category-btn")
+            tab = tabs[i]
+            tab_name = tab.text.strip()
+            driver.execute_script("arguments[0].scrollIntoView(true);", tab)
+            time.sleep(0.5)
+            driver.execute_script("arguments[0].click();", tab)
+            time.sleep(1.5)
+            wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "treatment-card")))
+            tab_data = []
+            for card in driver.find_elements(By.CLASS_NAME, "treatment-card"):
+                price_block = card.find_element(By.CLASS_NAME, "treatment-price")
+
+                def get_text(class_name):
+                    try:
+                        return price_block.find_element(By.CLASS_NAME, class_name).text.strip()
+                    except Exception:
+                        return ""
+
+                tab_data.append({
+                    "name": card.get_attribute("data-name"),
+                    "discount": get_text("discount"),
+                    "price": get_text("price"),
+                    "origin_price": get_text("original-price"),
+                    "vat_notice": get_text("vat-notice")
+                })
+            all_results.append({"tab": tab_name, "treatments": tab_data})
+        return all_results
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh thời gian crawl cũ/mới trên trang HTML lưu sẵn")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.3, help="thời gian giả lập tải nội dung mỗi tab (giây)")
+    parser.add_argument("--rebuild", action="store_true", help="tạo lại fixture từ price.json")
+    parser.add_argument("--skip-legacy", action="store_true", help="bỏ qua cách cũ (chậm)")
+    args = parser.parse_args()
+
+    if args.rebuild or not os.path.exists(FIXTURE):
+        make_fixture()
+    with open(os.path.join(BASE_DIR, "price.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    url = Path(FIXTURE).as_uri() + f"?delay={args.delay}"
+
+    timings = {}
+    runs = [] if args.skip_legacy else [("cũ (tuần tự + sleep)", lambda: legacy_crawl(url))]
+    runs.append(("mới, 1 trình duyệt", lambda: crawl(url, workers=1)))
+    runs.append((f"mới, {args.workers} trình duyệt", lambda: crawl(url, workers=args.workers)))
+    # Trình duyệt đã mở sẵn: chỉ tính thời gian crawl, không tính khởi động Chrome
+    with DriverPool(args.workers) as pool:
+        crawl(url, workers=args.workers, pool=pool)
+        runs.append((f"mới, {args.workers} trình duyệt mở sẵn", lambda: crawl(url, workers=args.workers, pool=pool)))
+
+        for label, run in runs:
+            started = time.perf_counter()
+            results = run()
+            timings[label] = time.perf_counter() - started
+            status = "khớp" if results == expected else "KHÁC price.json"
+            print(f"⏱️ {label}: {timings[label]:.2f}s ({len(results)} tab, {status})")
+
+    baseline = next(iter(timings.values()))
+    print("\nKết quả:")
+    for label, seconds in timings.items():
+        print(f"- {label}: {seconds:.2f}s (x{baseline / seconds:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import json
+import os
+from datetime import datetime
+
+# Các trường so sánh giữa hai lần crawl
+FIELDS = ("discount", "price", "origin_price", "vat_notice")
+
+# Bảng thay đổi mà bot đọc định kỳ (main.py: poll_catalog_changes)
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    id BIGSERIAL PRIMARY KEY,
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    item JSONB,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def clean(value):
+    """Gộp khoảng trắng (giống cách price_catalog đặt tên/ danh mục)"""
+    return " ".join(str(value).split())
+
+
+def index_snapshot(results):
+    """Kết quả crawl -> {(tab, tên gói): dữ liệu gói}"""
+    items = {}
+    for tab in results or []:
+        for treatment in tab.get("treatments", []):
+            items[(clean(tab["tab"]), clean(treatment.get("name") or ""))] = treatment
+    return items
+
+
+def diff_snapshots(old, new):
+    """So sánh hai lần crawl: gói thêm mới, bị xoá, hoặc đổi giá/giảm giá"""
+    before, after = index_snapshot(old), index_snapshot(new)
+    changes = []
+    for key, item in after.items():
+        previous = before.get(key)
+        if previous is None:
+            changes.append({"kind": "added", "category": key[0], "name": key[1], "item": item})
+            continue
+        fields = [field for field in FIELDS if previous.get(field, "") != item.get(field, "")]
+        if fields:
+            changes.append({
+                "kind": "changed", "category": key[0], "name": key[1], "item": item,
+                "fields": {field: [previous.get(field, ""), item.get(field, "")] for field in fields}
+            })
+    for key, item in before.items():
+        if key not in after:
+            changes.append({"kind": "removed", "category": key[0], "name": key[1], "item": None})
+    return changes
+
+
+class CrawlStore:
+    """Lưu kết quả crawl (file JSON) và ghi lại những gì thay đổi so với lần trước (JSONL)"""
+
+    def __init__(self, path, history_path=None):
+        self.path = path
+        self.source = os.path.basename(path)
+        self.history_path = history_path or os.path.splitext(path)[0] + ".changes.jsonl"
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def prepare(self, results, keep=()):
+        """So sánh với lần trước, trả về (kết quả sẽ lưu, danh sách thay đổi)
+
+        Tab trong keep (crawl bị lỗi) giữ dữ liệu lần trước để không bị coi là đã xoá.
+        """
+        previous = self.load()
+        if keep:
+            crawled = {tab["tab"] for tab in results}
+            results = results + [tab for tab in previous if tab["tab"] in keep and tab["tab"] not in crawled]
+        return results, diff_snapshots(previous, results)
+
+    def save(self, results, changes):
+        """Lưu kết quả mới và ghi thêm các thay đổi vào lịch sử"""
+        tmp = f"{self.path}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+        if changes:
+            crawled_at = datetime.now().isoformat(timespec="seconds")
+            with open(self.history_path, "a", encoding="utf-8") as f:
+                for change in changes:
+                    f.write(json.dumps({"crawled_at": crawled_at, "source": self.source, **change}, ensure_ascii=False) + "\n")
+
+    def update(self, results, keep=()):
+        """Lưu kết quả mới và trả về danh sách thay đổi"""
+        results, changes = self.prepare(results, keep)
+        self.save(results, changes)
+        return changes
+
+    def publish(self, changes, database_url):
+        """Ghi thay đổi vào bảng catalog_changes để bot đang chạy cập nhật bảng giá (không cần khởi động lại)"""
+        if not changes:
+            return 0
+        import psycopg
+        from psycopg.types.json import Jsonb
+
+        with psycopg.connect(database_url) as conn:
+            conn.execute(CREATE_TABLE_SQL)
+            with conn.cursor() as cur:
+                cur.executemany(
+                    "INSERT INTO catalog_changes (source, kind, category, name, item) VALUES (%s, %s, %s, %s, %s)",
+                    [
+                        (self.source, change["kind"], change["category"], change["name"],
+                         Jsonb(change["item"]) if change["item"] is not None else None)
+                        for change in changes
+                    ]
+                )
+        return len(changes)
+
+
+def summarize(changes):
+    counts = {"added": 0, "removed": 0, "changed": 0}
+    for change in changes:
+        counts[change["kind"]] += 1
+    return f"thêm {counts['added']}, xoá {counts['removed']}, đổi giá {counts['changed']}"
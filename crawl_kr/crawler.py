@@ -0,0 +1,254 @@
+import argparse
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from changes import CrawlStore, summarize
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Các trang cần crawl: tên -> (URL, file lưu mặc định)
+PAGES = {
+    "price": ("https://gangnam.museclinic.co.kr/en/pages/category", os.path.join(BASE_DIR, "price.json")),
+    "events": ("https://gangnam.museclinic.co.kr/en/pages/events", os.path.join(BASE_DIR, "all_treatment_tabs.json")),
+}
+
+TAB_CLASS = "category-btn"
+CARD_CLASS = "treatment-card"
+
+# Lấy tên tất cả các tab trong một lần gọi
+TAB_NAMES_JS = """
+return Array.from(document.getElementsByClassName(arguments[0])).map(tab => tab.innerText.trim());
+"""
+
+# Đánh dấu các card hiện tại là cũ rồi click tab (trả về true nếu tab đã đang được chọn)
+CLICK_TAB_JS = """
+const tab = document.getElementsByClassName(arguments[0])[arguments[1]];
+for (const card of document.getElementsByClassName(arguments[2])) card.dataset.crawlStale = "1";
+const wasActive = tab.classList.contains("active") || tab.getAttribute("aria-selected") === "true";
+tab.scrollIntoView(true);
+tab.click();
+return wasActive;
+"""
+
+# Trạng thái card: [số card, số card cũ] để chờ nội dung tab mới
+CARD_STATE_JS = """
+const cards = document.getElementsByClassName(arguments[0]);
+let stale = 0;
+for (const card of cards) if (card.dataset.crawlStale) stale++;
+return [cards.length, stale];
+"""
+
+# Lấy dữ liệu tất cả card trong một lần gọi (thay cho find_element từng card)
+EXTRACT_CARDS_JS = """
+const text = (root, cls) => {
+    const el = root.getElementsByClassName(cls)[0];
+    return el ? el.innerText.trim() : "";
+};
+const results = [];
+for (const card of document.getElementsByClassName(arguments[0])) {
+    const price = card.getElementsByClassName("treatment-price")[0];
+    if (!price) continue;
+    results.push({
+        name: card.getAttribute("data-name"),
+        discount: text(price, "discount"),
+        price: text(price, "price"),
+        origin_price: text(price, "original-price"),
+        vat_notice: text(price, "vat-notice")
+    });
+}
+return results;
+"""
+
+
+def make_driver(headless=True):
+    """Tạo Chrome (mặc định chạy ngầm, không tải ảnh cho nhanh)"""
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--window-size=1280,2000")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.page_load_strategy = "eager"  # không chờ ảnh/quảng cáo tải xong
+    return webdriver.Chrome(options=options)
+
+
+class DriverPool:
+    """Nhóm trình duyệt dùng chung giữa các luồng (tạo dần khi cần, tối đa size cái)"""
+
+    def __init__(self, size=4, headless=True, factory=None):
+        self.size = size
+        self.factory = factory or (lambda: make_driver(headless))
+        self.idle = queue.Queue()
+        self.drivers = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def driver(self):
+        driver = self._acquire()
+        try:
+            yield driver
+        except WebDriverException:
+            # Trình duyệt lỗi thì bỏ luôn, lần sau tạo cái mới
+            self._discard(driver)
+            raise
+        else:
+            self.idle.put(driver)
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            create = len(self.drivers) < self.size
+            if create:
+                self.drivers.append(None)  # giữ chỗ trong lúc tạo
+        if not create:
+            return self.idle.get()
+        try:
+            driver = self.factory()
+        except Exception:
+            with self.lock:
+                self.drivers.remove(None)
+            raise
+        with self.lock:
+            self.drivers[self.drivers.index(None)] = driver
+        return driver
+
+    def _discard(self, driver):
+        with self.lock:
+            self.drivers.remove(driver)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def close(self):
+        with self.lock:
+            drivers, self.drivers = [d for d in self.drivers if d is not None], []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_page(driver, url, timeout=10):
+    """Mở trang (nếu chưa mở) và trả về danh sách tên tab"""
+    if driver.current_url != url:
+        driver.get(url)
+    WebDriverWait(driver, timeout).until(EC.presence_of_all_elements_located((By.CLASS_NAME, TAB_CLASS)))
+    return driver.execute_script(TAB_NAMES_JS, TAB_CLASS)
+
+
+def cards_ready(was_active):
+    """Điều kiện chờ: đã có card của tab mới và số card không đổi giữa hai lần kiểm tra
+
+    Nếu tab đã được chọn sẵn (trang có thể không vẽ lại) thì không cần card mới.
+    """
+    last = {"count": None}
+
+    def check(driver):
+        count, stale = driver.execute_script(CARD_STATE_JS, CARD_CLASS)
+        if not count or (stale and not was_active):
+            last["count"] = None
+            return False
+        stable = count == last["count"]
+        last["count"] = count
+        return stable
+
+    return check
+
+
+def crawl_tab(driver, url, index, timeout=10):
+    """Click tab thứ index và lấy dữ liệu tất cả card"""
+    names = open_page(driver, url, timeout)
+    tab_name = names[index]
+    was_active = driver.execute_script(CLICK_TAB_JS, TAB_CLASS, index, CARD_CLASS)
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(cards_ready(was_active))
+    except TimeoutException:
+        print(f"⚠️ Tab '{tab_name}': hết thời gian chờ, lấy dữ liệu đang có")
+    treatments = driver.execute_script(EXTRACT_CARDS_JS, CARD_CLASS)
+    return {"tab": tab_name, "treatments": treatments}
+
+
+def crawl(url, workers=4, headless=True, timeout=10, pool=None, failed=None):
+    """Crawl song song tất cả tab của trang, kết quả giữ đúng thứ tự tab
+
+    Tab bị lỗi không có trong kết quả; nếu truyền list failed thì tên các tab đó được thêm vào.
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = DriverPool(workers, headless)
+    try:
+        with pool.driver() as driver:
+            names = open_page(driver, url, timeout)
+            tab_count = len(names)
+
+        def work(index):
+            try:
+                with pool.driver() as driver:
+                    result = crawl_tab(driver, url, index, timeout)
+                print(f"✅ Tab '{result['tab']}' có {len(result['treatments'])} gói.")
+                return result
+            except Exception as e:
+                print(f"❌ Lỗi khi xử lý tab {index}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(work, range(tab_count)))
+    finally:
+        if own_pool:
+            pool.close()
+    if failed is not None:
+        failed.extend(names[index] for index, result in enumerate(results) if result is None)
+    return [result for result in results if result is not None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl giá/sự kiện theo từng tab")
+    parser.add_argument("page", help=f"{' | '.join(PAGES)} hoặc URL bất kỳ")
+    parser.add_argument("--output", help="file JSON lưu kết quả (mặc định theo trang)")
+    parser.add_argument("--workers", type=int, default=4, help="số trình duyệt chạy song song")
+    parser.add_argument("--timeout", type=float, default=10, help="thời gian chờ tối đa mỗi tab (giây)")
+    parser.add_argument("--show", action="store_true", help="hiện cửa sổ trình duyệt")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"),
+                        help="gửi thay đổi vào bảng catalog_changes cho bot (mặc định: biến môi trường DATABASE_URL)")
+    args = parser.parse_args(argv)
+
+    url, output = PAGES.get(args.page, (args.page, None))
+    output = args.output or output
+    if not output:
+        parser.error("cần --output khi crawl URL tự nhập")
+
+    failed = []
+    results = crawl(url, workers=args.workers, headless=not args.show, timeout=args.timeout, failed=failed)
+    if not results:
+        print("❌ Không crawl được tab nào, giữ nguyên dữ liệu cũ")
+        return
+
+    store = CrawlStore(output)
+    changes = store.update(results, keep=failed)
+    print(f"🎉 Đã lưu {len(results)} tab vào {output} ({summarize(changes)})")
+    if args.database_url and changes:
+        print(f"📤 Đã gửi {store.publish(changes, args.database_url)} thay đổi cho bot")
+
+
+if __name__ == "__main__":
+    main()
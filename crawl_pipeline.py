@@ -0,0 +1,371 @@
+"""Chạy toàn bộ quy trình crawl cho các phòng khám (KR: museclinic, HK: skinbeam)
+
+Mỗi site chạy các bước discover -> fetch -> parse -> normalize -> publish theo thứ tự,
+các site chạy song song trong process pool, nên cả lượt chỉ mất bằng thời gian của site chậm nhất.
+Kết quả từng bước và thời gian chạy được lưu trong thư mục lượt chạy (crawl_runs/<thời điểm>/<site>/);
+nếu một bước lỗi, --resume chạy tiếp từ bước đó thay vì làm lại từ đầu.
+
+Cách dùng:
+    python crawl_pipeline.py                     # crawl tất cả site
+    python crawl_pipeline.py --sites hk --hk-static
+    python crawl_pipeline.py --resume            # chạy tiếp lượt gần nhất chưa xong
+    python crawl_pipeline.py --every 6           # chạy lại mỗi 6 giờ
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("discover", "fetch", "parse", "normalize", "publish")
+
+
+def _use(folder):
+    """Cho phép import các module trong thư mục crawler (chỉ gọi trong process của site đó)"""
+    path = os.path.join(BASE_DIR, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def _clean(value):
+    return " ".join(str(value or "").split())
+
+
+# ---------- KR (museclinic): bảng giá theo tab ----------
+
+class KRSite:
+    name = "kr"
+
+    def __init__(self, config):
+        _use("crawl_kr")
+        from crawler import PAGES
+        self.config = config
+        self.pages = {page: {"url": url, "output": output} for page, (url, output) in PAGES.items()}
+        self.pool = None
+
+    def driver_pool(self):
+        if self.pool is None:
+            from crawler import DriverPool
+            self.pool = DriverPool(self.config["workers"], headless=not self.config["show"])
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+    def discover(self, inputs):
+        """Danh sách tab của từng trang"""
+        from crawler import open_page
+        pages = {}
+        with self.driver_pool().driver() as driver:
+            for page, info in self.pages.items():
+                pages[page] = {**info, "tabs": open_page(driver, info["url"], self.config["timeout"])}
+        return {"pages": pages}
+
+    def fetch(self, inputs):
+        """Crawl song song các tab của từng trang"""
+        from crawler import crawl
+        pages = {}
+        for page, info in inputs["discover"]["pages"].items():
+            failed = []
+            results = crawl(info["url"], workers=self.config["workers"], timeout=self.config["timeout"],
+                            pool=self.driver_pool(), failed=failed)
+            crawled = {result["tab"] for result in results}
+            # Tab thấy lúc discover nhưng không crawl được cũng tính là lỗi
+            failed.extend(tab for tab in info["tabs"] if tab not in crawled and tab not in failed)
+            pages[page] = {"results": results, "failed": failed}
+        return {"pages": pages}
+
+    def parse(self, inputs):
+        """Chuẩn hoá khoảng trắng, bỏ gói không có tên"""
+        pages = {}
+        for page, data in inputs["fetch"]["pages"].items():
+            results = []
+            for tab in data["results"]:
+                treatments = [
+                    {key: _clean(value) for key, value in treatment.items()}
+                    for treatment in tab["treatments"] if _clean(treatment.get("name"))
+                ]
+                results.append({"tab": tab["tab"], "treatments": treatments})
+            pages[page] = {"results": results, "failed": data["failed"]}
+        return {"pages": pages}
+
+    def normalize(self, inputs):
+        """So sánh với lần crawl trước (chưa ghi file)"""
+        from changes import CrawlStore, summarize
+        pages = {}
+        for page, data in inputs["parse"]["pages"].items():
+            if not data["results"]:
+                raise RuntimeError(f"trang {page}: không crawl được tab nào")
+            store = CrawlStore(self.pages[page]["output"])
+            results, changes = store.prepare(data["results"], keep=data["failed"])
+            print(f"[kr] {page}: {summarize(changes)}")
+            pages[page] = {"results": results, "changes": changes}
+        return {"pages": pages}
+
+    def publish(self, inputs):
+        """Ghi file JSON + lịch sử thay đổi, gửi thay đổi cho bot (nếu có DATABASE_URL)"""
+        from changes import CrawlStore
+        published = {}
+        for page, data in inputs["normalize"]["pages"].items():
+            store = CrawlStore(self.pages[page]["output"])
+            store.save(data["results"], data["changes"])
+            database_url = self.config["database_url"]
+            published[page] = store.publish(data["changes"], database_url) if database_url else 0
+        return {"published": published}
+
+
+# ---------- HK (skinbeam): trang khuyến mãi ----------
+
+class HKSite:
+    name = "hk"
+
+    def __init__(self, config):
+        _use("crawl_hk")
+        from get_url_promotions import BASE_URL
+        self.config = config
+        self.url = config["hk_url"] or BASE_URL
+        self.folder = os.path.join(BASE_DIR, "crawl_hk")
+        self.snapshot_path = os.path.join(self.folder, "clean_promotions.json")
+        self.validators_path = os.path.join(self.folder, "promotions_cache.json")
+        self.boilerplate_path = os.path.join(self.folder, "promotions_boilerplate.json")
+
+    def close(self):
+        pass
+
+    def discover(self, inputs):
+        """Danh sách link trang khuyến mãi (một lần tải trang danh sách)"""
+        from get_url_promotions import discover_browser, discover_static
+        if self.config["hk_static"]:
+            links = discover_static(self.url)
+        else:
+            links = discover_browser(self.url, headless=not self.config["show"])
+        if not links:
+            raise RuntimeError("không tìm thấy link khuyến mãi nào")
+        # Giữ file cũ cho ai vẫn chạy get_promotions.py bằng tay
+        with open(os.path.join(self.folder, "links_click_discovered.json"), "w", encoding="utf-8") as f:
+            json.dump(links, f, ensure_ascii=False, indent=2)
+        return {"links": links}
+
+    def fetch(self, inputs):
+        """Tải các trang (bỏ qua trang không đổi nhờ ETag/Last-Modified)"""
+        from get_promotions import fetch_all, load_validators
+        output_path = os.path.join(self.config["site_dir"], "fetch.jsonl")
+        validators = load_validators(self.validators_path)
+        with open(output_path, "w", encoding="utf-8") as output:
+            stats = asyncio.run(fetch_all(inputs["discover"]["links"], output, validators))
+        # ETag mới chỉ được lưu ở bước publish, để trang chưa kịp ghi vào snapshot không bị bỏ qua (304) ở lượt sau
+        return {"output": output_path, "stats": stats, "validators": validators}
+
+    def parse(self, inputs):
+        """Đọc kết quả tải: trang mới/thay đổi và trang lỗi"""
+        pages, errors = {}, {}
+        with open(inputs["fetch"]["output"], encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "error" in record:
+                    errors[record["url"]] = record["error"]
+                else:
+                    pages[record.pop("url")] = record
+        return {"pages": pages, "errors": errors}
+
+    def normalize(self, inputs):
+        """Bỏ dòng lặp lại giữa các trang, gộp với bản trước (trang không đổi/lỗi giữ nội dung cũ) và tính thay đổi"""
+        from extract import BoilerplateFilter
+        previous = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                previous = {item["url"]: item for item in json.load(f)}
+        fetched = inputs["parse"]["pages"]
+        boilerplate = BoilerplateFilter.load(self.boilerplate_path)
+        boilerplate.learn(page["text"] for page in fetched.values())
+        snapshot, changes = [], []
+        for url in inputs["discover"]["links"]:
+            if url in fetched:
+                page = {"url": url, **fetched[url], "text": boilerplate.apply(fetched[url]["text"])}
+            elif url in previous:
+                page = previous[url]
+            else:
+                continue
+            snapshot.append(page)
+            if url not in previous:
+                changes.append({"kind": "added", "url": url})
+            elif page["text"] != previous[url]["text"]:
+                changes.append({"kind": "changed", "url": url})
+        links = set(inputs["discover"]["links"])
+        changes.extend({"kind": "removed", "url": url} for url in previous if url not in links)
+        print(f"[hk] {len(snapshot)} trang, {len(changes)} thay đổi, {len(inputs['parse']['errors'])} lỗi")
+        return {"snapshot": snapshot, "changes": changes, "boilerplate": sorted(boilerplate.lines)}
+
+    def publish(self, inputs):
+        """Ghi bản đầy đủ clean_promotions.json, lịch sử thay đổi, ETag/Last-Modified và danh sách dòng lặp lại"""
+        from extract import BoilerplateFilter
+        from get_promotions import save_validators
+        data = inputs["normalize"]
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data["snapshot"], f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.snapshot_path)
+        if data["changes"]:
+            crawled_at = datetime.now().isoformat(timespec="seconds")
+            with open(os.path.join(self.folder, "clean_promotions.changes.jsonl"), "a", encoding="utf-8") as f:
+                for change in data["changes"]:
+                    f.write(json.dumps({"crawled_at": crawled_at, **change}, ensure_ascii=False) + "\n")
+        save_validators(self.validators_path, inputs["fetch"]["validators"])
+        BoilerplateFilter(data["boilerplate"]).save(self.boilerplate_path)
+        return {"pages": len(data["snapshot"]), "changes": len(data["changes"])}
+
+
+SITES = {"kr": KRSite, "hk": HKSite}
+
+
+def _load(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _dump(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def run_site(site_name, run_dir, config):
+    """Chạy các bước của một site (trong process riêng), bỏ qua bước đã xong ở lần trước
+
+    Trạng thái (state.json): bước -> {"status", "seconds", "finished_at", "error"}.
+    """
+    site_dir = os.path.join(run_dir, site_name)
+    os.makedirs(site_dir, exist_ok=True)
+    state_path = os.path.join(site_dir, "state.json")
+    state = _load(state_path, {})
+    site = SITES[site_name]({**config, "site_dir": site_dir})
+    inputs = {}
+    started = time.perf_counter()
+    try:
+        for stage in STAGES:
+            output_path = os.path.join(site_dir, f"{stage}.json")
+            if state.get(stage, {}).get("status") == "done":
+                inputs[stage] = _load(output_path)
+                print(f"[{site_name}] {stage}: đã xong ở lần trước, bỏ qua")
+                continue
+            stage_started = time.perf_counter()
+            try:
+                inputs[stage] = getattr(site, stage)(inputs)
+            except Exception as e:
+                state[stage] = {
+                    "status": "failed",
+                    "seconds": round(time.perf_counter() - stage_started, 3),
+                    "finished_at": datetime.now().isoformat(timespec="seconds"),
+                    "error": f"{type(e).__name__}: {e}",
+                }
+                _dump(state_path, state)
+                print(f"[{site_name}] ❌ {stage} lỗi: {e}")
+                traceback.print_exc()
+                break
+            _dump(output_path, inputs[stage])
+            state[stage] = {
+                "status": "done",
+                "seconds": round(time.perf_counter() - stage_started, 3),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            _dump(state_path, state)
+            print(f"[{site_name}] ✅ {stage}: {state[stage]['seconds']:.1f}s")
+    finally:
+        site.close()
+    return site_name, state, round(time.perf_counter() - started, 3)
+
+
+def latest_unfinished_run(workdir):
+    """Thư mục lượt chạy gần nhất còn bước chưa xong (để --resume)"""
+    if not os.path.isdir(workdir):
+        return None
+    for name in sorted(os.listdir(workdir), reverse=True):
+        run_dir = os.path.join(workdir, name)
+        summary = _load(os.path.join(run_dir, "summary.json"))
+        if summary is None or not summary.get("ok"):
+            return run_dir
+    return None
+
+
+def run_pipeline(sites, config, workdir, resume=False):
+    run_dir = latest_unfinished_run(workdir) if resume else None
+    if run_dir is None:
+        run_dir = os.path.join(workdir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(run_dir, exist_ok=True)
+    print(f"📁 Lượt chạy: {run_dir}")
+
+    started = time.perf_counter()
+    results = {}
+    # Mỗi site một process mới (module crawler của các site không lẫn nhau)
+    with ProcessPoolExecutor(max_workers=len(sites), max_tasks_per_child=1) as executor:
+        futures = [executor.submit(run_site, site, run_dir, config) for site in sites]
+        for future in futures:
+            site_name, state, seconds = future.result()
+            results[site_name] = {"seconds": seconds, "stages": state}
+
+    elapsed = round(time.perf_counter() - started, 3)
+    ok = all(
+        all(site["stages"].get(stage, {}).get("status") == "done" for stage in STAGES)
+        for site in results.values()
+    )
+    summary = {
+        "ok": ok,
+        "sites": results,
+        "elapsed_seconds": elapsed,
+        # So sánh: chạy lần lượt từng site sẽ mất tổng thời gian các site
+        "sequential_seconds": round(sum(site["seconds"] for site in results.values()), 3),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    _dump(os.path.join(run_dir, "summary.json"), summary)
+
+    print("\n⏱️ Thời gian:")
+    for site_name, site in results.items():
+        stages = ", ".join(f"{stage} {info['seconds']:.1f}s" + ("" if info["status"] == "done" else " (lỗi)")
+                           for stage, info in site["stages"].items())
+        print(f"- {site_name}: {site['seconds']:.1f}s ({stages})")
+    print(f"- tổng: {elapsed:.1f}s (nếu chạy lần lượt: {summary['sequential_seconds']:.1f}s)")
+    print("🎉 Hoàn tất" if ok else "⚠️ Có bước bị lỗi, chạy lại với --resume để tiếp tục")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chạy quy trình crawl cho tất cả phòng khám")
+    parser.add_argument("--sites", nargs="+", choices=SITES, default=list(SITES))
+    parser.add_argument("--workdir", default=os.path.join(BASE_DIR, "crawl_runs"), help="thư mục lưu các lượt chạy")
+    parser.add_argument("--resume", action="store_true", help="chạy tiếp lượt gần nhất chưa xong")
+    parser.add_argument("--every", type=float, help="chạy lại sau mỗi N giờ")
+    parser.add_argument("--workers", type=int, default=4, help="số trình duyệt mỗi site")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--show", action="store_true", help="hiện cửa sổ trình duyệt")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"),
+                        help="gửi thay đổi bảng giá cho bot (mặc định: biến môi trường DATABASE_URL)")
+    parser.add_argument("--hk-url", help="trang danh sách khuyến mãi HK (mặc định theo get_url_promotions.py)")
+    parser.add_argument("--hk-static", action="store_true", help="HK: lấy link không cần trình duyệt")
+    args = parser.parse_args(argv)
+
+    config = {
+        "workers": args.workers,
+        "timeout": args.timeout,
+        "show": args.show,
+        "database_url": args.database_url,
+        "hk_url": args.hk_url,
+        "hk_static": args.hk_static,
+    }
+    summary = run_pipeline(args.sites, config, args.workdir, args.resume)
+    while args.every:
+        time.sleep(args.every * 3600)
+        summary = run_pipeline(args.sites, config, args.workdir)
+    raise SystemExit(0 if summary["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
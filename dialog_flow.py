@@ -0,0 +1,578 @@
+import os
+import random
+import re
+import sys
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import yaml
+
+from faq_router import FAQRouter, normalize
+from response_templates import ResponseRenderer, Template
+
+CONDITION_PATTERN = re.compile(r"^(\w+) is not None$")
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# 연도가 있는 날짜 (2025-06-03, 2025.6.3, 2025년 6월 3일, 2025年6月3日, 20250603)
+FULL_DATE_PATTERN = re.compile(
+    r"(?<!\d)(\d{4})\s*(?:[-./]|년)\s*(\d{1,2})\s*(?:[-./]|월)\s*(\d{1,2})\s*일?(?!\d)"
+    r"|(?<!\d)(\d{4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*[日號号]"
+    r"|(?<!\d)(\d{4})(\d{2})(\d{2})(?!\d)"
+)
+# 연도가 없는 날짜 (6월 3일, 6月3日/號)
+SHORT_DATE_PATTERN = re.compile(r"(?<![\d.\-/])(\d{1,2})\s*(?:월|月)\s*(\d{1,2})\s*(?:일|日|號|号)")
+RELATIVE_DATES = {
+    "오늘": 0, "today": 0, "今日": 0, "今天": 0,
+    "내일": 1, "tomorrow": 1, "明天": 1, "聽日": 1, "明日": 1,
+    "모레": 2, "後天": 2, "後日": 2,
+}
+TIME_PATTERNS = (
+    re.compile(r"(?<!\d)(\d{1,2}):(\d{2})(?!\d)\s*(am|pm)?", re.I),
+    # '1시간'(걸리는 시간), '2시술'은 시각이 아님
+    re.compile(r"(오전|오후)?\s*(\d{1,2})\s*시(?![간술])\s*(?:(\d{1,2})\s*분|(반))?"),
+    re.compile(r"(上午|朝早|下午|晏晝|晚上|夜晚)?\s*(\d{1,2})\s*[點点]\s*(?:(\d{1,2})\s*分|(半))?"),
+    re.compile(r"(?<!\d)(\d{1,2})\s*(am|pm)\b", re.I),
+)
+PM_MARKERS = ("오후", "下午", "晏晝", "晚上", "夜晚", "pm")
+AM_MARKERS = ("오전", "上午", "朝早", "am")
+NAME_PATTERN = re.compile(
+    r"(?:이름은|이름\s*:|성함은|성함\s*:|name is|name\s*:|我叫|我係|我是|姓名\s*[:：]?)\s*([^\s,/|@\d]+(?:\s[A-Za-z]+)?)",
+    re.I
+)
+NAME_SUFFIX_PATTERN = re.compile(r"(입니다|이에요|예요|이고|이요|라고 합니다|です)$")
+# 이름을 물어본 뒤에도 이름으로 보지 않는 짧은 답장 (예/아니오, 인사)
+NOT_NAMES = frozenset(normalize(word) for word in (
+    "네", "예", "응", "아니요", "아니오", "아뇨", "좋아요", "괜찮아요", "알겠습니다", "감사합니다", "고마워요", "안녕하세요",
+    "yes", "no", "ok", "okay", "sure", "thanks", "thank you", "hi", "hello",
+    "係", "唔係", "好", "好的", "冇", "多謝", "唔該", "你好", "是", "不是", "謝謝",
+))
+
+
+class Field:
+    """전이에서 모으는 값 하나 (예약 날짜, 지점 등)"""
+    __slots__ = ("name", "type", "label", "options")
+
+    def __init__(self, name, type="text", label=None, options=(), aliases=None):
+        self.name = name
+        self.type = type
+        self.label = label or name
+        # 정규화한 표기 -> 값 (aliases: {값: [다른 표기, ...]})
+        self.options = {}
+        for option in options:
+            for alias in [option, *(aliases or {}).get(option, ())]:
+                self.options[normalize(alias)] = option
+
+
+class Transition:
+    """의도 -> 다음 상태 (collect: 이 전이에서 모으는 값, required: 넘어가기 전에 있어야 하는 값)"""
+    __slots__ = ("intent", "target", "collect", "required", "missing")
+
+    def __init__(self, intent, target, collect=(), required=(), missing=None):
+        self.intent = intent
+        self.target = target  # 상태 번호
+        self.collect = tuple(collect)
+        self.required = tuple(required)
+        self.missing = Template(missing) if missing else None  # 값이 모자랄 때 보낼 안내 ({{missing}}에 빠진 항목 이름)
+
+
+class State:
+    """상태 하나 (lookup: 의도 -> Transition, 전역 전이까지 합쳐 미리 만든 표)"""
+    __slots__ = ("index", "name", "kind", "content", "response", "transitions", "own", "lookup", "awaiting")
+
+    def __init__(self, index, name, kind, content, response=None):
+        self.index = index
+        self.name = name
+        self.kind = kind  # "message" 또는 "end"
+        self.content = Template(content) if content else None  # 둘 다 없으면 LLM이 답변
+        self.response = response  # responses.json의 응답 ID (ResponseRenderer로 변형을 돌아가며 사용)
+        self.transitions = []
+        self.own = frozenset()  # 이 상태에 직접 적힌 전이의 의도 (전역 전이보다 우선)
+        self.lookup = {}
+        # 이 상태의 답변이 물어본 값 (들어오는 전이가 모으는 값, 단계 흐름이면 다음 단계의 값, 예: 이름을 물어본 뒤)
+        self.awaiting = ()
+
+
+def parse_condition(condition):
+    """'a is not None and b is not None' -> ("a", "b") (다른 형태의 조건은 지원하지 않음)"""
+    if not condition:
+        return ()
+    names = []
+    for part in condition.split(" and "):
+        match = CONDITION_PATTERN.match(part.strip())
+        if not match:
+            raise ValueError(f"지원하지 않는 조건: {condition}")
+        names.append(match.group(1))
+    return tuple(names)
+
+
+def parse_fields(items):
+    return [
+        Field(item["name"], item.get("type", "text"), item.get("label"), item.get("options", ()), item.get("aliases"))
+        for item in items or ()
+    ]
+
+
+class DialogFlow:
+    """dialog_flow.yaml을 한 번 컴파일한 상태/전이 표
+
+    상태는 번호로, 전이는 상태별 dict(의도 -> Transition)로 미리 만들어 두어 한 턴에 dict 조회 한 번이면 됨.
+    KR 형식(<이름>_flow: initial_state/states)과 HK 형식(dialog_flows: steps)을 모두 지원.
+    어느 흐름에서든 다음 상태가 하나뿐인 의도는 전역 전이로 어떤 상태에서도 사용.
+    """
+
+    def __init__(self):
+        self.states = [State(0, "start", "message", None)]
+        self.by_name = {}
+
+    @property
+    def start(self):
+        return self.states[0]
+
+    def add_state(self, name, kind="message", content=None, response=None):
+        state = State(len(self.states), name, kind, content, response)
+        self.states.append(state)
+        self.by_name[name] = state
+        return state
+
+    @classmethod
+    def from_directory(cls, path, filename="dialog_flow.yaml"):
+        with open(os.path.join(path, filename), encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        return cls.compile(data)
+
+    @classmethod
+    def compile(cls, data):
+        flow = cls()
+        if "dialog_flows" in data:
+            flow._compile_steps(data["dialog_flows"])
+        else:
+            flow._compile_states({key: value for key, value in data.items() if isinstance(value, dict) and "states" in value})
+        flow._build_lookup()
+        return flow
+
+    def _compile_states(self, flows):
+        """KR 형식: 흐름마다 상태와 전이가 명시되어 있음 (상태 이름은 '흐름.상태')"""
+        pending = []
+        for flow_name, spec in flows.items():
+            for state_name, state_spec in spec["states"].items():
+                self.add_state(f"{flow_name}.{state_name}", state_spec.get("type", "message"), state_spec.get("content"))
+            for state_name, state_spec in spec["states"].items():
+                for item in state_spec.get("transitions") or ():
+                    pending.append((f"{flow_name}.{state_name}", f"{flow_name}.{item['next_state']}", item))
+            # 흐름의 첫 상태에서 갈 수 있는 의도는 대화를 시작할 때도 사용 (첫 흐름의 첫 상태는 인사로 시작)
+            initial = f"{flow_name}.{spec['initial_state']}"
+            for item in spec["states"][spec["initial_state"]].get("transitions") or ():
+                pending.append(("start", f"{flow_name}.{item['next_state']}", item))
+            if not any(source == "start" and item["intent"] == "greeting" for source, _, item in pending):
+                pending.append(("start", initial, {"intent": "greeting"}))
+
+        for source, target, item in pending:
+            state = self.start if source == "start" else self.by_name[source]
+            state.transitions.append(Transition(
+                item["intent"], self.by_name[target].index, parse_fields(item.get("collect")),
+                parse_condition(item.get("condition")), item.get("missing_content")
+            ))
+
+    def _compile_steps(self, flows):
+        """HK 형식: 흐름은 단계 목록 (같은 흐름 안에서는 어느 단계로든 이동, 첫 단계는 대화 시작에도 사용)"""
+        for spec in flows:
+            steps = [
+                (self.add_state(f"{spec['name']}.{step['intent']}", "message", response=step.get("response")), step)
+                for step in spec.get("steps") or ()
+            ]
+            for source, _ in steps:
+                for target, step in steps:
+                    if target is not source:
+                        source.transitions.append(Transition(
+                            step["intent"], target.index, parse_fields(step.get("collect")),
+                            parse_condition(step.get("condition")), step.get("missing_content")
+                        ))
+            # 단계 답변은 다음 단계에서 모을 값을 물어봄 (예: 분점 확인 후 날짜) -> 답장에서 그 값을 찾음
+            # 자유 텍스트 값은 답장 전체를 값으로 보게 되므로 제외 (의도 판단으로만 넘어감)
+            for (state, _), (_, step) in zip(steps, steps[1:]):
+                state.awaiting = tuple(field for field in parse_fields(step.get("collect")) if field.type not in ("text", "name"))
+            if steps:
+                target, step = steps[0]
+                self.start.transitions.append(Transition(step["intent"], target.index))
+
+    def _build_lookup(self):
+        targets = {}
+        for state in self.states:
+            for transition in state.transitions:
+                targets.setdefault(transition.intent, {})[transition.target] = transition
+        global_lookup = {intent: next(iter(by_target.values())) for intent, by_target in targets.items() if len(by_target) == 1}
+        for state in self.states:
+            state.lookup = dict(global_lookup)
+            # 같은 의도가 여러 번 있으면 먼저 적힌 전이 사용
+            for transition in reversed(state.transitions):
+                state.lookup[transition.intent] = transition
+            state.own = frozenset(transition.intent for transition in state.transitions)
+        awaiting = {state.index: {field.name: field for field in state.awaiting} for state in self.states}
+        for state in self.states:
+            for transition in state.transitions:
+                for field in transition.collect:
+                    awaiting[transition.target].setdefault(field.name, field)
+        for index, fields in awaiting.items():
+            self.states[index].awaiting = tuple(fields.values())
+
+
+# ---------- 값 추출 ----------
+
+def _date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def parse_dates(text, today=None):
+    """메시지에 있는 날짜들 (연도 없는 날짜는 지나갔으면 내년으로)"""
+    today = today or date.today()
+    found = []
+    for match in FULL_DATE_PATTERN.finditer(text):
+        groups = [group for group in match.groups() if group is not None]
+        value = _date(*groups)
+        if value:
+            found.append((match.start(), value))
+    for match in SHORT_DATE_PATTERN.finditer(text):
+        value = _date(today.year, *match.groups())
+        if value and value < today:
+            value = _date(today.year + 1, *match.groups())
+        if value:
+            found.append((match.start(), value))
+    lowered = text.lower()
+    for word, days in RELATIVE_DATES.items():
+        position = lowered.find(word)
+        if position >= 0:
+            found.append((position, today + timedelta(days=days)))
+    return [value for _, value in sorted(found, key=lambda item: item[0])]
+
+
+def parse_time(text):
+    """메시지에 있는 시간 'HH:MM' (오전/오후 표시가 없는 1~8시는 영업시간 기준으로 오후로 봄)"""
+    for pattern in TIME_PATTERNS:
+        for match in pattern.finditer(text):
+            groups = match.groups()
+            if pattern is TIME_PATTERNS[0]:
+                hour, minute, marker = int(groups[0]), int(groups[1]), groups[2]
+            elif pattern is TIME_PATTERNS[3]:
+                hour, minute, marker = int(groups[0]), 0, groups[1]
+            else:
+                marker, hour = groups[0], int(groups[1])
+                minute = 30 if groups[3] else int(groups[2] or 0)
+            marker = (marker or "").lower()
+            if marker in PM_MARKERS and hour < 12:
+                hour += 12
+            elif marker in AM_MARKERS and hour == 12:
+                hour = 0
+            elif not marker and 1 <= hour <= 8:
+                hour += 12
+            if hour < 24 and minute < 60:
+                return f"{hour:02d}:{minute:02d}"
+    return None
+
+
+def _clean_name(value):
+    return NAME_SUFFIX_PATTERN.sub("", value.strip(" .。!,")).strip()
+
+
+def parse_name(text, alone=False):
+    """'제 이름은 ...', 'my name is ...', '我叫...' 형식의 이름
+
+    alone(이름만 물어본 직후의 답장)이면 짧은 메시지 전체를 이름으로 봄.
+    숫자·@·날짜·물음표가 있거나 예/아니오 같은 답장은 이름이 아님.
+    """
+    match = NAME_PATTERN.search(text)
+    if match:
+        return _clean_name(match.group(1)) or None
+    if not alone:
+        return None
+    value = _clean_name(text)
+    if (not value or len(value) > 20 or re.search(r"[\d@?？,，/|;\n]", value)
+            or normalize(value) in NOT_NAMES or any(word in value.lower() for word in RELATIVE_DATES)):
+        return None
+    return value
+
+
+def extract_values(fields, text, today=None, reply=False):
+    """메시지에서 fields 값 찾기
+
+    텍스트(이름 등)는 '제 이름은 ...'처럼 표시가 있는 경우에만 찾고,
+    reply(그 값을 물어본 직후의 답장)이면서 물어본 값이 그것 하나뿐이면 짧은 답장 전체를 값으로 봄.
+    """
+    values = {}
+    dates = None
+    lowered = normalize(text)
+    for field in fields:
+        if field.type == "email":
+            match = EMAIL_PATTERN.search(text)
+            if match:
+                values[field.name] = match.group(0)
+        elif field.type in ("date", "birth_date"):
+            if dates is None:
+                dates = parse_dates(text, today)
+            today_value = today or date.today()
+            # 10년 넘게 지난 날짜는 생년월일, 나머지는 예약 날짜
+            candidates = [d for d in dates if (d.year < today_value.year - 10) == (field.type == "birth_date")]
+            if candidates:
+                values[field.name] = candidates[0].isoformat()
+        elif field.type == "time":
+            value = parse_time(EMAIL_PATTERN.sub("", FULL_DATE_PATTERN.sub("", text)))
+            if value:
+                values[field.name] = value
+        elif field.type == "options":
+            for alias, option in field.options.items():
+                if alias and alias in lowered:
+                    values[field.name] = option
+                    break
+        elif field.type in ("text", "name"):
+            value = parse_name(text, alone=reply and len(fields) == 1)
+            if value:
+                values[field.name] = value
+    return values
+
+
+# ---------- 대화 상태 ----------
+
+class DialogSession:
+    """채널/사용자별 대화 위치 (상태 번호 + 모은 값)"""
+    __slots__ = ("state", "slots", "expires_at")
+
+    def __init__(self, state, slots, expires_at):
+        self.state = state
+        self.slots = slots  # 값이 없으면 None (메모리 절약)
+        self.expires_at = expires_at
+
+
+class DialogTurn:
+    """한 턴 처리 결과 (reply가 None이면 LLM이 답변)"""
+    __slots__ = ("state", "intent", "reply", "slots", "score")
+
+    def __init__(self, state, intent, reply, slots, score=None):
+        self.state = state
+        self.intent = intent
+        self.reply = reply
+        self.slots = slots
+        self.score = score
+
+
+class DialogEngine:
+    """예약 등 정해진 흐름의 대화를 LLM 없이 처리
+
+    인사/워크인 안내처럼 고정된 단계와 예약 정보(이름, 날짜, 시간 등) 수집은 직접 답변하고,
+    흐름에 없는 자유 질문이나 [가격 정보]처럼 내용을 채워야 하는 단계만 LLM에 넘긴다.
+    """
+
+    def __init__(self, flow, router, threshold=0.6, entry_threshold=0.9, max_sessions=10000, ttl=1800, renderer=None):
+        self.flow = flow
+        self.router = router
+        self.renderer = renderer  # 응답 ID가 있는 상태(HK 형식)의 답변 (없으면 그 상태는 LLM이 답변)
+        self.threshold = threshold  # 흐름 안에서 다음 단계를 판단할 최소 유사도
+        # 흐름 밖(시작 상태)에서는 각 흐름의 첫 의도만, 더 높은 유사도로 판단 (일반 질문이 흐름에 끌려 들어가지 않게)
+        self.entry_threshold = entry_threshold
+        self.max_sessions = max_sessions
+        self.ttl = ttl  # 초 (마지막 메시지 후 이 시간이 지나면 처음부터)
+        self.sessions = OrderedDict()  # (채널 ID, 사용자 ID) -> DialogSession
+        self.stats = {"local": 0, "llm": 0, "unmatched": 0}
+
+    def session(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        session = self.sessions.get(key)
+        if session is None:
+            return None
+        if session.expires_at <= now:
+            del self.sessions[key]
+            return None
+        return session
+
+    def reset(self, channel_id=None, key=None):
+        """대화 위치 초기화 (channel_id: 채널 전체, key: 한 사용자)"""
+        if key is not None:
+            self.sessions.pop(key, None)
+            return
+        for session_key in [k for k in self.sessions if channel_id is None or k[0] == channel_id]:
+            del self.sessions[session_key]
+
+    def _save(self, key, state, slots, now):
+        if state.kind == "end" or state is self.flow.start:
+            self.sessions.pop(key, None)
+            return
+        self.sessions[key] = DialogSession(state.index, slots or None, now + self.ttl)
+        self.sessions.move_to_end(key)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def handle(self, key, text, today=None, min_threshold=0.0):
+        """메시지 하나 처리: 흐름에 맞는 전이가 없으면 None (상태 유지, LLM이 답변)
+
+        min_threshold: 채널의 FAQ 임계값 (의도 판단 임계값은 이보다 낮아지지 않음)
+        """
+        now = time.monotonic()
+        session = self.session(key, now)
+        state = self.flow.states[session.state] if session else self.flow.start
+        slots = dict(session.slots) if session and session.slots else {}
+        threshold = max(self.entry_threshold if state is self.flow.start else self.threshold, min_threshold)
+        transition, score, values = self._match(state, text, slots, today, threshold)
+        if transition is None:
+            if slots != (session.slots if session and session.slots else {}):
+                self._save(key, state, slots, now)
+            self.stats["unmatched"] += 1
+            return None
+        slots.update(values)
+
+        missing = [name for name in transition.required if name not in slots]
+        if missing:
+            # 필요한 값이 모자라면 같은 상태에서 빠진 것만 다시 물어봄 (안내 문구가 없으면 LLM)
+            labels = {field.name: field.label for field in transition.collect}
+            reply = transition.missing.render(
+                {**slots, "missing": ", ".join(labels.get(name, name) for name in missing)}
+            ) if transition.missing else None
+            self._save(key, state, slots, now)
+            self._count(reply)
+            return DialogTurn(state.name, transition.intent, reply, slots, score)
+
+        target = self.flow.states[transition.target]
+        reply = self._reply(target, slots, text) if target.kind != "end" else None
+        self._count(reply)
+        if reply is None:
+            # 이 턴은 LLM이 답변하므로 흐름 위치는 그대로 두고 모은 값만 저장
+            self._save(key, state, slots, now)
+            return DialogTurn(state.name, transition.intent, None, slots, score)
+        self._save(key, target, slots, now)
+        return DialogTurn(target.name, transition.intent, reply, slots, score)
+
+    def _reply(self, state, slots, text):
+        if state.response and self.renderer:
+            return self.renderer.render(state.response, slots, text)
+        return state.content.render(slots) if state.content else None
+
+    def _match(self, state, text, slots, today, threshold):
+        """(전이, 의도 점수, 메시지에서 찾은 값) 순서대로:
+
+        1) 이 상태에서 물어본 값(빠진 값 안내를 보냈으면 그 값들)에 대한 답장이면 그 값을 모으거나 필요로 하는 전이
+           (여러 개면 흐름상 뒤에 있는 전이)
+        2) 이 상태에 적힌 의도, 없으면 전역 의도 중에서 분류 (시작 상태는 흐름의 첫 의도만)
+
+        물어보지 않은 값은 의도가 임계값 이상으로 맞을 때만 모음 (질문 속 '1시간', '내일'을 예약 정보로 보지 않도록)
+        """
+        awaiting = self._awaiting(state, slots)
+        values = extract_values(awaiting, text, today, reply=True) if awaiting else {}
+        if values:
+            slots.update(values)
+            transition = None
+            for candidate in state.transitions:
+                if any(field.name in values for field in candidate.collect):
+                    transition = candidate
+            if transition is None:
+                transition = next((
+                    candidate for candidate in state.transitions
+                    if any(name in values for name in candidate.required) and all(name in slots for name in candidate.required)
+                ), None)
+            if transition is not None:
+                return transition, None, {}
+
+        match = self.router.classify(text, state.own, threshold) if state.own else None
+        if match is None and state is not self.flow.start:
+            match = self.router.classify(text, state.lookup, threshold)
+        if match is None:
+            return None, None, {}
+        transition = state.lookup[match.key]
+        values = extract_values(transition.collect, text, today) if transition.collect else {}
+        return transition, match.score, values
+
+    @staticmethod
+    def _awaiting(state, slots):
+        """답장에서 찾을 값: 이 상태가 물어본 값 + 일부만 모여 빠진 값을 안내한 전이의 나머지 값"""
+        fields = {field.name: field for field in state.awaiting if field.name not in slots}
+        for transition in state.transitions:
+            if any(field.name in slots for field in transition.collect):
+                for field in transition.collect:
+                    if field.name not in slots:
+                        fields.setdefault(field.name, field)
+        return list(fields.values())
+
+    def _count(self, reply):
+        self.stats["local" if reply else "llm"] += 1
+
+
+# ---------- 평가 ----------
+
+SAMPLE_VALUES = {
+    "name": "Kim Minji", "text": "Kim Minji", "email": "guest@example.com", "birth_date": "1990-05-17", "time": "15:00",
+}
+
+
+def _examples(path):
+    """intents.csv 의도 -> 예문 목록"""
+    import csv
+    examples = {}
+    with open(os.path.join(path, "intents.csv"), encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text = row.get("examples") or row.get("samples") or ""
+            examples[row["intent"]] = [example.strip() for example in text.split(",") if example.strip()]
+    return examples
+
+
+def simulate(path, conversations=200, turns=6, threshold=0.6, seed=1):
+    """흐름을 따라가는 가상 대화를 만들어 LLM 호출 수를 비교 (지금 봇: 모든 턴 호출)
+
+    사용자 메시지는 intents.csv 예문, 값을 모으는 단계는 예시 값(이름/날짜/시간/지점 등)으로 만든다.
+    예문이 색인에도 들어 있으므로 의도 분류는 실제 대화보다 잘 맞게 나옴 (분류 정확도는 faq_router.py로 따로 측정).
+    """
+    flow = DialogFlow.from_directory(path)
+    router = FAQRouter.from_directory(path)
+    responses_path = os.path.join(path, "responses.json")
+    renderer = ResponseRenderer(responses_path, reload_interval=0) if os.path.exists(responses_path) else None
+    engine = DialogEngine(flow, router, threshold, renderer=renderer)
+    examples = _examples(path)
+    rng = random.Random(seed)
+    today = date.today()
+    total = followed = 0
+    started = time.perf_counter()
+
+    for conversation in range(conversations):
+        state = flow.start
+        for _ in range(turns):
+            options = [t for t in state.transitions if t.collect or examples.get(t.intent)]
+            if not options:
+                break
+            transition = rng.choice(options)
+            if transition.collect:
+                values = []
+                for field in transition.collect:
+                    if field.type == "options":
+                        values.append(rng.choice(list(field.options.values())))
+                    elif field.type == "date":
+                        values.append((today + timedelta(days=7)).isoformat())
+                    else:
+                        values.append(SAMPLE_VALUES.get(field.type, SAMPLE_VALUES["text"]))
+                text = ", ".join(values)
+            else:
+                text = rng.choice(examples[transition.intent])
+            total += 1
+            turn = engine.handle(conversation, text, today)
+            expected = flow.states[transition.target]
+            # 답변이 없는 단계(LLM 답변)는 위치가 그대로이므로 의도만 맞으면 흐름대로 판단한 것
+            if turn is not None and (turn.state == expected.name or turn.reply is None and turn.intent == transition.intent):
+                followed += 1
+            state = expected if expected.kind != "end" else flow.start
+            session = engine.session(conversation)
+            if (session.state if session else 0) != state.index:
+                engine.reset(key=conversation)
+                if state is not flow.start:
+                    engine._save(conversation, state, {}, time.monotonic())
+
+    elapsed = time.perf_counter() - started
+    stats = engine.stats
+    print(f"데이터: {path} (상태 {len(flow.states) - 1}개, 가상 대화 {conversations}개, {total}턴)")
+    print(f"- 흐름대로 이동: {followed / total:.1%}")
+    print(f"- LLM 호출: {total}회 -> {stats['llm'] + stats['unmatched']}회 "
+          f"(직접 답변 {stats['local']}회, 흐름 밖/내용 필요 {stats['unmatched']}/{stats['llm']}회)")
+    print(f"- 처리 시간: 평균 {elapsed / total * 1000:.3f}ms/턴")
+
+
+if __name__ == "__main__":
+    # 사용법: python dialog_flow.py "training bot KR/save" [임계값]
+    simulate(sys.argv[1] if len(sys.argv) > 1 else "training bot KR/save",
+             threshold=float(sys.argv[2]) if len(sys.argv) > 2 else 0.6)
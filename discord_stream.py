@@ -0,0 +1,106 @@
+import time
+import unicodedata
+
+DISCORD_MESSAGE_LIMIT = 2000
+FENCE = "```"
+
+
+def _safe_cut(text, cut):
+    """결합 문자/ZWJ/이모지 변형 선택자 앞에서 자르지 않도록 자를 위치를 앞으로 당김"""
+    while 0 < cut < len(text) and (
+        unicodedata.combining(text[cut]) or text[cut] in "‍️︎" or text[cut - 1] == "‍"
+    ):
+        cut -= 1
+    return cut
+
+
+def _fence_after(fence, text):
+    """text를 지난 뒤의 코드 블록 상태 (열려 있으면 여는 줄, 아니면 None)"""
+    for line in text.split("\n"):
+        if line.lstrip().startswith(FENCE):
+            fence = None if fence else line.strip()
+    return fence
+
+
+def split_message(text, limit=DISCORD_MESSAGE_LIMIT):
+    """Discord 글자 수 제한에 맞춰 메시지를 나눔
+
+    가능하면 줄바꿈/공백에서 자르고, 코드 블록 중간에서 잘리면 앞 조각은 닫고
+    다음 조각은 같은 언어로 다시 연다. 아직 닫히지 않은 코드 블록(스트리밍 중)도 닫아서 보여준다.
+    """
+    chunks = []
+    fence = None
+    while text:
+        prefix = f"{fence}\n" if fence else ""
+        # 닫는 코드 블록 표시("\n```") 자리는 항상 남겨 둠
+        room = limit - len(prefix) - len(FENCE) - 1
+        if len(text) <= room:
+            piece, rest = text, ""
+        else:
+            window = text[:room]
+            cut = window.rfind("\n")
+            if cut < room // 2:
+                cut = window.rfind(" ")
+            if cut < room // 2:
+                cut = room
+            cut = _safe_cut(text, cut)
+            if cut <= 0:
+                # 결합 문자/ZWJ만 계속 이어지면 앞으로 당길 자리가 없으므로 그냥 자름
+                cut = room
+            piece, rest = text[:cut], text[cut:]
+            if rest[:1] in ("\n", " "):
+                rest = rest[1:]
+
+        fence_before = fence
+        fence = _fence_after(fence, piece)
+        chunk = prefix + piece
+        if fence:
+            chunk = f"{chunk.rstrip(chr(10))}\n{FENCE}"
+        if chunk.strip() and chunk.strip() not in (FENCE, fence_before):
+            chunks.append(chunk)
+        text = rest
+    return chunks
+
+
+class StreamingReply:
+    """스트리밍 응답을 Discord 메시지로 보내고, 일정 간격으로 수정하며 2000자를 넘으면 새 메시지로 이어감"""
+
+    def __init__(self, channel, edit_interval=1.0, limit=DISCORD_MESSAGE_LIMIT):
+        self.channel = channel
+        self.edit_interval = edit_interval  # 메시지 수정 최소 간격 (Discord 속도 제한 대비)
+        self.limit = limit
+        self.text = ""
+        self.messages = []  # 보낸 Discord 메시지
+        self.shown = []  # 메시지별로 현재 표시된 내용
+        self.last_sync = 0.0
+        self.first_sent_at = None  # 첫 메시지를 보낸 시각 (체감 지연 측정용)
+
+    async def feed(self, delta):
+        """새로 받은 텍스트 추가 (첫 토큰은 바로 보내고, 이후는 간격마다 반영)"""
+        self.text += delta
+        if not self.text.strip():
+            return
+        if not self.messages or time.monotonic() - self.last_sync >= self.edit_interval:
+            await self.sync()
+
+    async def sync(self):
+        """현재 텍스트를 Discord 메시지에 반영 (바뀐 메시지만 수정, 넘친 부분은 새 메시지)"""
+        chunks = split_message(self.text, self.limit)
+        for i, chunk in enumerate(chunks):
+            if i < len(self.messages):
+                if self.shown[i] != chunk:
+                    await self.messages[i].edit(content=chunk)
+                    self.shown[i] = chunk
+            else:
+                self.messages.append(await self.channel.send(chunk))
+                self.shown.append(chunk)
+                if self.first_sent_at is None:
+                    self.first_sent_at = time.monotonic()
+        self.last_sync = time.monotonic()
+
+    async def finish(self, text=None):
+        """최종 텍스트로 마지막 반영"""
+        if text is not None:
+            self.text = text
+        if self.text.strip():
+            await self.sync()
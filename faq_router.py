@@ -0,0 +1,262 @@
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+
+def normalize(text):
+    """비교용 정규화 (NFKC, 소문자, 공백/문장부호 제거)"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"[\W_]+", "", text)
+
+
+# 부정 표현 (문자 n-gram 유사도는 '가능한가요'와 '불가능한가요'를 거의 같게 봄)
+NEGATION_PATTERN = re.compile(
+    r"불가|안\s*[되돼]|없|못|않|아니(?!면)|[唔冇不沒没無无未]|\b(?:not|no|never|cannot|without)\b|n't\b",
+    re.I
+)
+# 부정 글자가 있지만 부정이 아닌 표현 (可唔可以/有冇 같은 의문형, 唔同/不同 '다른', 唔該 '감사합니다', 不過 '하지만')
+NOT_NEGATION_PATTERN = re.compile(r"(\w)[唔不]\1|有[冇沒没]有?|[唔不]同|唔該|不過|無論")
+
+
+def negated(text):
+    """부정문인지 (FAQ 질문과 부정 여부가 다르면 반대 답변이 되므로 바로 답변하지 않음)"""
+    return bool(NEGATION_PATTERN.search(NOT_NEGATION_PATTERN.sub("", unicodedata.normalize("NFKC", text))))
+
+
+def char_ngrams(text, sizes=(1, 2)):
+    """문자 n-gram 빈도 (띄어쓰기가 일정하지 않은 한국어/광둥어에도 동작)"""
+    grams = Counter()
+    for n in sizes:
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    return grams
+
+
+class RouteMatch:
+    """라우터 검색 결과"""
+    __slots__ = ("kind", "key", "question", "answer", "score")
+
+    def __init__(self, kind, key, question, answer, score):
+        self.kind = kind  # "faq" 또는 "intent"
+        self.key = key  # FAQ 번호 또는 의도 이름
+        self.question = question  # 매칭된 질문/예문
+        self.answer = answer  # 바로 보낼 수 있는 답변 (없으면 None)
+        self.score = score  # 코사인 유사도 (0~1)
+
+
+class FAQRouter:
+    """FAQ 질문과 의도 예문을 문자 n-gram TF-IDF로 색인해 LLM 호출 전에 답변 후보를 찾음"""
+
+    def __init__(self):
+        self.documents = []  # (kind, key, question, answer)
+        self.postings = defaultdict(list)  # n-gram -> [(문서 번호, 가중치)]
+        self.idf = {}
+        self.norms = []
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_directory(cls, path):
+        """학습 데이터 폴더(FAQ.csv, intents.csv, responses.json)에서 라우터 생성"""
+        router = cls()
+        faq_path = os.path.join(path, "FAQ.csv")
+        if os.path.exists(faq_path):
+            with open(faq_path, encoding="utf-8") as f:
+                for i, row in enumerate(csv.DictReader(f)):
+                    router.add("faq", i, row["question"], row["answer"])
+
+        intent_answers = load_intent_answers(os.path.join(path, "responses.json"))
+        intents_path = os.path.join(path, "intents.csv")
+        if os.path.exists(intents_path):
+            with open(intents_path, encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    # KR은 examples, HK는 samples 컬럼 사용
+                    examples = row.get("examples") or row.get("samples") or ""
+                    for example in examples.split(","):
+                        if example.strip():
+                            router.add("intent", row["intent"], example.strip(), intent_answers.get(row["intent"]))
+
+        router.build()
+        return router
+
+    def add(self, kind, key, question, answer):
+        self.documents.append((kind, key, question, answer))
+
+    def build(self):
+        """역색인 생성 (문서 추가 후 한 번 호출)"""
+        doc_grams = [char_ngrams(normalize(question)) for _, _, question, _ in self.documents]
+        document_frequency = Counter()
+        for grams in doc_grams:
+            document_frequency.update(grams.keys())
+
+        total = len(doc_grams)
+        # 거의 모든 문서에 나오는 어미(~요, ~나요 등)는 가중치가 0에 가까워짐
+        self.idf = {gram: math.log(total / df) for gram, df in document_frequency.items()}
+        self.postings = defaultdict(list)
+        self.norms = []
+        for doc_id, grams in enumerate(doc_grams):
+            norm = 0.0
+            for gram, count in grams.items():
+                weight = count * self.idf[gram]
+                self.postings[gram].append((doc_id, weight))
+                norm += weight * weight
+            self.norms.append(math.sqrt(norm) or 1.0)
+
+    def search(self, text, limit=1, exclude=None):
+        """가장 비슷한 질문/예문 검색 (exclude: 제외할 문서 번호, 평가용)"""
+        grams = char_ngrams(normalize(text))
+        scores = defaultdict(float)
+        query_norm = 0.0
+        for gram, count in grams.items():
+            idf = self.idf.get(gram)
+            if idf is None:
+                continue
+            weight = count * idf
+            query_norm += weight * weight
+            for doc_id, doc_weight in self.postings[gram]:
+                scores[doc_id] += weight * doc_weight
+        if not scores:
+            return []
+
+        query_norm = math.sqrt(query_norm)
+        ranked = sorted(
+            ((score / (query_norm * self.norms[doc_id]), doc_id) for doc_id, score in scores.items() if doc_id != exclude),
+            reverse=True
+        )
+        results = []
+        for score, doc_id in ranked[:limit]:
+            kind, key, question, answer = self.documents[doc_id]
+            results.append(RouteMatch(kind, key, question, answer, score))
+        return results
+
+    def classify(self, text, intents, threshold):
+        """intents에 속한 의도 예문만 비교해 가장 비슷한 예문 반환 (대화 흐름에서 다음 단계 판단용)
+
+        threshold 미만이면 None. 히트/미스 통계에는 넣지 않음.
+        """
+        grams = char_ngrams(normalize(text))
+        scores = defaultdict(float)
+        query_norm = 0.0
+        for gram, count in grams.items():
+            idf = self.idf.get(gram)
+            if idf is None:
+                continue
+            weight = count * idf
+            query_norm += weight * weight
+            for doc_id, doc_weight in self.postings[gram]:
+                kind, key = self.documents[doc_id][:2]
+                if kind == "intent" and key in intents:
+                    scores[doc_id] += weight * doc_weight
+        if not scores:
+            return None
+
+        query_norm = math.sqrt(query_norm)
+        score, doc_id = max((score / (query_norm * self.norms[doc_id]), doc_id) for doc_id, score in scores.items())
+        if score < threshold:
+            return None
+        kind, key, question, answer = self.documents[doc_id]
+        return RouteMatch(kind, key, question, answer, score)
+
+    def route(self, text, threshold, answer=None, intent_threshold=None):
+        """신뢰도가 threshold 이상이고 바로 보낼 답변이 있으면 결과 반환, 아니면 None (LLM 사용)
+
+        answer(match): 답변을 만드는 함수 (예: responses.json 템플릿), None을 돌려주면 미리 읽은 고정 답변 사용
+        intent_threshold: 의도 매칭(고정 답변/템플릿 모두)에 따로 적용할 최소 유사도
+            (None이면 threshold와 같음, 0이면 의도 매칭은 답변하지 않음)
+        """
+        matches = self.search(text, limit=1 if intent_threshold is None else 10)
+        if intent_threshold is not None and matches and matches[0].kind == "intent" and (
+                not intent_threshold or matches[0].score < intent_threshold):
+            # 의도 매칭을 쓸 수 없으면 같은 질문이 FAQ에도 있을 수 있으므로 가장 비슷한 FAQ 질문으로
+            matches = [match for match in matches if match.kind == "faq"][:1]
+        if matches and matches[0].score >= threshold and negated(text) == negated(matches[0].question):
+            match = matches[0]
+            if answer:
+                match.answer = answer(match) or match.answer
+            if match.answer:
+                self.hits += 1
+                return match
+        self.misses += 1
+        return None
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def load_intent_answers(path):
+    """responses.json에서 의도별 고정 답변 로드 (변수 {{...}}가 있는 답변은 제외)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    answers = {}
+    # HK 형식: {"responses": [{"intent": ..., "text": ...}]}
+    for response in data.get("responses", []) if isinstance(data, dict) else []:
+        text = response.get("text")
+        if response.get("intent") and text and "{{" not in text:
+            answers.setdefault(response["intent"], text)
+    return answers
+
+
+def evaluate(path, threshold=0.8):
+    """의도 예문마다 자기 자신을 뺀 색인에서 검색해 정확도와 지연 시간 측정"""
+    router = FAQRouter.from_directory(path)
+    samples = [
+        (doc_id, key, question)
+        for doc_id, (kind, key, question, _) in enumerate(router.documents)
+        if kind == "intent"
+    ]
+    if not samples:
+        print("의도 예문이 없습니다.")
+        return
+
+    # 같은 문장이 여러 의도에 들어 있는 예문은 맞힐 수 없으므로 따로 집계
+    labels = defaultdict(set)
+    for _, intent, question in samples:
+        labels[normalize(question)].add(intent)
+    ambiguous = sum(1 for _, _, question in samples if len(labels[normalize(question)]) > 1)
+
+    correct = 0
+    confident = 0
+    confident_correct = 0
+    latencies = []
+    for doc_id, intent, question in samples:
+        if len(labels[normalize(question)]) > 1:
+            continue
+        start = time.perf_counter()
+        matches = [m for m in router.search(question, limit=20, exclude=doc_id) if m.kind == "intent"]
+        latencies.append(time.perf_counter() - start)
+        if not matches:
+            continue
+        if matches[0].key == intent:
+            correct += 1
+        if matches[0].score >= threshold:
+            confident += 1
+            if matches[0].key == intent:
+                confident_correct += 1
+
+    latencies.sort()
+    total = len(samples) - ambiguous
+    print(f"데이터: {path} (문서 {len(router.documents)}개, 의도 예문 {len(samples)}개, 여러 의도에 중복된 예문 {ambiguous}개 제외)")
+    if not total:
+        print("평가할 수 있는 의도 예문이 없습니다.")
+        return
+    print(f"- Top-1 정확도: {correct / total:.1%}")
+    print(f"- 임계값 {threshold} 이상: {confident / total:.1%} 응답, 정확도 {confident_correct / confident:.1%}" if confident
+          else f"- 임계값 {threshold} 이상인 결과 없음")
+    print(f"- 지연 시간: 평균 {sum(latencies) / total * 1000:.3f}ms, "
+          f"p95 {latencies[int(total * 0.95) - 1] * 1000:.3f}ms, 최대 {latencies[-1] * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    # 사용법: python faq_router.py "training bot KR/save" [임계값]
+    evaluate(sys.argv[1] if len(sys.argv) > 1 else "training bot KR/save",
+             float(sys.argv[2]) if len(sys.argv) > 2 else 0.8)
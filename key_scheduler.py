@@ -0,0 +1,180 @@
+import random
+import time
+from datetime import datetime, timezone
+
+# 재시도할 수 있는 HTTP 상태 (속도 제한, 과부하, 일시적인 서버 오류)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+# 키 자체를 잠시 쉬게 해야 하는 상태 (회로 차단)
+CIRCUIT_STATUS = {429, 529}
+# 인증 실패 키는 오래 쉬게 함
+AUTH_STATUS = {401, 403}
+
+
+def parse_reset(value, now):
+    """rate limit reset 헤더(RFC 3339 시각)를 monotonic 기준 시각으로 변환"""
+    if not value:
+        return None
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return now + max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_retry_after(value):
+    """retry-after 헤더(초) 파싱"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class KeyState:
+    """API 키 하나의 남은 한도와 회로 차단 상태"""
+    __slots__ = (
+        "index", "requests_limit", "requests_remaining", "tokens_limit", "tokens_remaining", "reset_at",
+        "open_until", "failures", "in_flight", "calls", "errors"
+    )
+
+    def __init__(self, index):
+        self.index = index
+        self.requests_limit = None  # None이면 아직 헤더를 받지 못함 (여유 있는 것으로 취급)
+        self.requests_remaining = None
+        self.tokens_limit = None
+        self.tokens_remaining = None
+        self.reset_at = None  # 남은 한도가 0일 때 다시 쓸 수 있는 시각
+        self.open_until = 0.0  # 회로 차단 해제 시각
+        self.failures = 0  # 연속 실패 횟수
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+
+    def available(self, now):
+        if self.open_until > now:
+            return False
+        exhausted = self.requests_remaining == 0 or self.tokens_remaining == 0
+        return not (exhausted and self.reset_at is not None and self.reset_at > now)
+
+    def available_at(self):
+        """다시 쓸 수 있는 가장 이른 시각"""
+        return max(self.open_until, self.reset_at or 0.0)
+
+    def headroom(self):
+        """남은 한도 비율 (요청 수/토큰 중 더 빠듯한 쪽, 0~1)"""
+        ratios = [1.0]
+        if self.requests_limit and self.requests_remaining is not None:
+            ratios.append(self.requests_remaining / self.requests_limit)
+        if self.tokens_limit and self.tokens_remaining is not None:
+            ratios.append(self.tokens_remaining / self.tokens_limit)
+        return min(ratios)
+
+
+class KeyScheduler:
+    """응답 헤더의 남은 한도를 기준으로 여유가 가장 많은 키를 고르고, 429/529 키는 잠시 차단
+
+    키 개수 제한 없음. 모든 키가 차단되었으면 가장 먼저 풀리는 키까지 기다릴 시간을 알려준다.
+    """
+
+    def __init__(self, key_count, base_delay=1.0, max_delay=30.0, cooldown=5.0, max_cooldown=60.0):
+        self.keys = [KeyState(i) for i in range(key_count)]
+        self.base_delay = base_delay  # 재시도 대기 기본값 (지수 백오프)
+        self.max_delay = max_delay
+        self.cooldown = cooldown  # 429/529 이후 키 차단 시간 기본값 (연속 실패마다 2배)
+        self.max_cooldown = max_cooldown
+
+    def pick(self, exclude=(), now=None):
+        """사용할 키 번호와 기다릴 시간(초) 반환
+
+        exclude의 키(이번 요청에서 이미 실패한 키)는 다른 키가 있으면 피한다.
+        """
+        now = time.monotonic() if now is None else now
+        candidates = [k for k in self.keys if k.available(now)]
+        preferred = [k for k in candidates if k.index not in exclude] or candidates
+        if preferred:
+            # 여유가 많은 키 -> 진행 중인 호출이 적은 키 순
+            best = max(preferred, key=lambda k: (k.headroom() - 0.01 * k.in_flight, -k.in_flight, -k.index))
+            return best.index, 0.0
+        # 모든 키가 막혀 있으면 가장 먼저 풀리는 키까지 대기 (동시에 몰리지 않도록 jitter 추가)
+        soonest = min(self.keys, key=KeyState.available_at)
+        return soonest.index, max(0.0, soonest.available_at() - now) + random.uniform(0, self.base_delay)
+
+    def begin(self, index):
+        key = self.keys[index]
+        key.in_flight += 1
+        key.calls += 1
+
+    def end(self, index):
+        self.keys[index].in_flight -= 1
+
+    def record_headers(self, index, headers, now=None):
+        """응답 헤더의 anthropic-ratelimit-* 값 반영"""
+        if not headers:
+            return
+        now = time.monotonic() if now is None else now
+        key = self.keys[index]
+
+        def number(name):
+            value = headers.get(f"anthropic-ratelimit-{name}")
+            try:
+                return int(value) if value is not None else None
+            except ValueError:
+                return None
+
+        requests_limit = number("requests-limit")
+        if requests_limit is not None:
+            key.requests_limit = requests_limit
+            key.requests_remaining = number("requests-remaining")
+        # 입력/출력 토큰 한도가 따로 오면 입력 토큰 기준
+        for prefix in ("input-tokens", "tokens"):
+            tokens_limit = number(f"{prefix}-limit")
+            if tokens_limit is not None:
+                key.tokens_limit = tokens_limit
+                key.tokens_remaining = number(f"{prefix}-remaining")
+                break
+        resets = [
+            parse_reset(headers.get(f"anthropic-ratelimit-{name}-reset"), now)
+            for name in ("requests", "input-tokens", "tokens")
+        ]
+        resets = [reset for reset in resets if reset is not None]
+        key.reset_at = max(resets) if resets else None
+
+    def record_success(self, index, headers=None):
+        key = self.keys[index]
+        key.failures = 0
+        self.record_headers(index, headers)
+
+    def record_failure(self, index, status=None, headers=None, now=None):
+        """실패 기록 후 재시도 가능 여부 반환 (429/529는 키 차단, 인증 실패는 오래 차단)"""
+        now = time.monotonic() if now is None else now
+        key = self.keys[index]
+        key.errors += 1
+        self.record_headers(index, headers, now)
+        retry_after = parse_retry_after(headers.get("retry-after")) if headers else None
+
+        if status in CIRCUIT_STATUS:
+            key.failures += 1
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** (key.failures - 1))
+            key.open_until = now + max(cooldown, retry_after or 0.0)
+            return True
+        if status in AUTH_STATUS:
+            # 다른 키로는 성공할 수 있으므로 이 키만 길게 차단
+            key.open_until = now + self.max_cooldown * 10
+            return len(self.keys) > 1
+        # 상태 코드가 없으면 연결 오류/타임아웃 -> 재시도
+        return status is None or status in RETRYABLE_STATUS
+
+    def backoff(self, attempt, retry_after=None):
+        """지수 백오프 + full jitter (retry-after가 있으면 그보다 짧게 기다리지 않음)"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def summary(self, now=None):
+        """키별 상태 요약 (상태 확인 명령어용)"""
+        now = time.monotonic() if now is None else now
+        lines = []
+        for key in self.keys:
+            state = "정상" if key.available(now) else f"대기 {key.available_at() - now:.0f}초"
+            lines.append(f"키 {key.index + 1}: {state}, 여유 {key.headroom():.0%}, 호출 {key.calls}회, 오류 {key.errors}회")
+        return lines
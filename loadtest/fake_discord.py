@@ -0,0 +1,80 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+import discord
+
+_ids = itertools.count(1)
+
+
+class FakeUser:
+    def __init__(self, name):
+        self.id = next(_ids)
+        self.name = name
+        self.bot = False
+
+
+class FakeAttachment:
+    """첨부파일 (read()는 내용을 그대로 돌려줌)"""
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.data = data
+        self.size = len(data)
+
+    async def read(self):
+        return self.data
+
+
+class FakeSentMessage:
+    """봇이 보낸 메시지 (edit은 Discord API 지연만큼 기다림)"""
+
+    def __init__(self, channel, content):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content=None):
+        await asyncio.sleep(self.channel.api_latency)
+        self.content = content
+        self.channel.edits += 1
+
+
+class FakeChannel:
+    """Discord 채널 대역 (보낸 메시지와 시각을 기록)
+
+    on_send(channel)는 봇이 이 채널에 메시지를 보낼 때마다 호출된다 (첫 응답 지연 측정용).
+    """
+
+    def __init__(self, api_latency=0.05, on_send=None):
+        self.id = next(_ids)
+        self.api_latency = api_latency  # Discord REST 호출 지연 (초)
+        self.on_send = on_send
+        self.sent = []
+        self.edits = 0
+
+    async def send(self, content=None, file=None):
+        await asyncio.sleep(self.api_latency)
+        message = FakeSentMessage(self, content)
+        self.sent.append(message)
+        if self.on_send:
+            self.on_send(self)
+        return message
+
+    @asynccontextmanager
+    async def typing(self):
+        yield
+
+
+class FakeMessage:
+    """게이트웨이에서 받은 사용자 메시지 대역"""
+
+    def __init__(self, channel, author, content, attachments=()):
+        self.id = next(_ids)
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.attachments = list(attachments)
+        self.created_at = discord.utils.utcnow()
+        self.received = time.perf_counter()  # 지연 시간 계산용 (단조 시계)
@@ -0,0 +1,448 @@
+"""Discord/Anthropic 없이 봇 핸들러 부하 테스트
+
+가짜 게이트웨이 메시지를 main.on_message에 직접 넣고, 로컬 Anthropic 스텁 서버와
+SQLite(또는 --database-url의 로컬 Postgres)로 처리량, 지연 시간(p50/p95/p99), 이벤트 루프 지연, 메모리를 측정한다.
+결과는 JSON으로 저장해 버전끼리 비교할 수 있다.
+
+사용법 (저장소 루트에서):
+    python -m loadtest.run steady --channels 50 --messages 10
+    python -m loadtest.run burst --channels 20 --burst 10 --error-rate 0.1
+    python -m loadtest.run attachments --attachment-size 50000
+    python -m loadtest.run backups --backup-interval 0.2
+    python -m loadtest.run hydrate --channels 10000
+    python -m loadtest.run steady --compare loadtest/results/steady-이전결과.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from loadtest.fake_discord import FakeAttachment, FakeChannel, FakeMessage, FakeUser
+from loadtest.stub_anthropic import StubAnthropicServer
+
+SCENARIOS = ("steady", "burst", "attachments", "backups", "hydrate")
+
+
+def percentile(values, q):
+    """nearest-rank 백분위수"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+def summarize(values, scale=1000.0):
+    """지연 시간 목록 요약 (기본 단위: ms)"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values) * scale, 3),
+        "p50": round(percentile(values, 50) * scale, 3),
+        "p95": round(percentile(values, 95) * scale, 3),
+        "p99": round(percentile(values, 99) * scale, 3),
+        "max": round(max(values) * scale, 3)
+    }
+
+
+def histogram_summary(histogram):
+    """metrics.Histogram 라벨별 개수/평균(ms)과 구간 기준 근사 p99(ms)"""
+    result = {}
+    for key, state in histogram.values.items():
+        count = state[-1]
+        if not count:
+            continue
+        target = count * 0.99
+        cumulative = 0
+        p99 = None
+        for bound, bucket_count in zip(histogram.buckets, state):
+            cumulative += bucket_count
+            if cumulative >= target:
+                p99 = bound
+                break
+        label = ",".join(str(v) for v in key) or "all"
+        result[label] = {
+            "count": count,
+            "mean": round(state[-2] / count * 1000, 3),
+            "p99_bucket": None if p99 is None else round(p99 * 1000, 3)
+        }
+    return result
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def rss_mb():
+    # Linux는 KB, macOS는 바이트 단위
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class LoopLagMonitor:
+    """interval마다 깨어나 예정보다 늦은 시간(이벤트 루프 지연)을 기록"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self.task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
+class Harness:
+    """main 모듈의 핸들러를 감싸 메시지별 지연 시간을 측정"""
+
+    def __init__(self, bot_module, discord_latency):
+        self.bot = bot_module
+        self.discord_latency = discord_latency
+        self.author = FakeUser("loadtest")
+        self.sent = 0
+        self.completed = []  # 메시지 수신 -> 답변 완료 (초, 정상 답변만)
+        self.failed = 0  # 오류 안내로 끝났거나 답변하지 못한 메시지 수
+        self.first_reply = []  # 메시지 수신 -> 채널에 첫 응답 메시지 (초)
+        self.waiting = {}  # 채널 ID -> 아직 첫 응답을 못 받은 메시지 수신 시각
+
+        original = bot_module.handle_channel_messages
+        # 핸들러가 기록한 응답 경로 (message_latency의 path: api/faq/dialog/cache/error)
+        outcome = contextvars.ContextVar("outcome", default=None)
+        observe = bot_module.metrics.message_latency.observe
+
+        def observe_path(value, **labels):
+            paths = outcome.get()
+            if paths is not None:
+                paths.append(labels.get("path"))
+            observe(value, **labels)
+
+        bot_module.metrics.message_latency.observe = observe_path
+
+        async def timed_handler(channel_id, messages):
+            paths = []
+            token = outcome.set(paths)
+            try:
+                await original(channel_id, messages)
+            finally:
+                outcome.reset(token)
+                now = time.perf_counter()
+                # 오류 경로도 빨리 끝나므로 정상 답변만 완료로 셈 (오류가 처리량으로 잡히지 않도록)
+                if paths and paths[-1] != "error":
+                    self.completed.extend(now - message.received for message in messages)
+                else:
+                    self.failed += len(messages)
+
+        # ChannelQueue는 이름으로 handle_channel_messages를 찾으므로 모듈 전역을 바꿔 감쌈
+        bot_module.handle_channel_messages = timed_handler
+
+        async def no_commands(message):
+            return None
+
+        # 명령어 처리는 측정 대상이 아님 (가짜 메시지로는 Context를 만들 수 없음)
+        bot_module.bot.process_commands = no_commands
+
+    def channel(self):
+        return FakeChannel(api_latency=self.discord_latency, on_send=self._on_send)
+
+    def _on_send(self, channel):
+        now = time.perf_counter()
+        for received in self.waiting.pop(channel.id, []):
+            self.first_reply.append(now - received)
+
+    async def send(self, channel, content, attachments=()):
+        message = FakeMessage(channel, self.author, content, attachments)
+        self.waiting.setdefault(channel.id, []).append(message.received)
+        self.sent += 1
+        await self.bot.on_message(message)
+
+    async def drain(self):
+        await self.bot.channel_queue.join()
+
+
+async def scenario_steady(harness, args):
+    """채널마다 무작위 간격으로 메시지를 보냄"""
+    async def user(channel_number):
+        channel = harness.channel()
+        for i in range(args.messages):
+            await harness.send(channel, f"[{channel_number}-{i}] 울쎄라 300샷 가격과 예약 가능한 시간 알려주세요")
+            await asyncio.sleep(random.uniform(0, 2 * args.interval))
+
+    await asyncio.gather(*(user(n) for n in range(args.channels)))
+
+
+async def scenario_burst(harness, args):
+    """채널마다 메시지를 한꺼번에 보냄 (대기열 병합/버림 확인)"""
+    async def user(channel_number):
+        channel = harness.channel()
+        for round_number in range(args.messages):
+            for i in range(args.burst):
+                await harness.send(channel, f"[{channel_number}-{round_number}-{i}] 지금 예약 가능한가요?")
+            await asyncio.sleep(args.interval)
+
+    await asyncio.gather(*(user(n) for n in range(args.channels)))
+
+
+async def scenario_attachments(harness, args):
+    """긴 txt 첨부파일이 있는 메시지"""
+    data = ("시술 후기와 문의 사항입니다. " * (args.attachment_size // 16 + 1)).encode("utf-8")[:args.attachment_size]
+
+    async def user(channel_number):
+        channel = harness.channel()
+        for i in range(args.messages):
+            attachment = FakeAttachment(f"note_{channel_number}_{i}.txt", data)
+            await harness.send(channel, f"[{channel_number}-{i}] 첨부한 내용 확인 부탁드려요", [attachment])
+            await asyncio.sleep(random.uniform(0, 2 * args.interval))
+
+    await asyncio.gather(*(user(n) for n in range(args.channels)))
+
+
+async def scenario_backups(harness, args):
+    """짧은 간격의 백업 루프를 함께 돌리면서 steady 부하"""
+    db = harness.bot.db
+    db.backup_interval = args.backup_interval
+    backup_task = asyncio.create_task(db.start_backup_loop())
+    try:
+        await scenario_steady(harness, args)
+        await harness.drain()
+    finally:
+        backup_task.cancel()
+
+
+async def scenario_hydrate(harness, args):
+    """채널이 많을 때 시작 시 전체 불러오기(eager)와 처음 사용할 때 불러오기(lazy) 비교, 채널당 메모리"""
+    bot = harness.bot
+    db = bot.db
+    channel_ids = list(range(1, args.channels + 1))
+    if hasattr(db, "seed_channels"):
+        await db.seed_channels(channel_ids, messages_per_channel=20, message_chars=args.message_chars)
+
+    # eager: 예전 on_ready처럼 모든 채널의 설정과 기록을 차례로 불러옴
+    started = time.perf_counter()
+    for channel_id in channel_ids:
+        await db.load_channel_context(channel_id)
+        await db.load_channel_history(channel_id, 20)
+    eager_seconds = time.perf_counter() - started
+
+    # lazy: 시작 시에는 아무것도 불러오지 않고, 채널을 처음 쓸 때 ConversationStore가 불러옴
+    bot.conversations.max_channels = max(bot.conversations.max_channels, args.channels)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    lazy_first = []
+    for channel_id in channel_ids:
+        first = time.perf_counter()
+        await bot.conversations.get(channel_id)
+        lazy_first.append(time.perf_counter() - first)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    return {
+        "eager_startup_seconds": round(eager_seconds, 3),
+        "lazy_startup_seconds": 0.0,
+        "lazy_first_use_ms": summarize(lazy_first),
+        "channels_loaded": len(bot.conversations),
+        "memory_per_1k_channels_mb": round(allocated / len(channel_ids) * 1000 / (1024 * 1024), 3),
+        "conversation_chars_per_1k_channels": round(bot.conversations.total_size / len(channel_ids) * 1000)
+    }
+
+
+def configure_environment(args, stub_url):
+    """main을 import하기 전에 스텁/테스트용 설정 적용 (.env보다 우선)"""
+    os.environ["DISCORD_TOKEN"] = "loadtest"
+    for i in range(args.keys):
+        os.environ[f"ANTHROPIC_API_KEY_{i + 1}"] = f"stub-key-{i + 1}"
+    os.environ.pop(f"ANTHROPIC_API_KEY_{args.keys + 1}", None)
+    os.environ["ANTHROPIC_BASE_URL"] = stub_url
+    os.environ["DATABASE_URL"] = args.database_url or "postgresql://loadtest@127.0.0.1/loadtest"
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["FAQ_THRESHOLD"] = str(args.faq_threshold)
+    os.environ["STREAM_RESPONSES"] = "true" if args.stream else "false"
+    os.environ.setdefault("ANTHROPIC_RETRY_BASE_DELAY", "0.2")
+
+
+async def run(args):
+    stub = await StubAnthropicServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        output_tokens=args.output_tokens,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        overload_rate=args.overload_rate,
+        retry_after=args.retry_after,
+        requests_per_minute=args.requests_per_minute,
+        seed=args.seed
+    ).start()
+    configure_environment(args, stub.url)
+    random.seed(args.seed)
+
+    import main as bot_module
+    import metrics
+
+    if args.database_url:
+        db = bot_module.db
+    else:
+        from loadtest.sqlite_db import SQLiteDatabase
+        db = SQLiteDatabase(args.sqlite_path, query_delay=args.db_delay)
+        bot_module.db = db
+        bot_module.conversations.db = db
+    await db.connect()
+
+    harness = Harness(bot_module, args.discord_latency)
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    extra = None
+    try:
+        if args.scenario == "hydrate":
+            extra = await scenario_hydrate(harness, args)
+        else:
+            await globals()[f"scenario_{args.scenario}"](harness, args)
+            await harness.drain()
+    finally:
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+        await db.close()
+        # keep-alive 연결을 먼저 닫아 스텁 서버의 연결 처리 작업이 정상 종료되도록 함
+        for client in bot_module.anthropic.clients:
+            await client.close()
+        await stub.stop()
+
+    completed = len(harness.completed)
+    anthropic_usage = bot_module.anthropic.usage
+    results = {
+        "scenario": args.scenario,
+        "version": git_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+        "results": {
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_sent": harness.sent,
+            "messages_completed": completed,
+            "messages_failed": harness.failed,
+            "throughput_per_second": round(completed / elapsed, 3) if elapsed else None,
+            "latency_complete_ms": summarize(harness.completed),
+            "latency_first_reply_ms": summarize(harness.first_reply),
+            "api_requests": stub.stats["requests"],
+            "api_rate_limited": stub.stats["rate_limited"],
+            "api_overloaded": stub.stats["overloaded"],
+            "api_calls_ok": anthropic_usage["requests"],
+            "input_tokens": anthropic_usage["input_tokens"],
+            "output_tokens": anthropic_usage["output_tokens"],
+            "queue": dict(bot_module.channel_queue.stats),
+            "event_loop_lag_ms": summarize(monitor.lags),
+            "db_query_ms": histogram_summary(metrics.db_latency),
+            "backup_ms": histogram_summary(metrics.backup_duration),
+            "api_latency_ms": histogram_summary(metrics.api_latency),
+            "rss_peak_mb": rss_mb(),
+            # 메시지마다 차이로 갱신한 대화 크기와 다시 계산한 값의 차이 (0이어야 함)
+            "conversation_size_drift": bot_module.conversations.check_sizes()
+        }
+    }
+    if extra:
+        results["results"].update(extra)
+    return results
+
+
+def save(results, directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory, f"{results['scenario']}-{results['version']}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare(current, previous_path):
+    """주요 지표를 이전 결과와 나란히 출력"""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    rows = [
+        ("throughput_per_second",), ("messages_failed",),
+        ("latency_complete_ms", "p50"), ("latency_complete_ms", "p95"), ("latency_complete_ms", "p99"),
+        ("latency_first_reply_ms", "p50"), ("latency_first_reply_ms", "p99"),
+        ("api_requests",), ("input_tokens",),
+        ("event_loop_lag_ms", "p99"), ("event_loop_lag_ms", "max"), ("rss_peak_mb",)
+    ]
+    print(f"\n비교: {previous['version']} ({previous['timestamp']}) -> {current['version']}")
+    for path in rows:
+        old, new = previous["results"], current["results"]
+        for key in path:
+            old = old.get(key) if isinstance(old, dict) else None
+            new = new.get(key) if isinstance(new, dict) else None
+        change = f"{(new - old) / old:+.1%}" if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old else ""
+        print(f"- {'.'.join(path)}: {old} -> {new} {change}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="봇 핸들러 오프라인 부하 테스트")
+    parser.add_argument("scenario", choices=SCENARIOS)
+    parser.add_argument("--channels", type=int, default=50, help="채널 수")
+    parser.add_argument("--messages", type=int, default=5, help="채널당 메시지 수 (burst는 묶음 수)")
+    parser.add_argument("--burst", type=int, default=10, help="burst: 한꺼번에 보내는 메시지 수")
+    parser.add_argument("--interval", type=float, default=0.5, help="메시지 사이 평균 간격(초)")
+    parser.add_argument("--attachment-size", type=int, default=50_000, help="attachments: 첨부파일 크기(바이트)")
+    parser.add_argument("--backup-interval", type=float, default=0.2, help="backups: 백업 간격(초)")
+    parser.add_argument("--message-chars", type=int, default=200, help="hydrate: 저장된 메시지 길이")
+    parser.add_argument("--keys", type=int, default=2, help="API 키 수")
+    parser.add_argument("--latency", type=float, default=0.5, help="스텁: 첫 토큰까지 시간(초)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="스텁: 추가 무작위 지연(초)")
+    parser.add_argument("--output-tokens", type=int, default=200, help="스텁: 응답 토큰 수")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="스텁: 생성 속도")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="스텁: 429 응답 확률")
+    parser.add_argument("--overload-rate", type=float, default=0.0, help="스텁: 529 응답 확률")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="스텁: retry-after(초)")
+    parser.add_argument("--requests-per-minute", type=int, default=4000, help="스텁: 키별 분당 요청 한도")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="가짜 Discord API 지연(초)")
+    parser.add_argument("--stream", action="store_true", help="응답 스트리밍 사용")
+    parser.add_argument("--faq-threshold", type=float, default=0, help="FAQ 바로 답변 임계값 (0이면 항상 API 호출)")
+    parser.add_argument("--database-url", help="로컬 Postgres 주소 (없으면 SQLite 사용)")
+    parser.add_argument("--sqlite-path", default=":memory:", help="SQLite 파일 경로")
+    parser.add_argument("--db-delay", type=float, default=0.0, help="SQLite 쿼리마다 더할 지연(초)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=os.path.join("loadtest", "results"), help="결과 JSON 저장 폴더")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print(json.dumps(results["results"], ensure_ascii=False, indent=2))
+    # API 호출이 하나도 성공하지 않은 실행은 오류 경로만 측정한 것이므로 저장/비교하지 않음
+    if results["results"]["messages_sent"] and not results["results"]["api_calls_ok"]:
+        print(f"\nAPI 호출 성공 0회 (실패한 메시지 {results['results']['messages_failed']}개): 결과를 저장하지 않습니다.",
+              file=sys.stderr)
+        sys.exit(1)
+    print(f"\n결과 저장: {save(results, args.output)}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
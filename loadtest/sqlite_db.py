@@ -0,0 +1,246 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import metrics
+from main import DatabaseManager
+
+
+class SQLiteDatabase(DatabaseManager):
+    """부하 테스트용 DatabaseManager 대역 (로컬 SQLite 파일 또는 메모리)
+
+    쓰기 대기열(queue_message, queue_channel_context)과 백업/설정 저장 루프는 DatabaseManager 것을 그대로 쓰고,
+    실제 SQL 실행만 SQLite로 바꾼다. 쿼리는 스레드에서 실행해 이벤트 루프를 막지 않으며,
+    query_delay로 원격 DB 왕복 시간을 흉내낼 수 있다.
+    """
+
+    def __init__(self, path=":memory:", query_delay=0.0):
+        # 연결 풀 대신 SQLite 연결 하나 사용 (DatabaseManager.__init__의 풀은 만들지 않음)
+        self.path = path
+        self.query_delay = query_delay
+        self.connection = None
+        self.lock = asyncio.Lock()
+        self.backup_interval = 300
+        self.pending_messages = {}
+        self.pending_settings = {}
+        self.settings_batch_size = 50
+        self.settings_flush_interval = 2
+        self.settings_flush_event = asyncio.Event()
+        self.settings_flush_task = None
+        self.write_generation = 0
+        self.writes_in_flight = 0
+        self.writes_idle = asyncio.Event()
+        self.writes_idle.set()
+
+    async def connect(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        await self.setup_database()
+        self.settings_flush_task = asyncio.create_task(self.start_settings_flush_loop())
+
+    async def close(self):
+        if self.settings_flush_task:
+            self.settings_flush_task.cancel()
+        await self.flush_channel_settings()
+        await self.backup_all_channels()
+        self.connection.close()
+
+    async def _execute(self, method, work):
+        """work(connection)를 스레드에서 실행하고 한 트랜잭션으로 커밋 (메서드별 지연 시간 기록)"""
+        def run():
+            with self.connection:
+                return work(self.connection)
+
+        with metrics.db_latency.time(method=method):
+            async with self.lock:
+                if self.query_delay:
+                    await asyncio.sleep(self.query_delay)
+                return await asyncio.to_thread(run)
+
+    async def setup_database(self):
+        def work(conn):
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS channel_settings (
+                    channel_id INTEGER PRIMARY KEY,
+                    is_active BOOLEAN DEFAULT 1,
+                    last_backup TIMESTAMP,
+                    system_prompt TEXT,
+                    permanent_history TEXT,
+                    temperature REAL DEFAULT 0.7,
+                    max_tokens INTEGER DEFAULT 4000,
+                    max_input_tokens INTEGER,
+                    faq_threshold REAL
+                );
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel_id INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE INDEX IF NOT EXISTS chat_messages_channel_idx ON chat_messages (channel_id, id);
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    created_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS catalog_changes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    item TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+
+        await self._execute("setup_database", work)
+
+    async def backup_all_channels(self):
+        if not self.pending_messages:
+            return
+        with self.writing():
+            pending, self.pending_messages = self.pending_messages, {}
+            rows = [
+                (channel_id, role, content)
+                for channel_id, messages in pending.items()
+                for role, content in messages
+            ]
+
+            def work(conn):
+                conn.executemany("INSERT INTO chat_messages (channel_id, role, content) VALUES (?, ?, ?)", rows)
+                conn.executemany(
+                    """
+                    INSERT INTO channel_settings (channel_id, last_backup) VALUES (?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (channel_id) DO UPDATE SET last_backup = CURRENT_TIMESTAMP
+                    """,
+                    [(channel_id,) for channel_id in pending]
+                )
+
+            started = time.perf_counter()
+            await self._execute("backup_all_channels", work)
+            metrics.backup_duration.observe(time.perf_counter() - started)
+
+    async def flush_channel_settings(self):
+        if not self.pending_settings:
+            return
+        with self.writing():
+            pending, self.pending_settings = self.pending_settings, {}
+
+            def work(conn):
+                for channel_id, fields in pending.items():
+                    columns = list(fields)
+                    conn.execute(
+                        f"""
+                        INSERT INTO channel_settings (channel_id, {', '.join(columns)})
+                        VALUES (?, {', '.join('?' * len(columns))})
+                        ON CONFLICT (channel_id) DO UPDATE SET
+                        {', '.join(f'{column} = excluded.{column}' for column in columns)}
+                        """,
+                        [channel_id, *fields.values()]
+                    )
+
+            await self._execute("flush_channel_settings", work)
+
+    async def load_channel_history(self, channel_id, limit=20):
+        def work(conn):
+            return conn.execute(
+                "SELECT role, content FROM chat_messages WHERE channel_id = ? ORDER BY id DESC LIMIT ?",
+                (channel_id, limit)
+            ).fetchall()
+
+        history = []
+        for role, content in await self._execute("load_channel_history", work):
+            if role == "clear":
+                break
+            history.append({"role": role, "content": content})
+        history.reverse()
+        return history
+
+    async def load_channel_context(self, channel_id):
+        def work(conn):
+            return conn.execute(
+                """
+                SELECT system_prompt, permanent_history, temperature, max_tokens, is_active, max_input_tokens, faq_threshold
+                FROM channel_settings WHERE channel_id = ?
+                """,
+                (channel_id,)
+            ).fetchone()
+
+        row = await self._execute("load_channel_context", work)
+        if not row:
+            return None, None, 0.7, 4000, True, None, None
+        system_prompt, permanent_history, temperature, max_tokens, is_active, max_input_tokens, faq_threshold = row
+        permanent_history = json.loads(permanent_history) if permanent_history else None
+        return system_prompt, permanent_history, temperature, max_tokens, bool(is_active), max_input_tokens, faq_threshold
+
+    async def get_current_manual_version(self):
+        return None
+
+    async def load_cached_response(self, cache_key, ttl):
+        def work(conn):
+            return conn.execute(
+                """
+                SELECT response, scope, input_tokens, output_tokens, created_at
+                FROM response_cache WHERE cache_key = ? AND created_at > ?
+                """,
+                (cache_key, time.time() - ttl)
+            ).fetchone()
+
+        return await self._execute("load_cached_response", work)
+
+    async def save_cached_response(self, cache_key, entry):
+        def work(conn):
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO response_cache (cache_key, scope, response, input_tokens, output_tokens, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (cache_key, entry.scope, entry.text, entry.input_tokens, entry.output_tokens, entry.created_at)
+            )
+
+        await self._execute("save_cached_response", work)
+
+    async def delete_cached_responses(self, scope):
+        await self._execute(
+            "delete_cached_responses",
+            lambda conn: conn.execute("DELETE FROM response_cache WHERE scope = ?", (scope,))
+        )
+
+    async def get_latest_catalog_change_id(self):
+        def work(conn):
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM catalog_changes").fetchone()[0]
+
+        return await self._execute("get_latest_catalog_change_id", work)
+
+    async def load_catalog_changes(self, after_id, limit=500):
+        def work(conn):
+            return conn.execute(
+                "SELECT id, source, kind, category, name, item FROM catalog_changes WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            ).fetchall()
+
+        return [
+            (change_id, source, kind, category, name, json.loads(item) if item else None)
+            for change_id, source, kind, category, name, item in await self._execute("load_catalog_changes", work)
+        ]
+
+    async def seed_channels(self, channel_ids, messages_per_channel=20, message_chars=200):
+        """채널별 대화 기록 미리 채우기 (불러오기/메모리 측정용)"""
+        text = ("상담 내용 예시 " * (message_chars // 8 + 1))[:message_chars]
+
+        def work(conn):
+            conn.executemany(
+                "INSERT INTO chat_messages (channel_id, role, content) VALUES (?, ?, ?)",
+                (
+                    (channel_id, "user" if i % 2 == 0 else "assistant", text)
+                    for channel_id in channel_ids
+                    for i in range(messages_per_channel)
+                )
+            )
+
+        await self._execute("seed_channels", work)
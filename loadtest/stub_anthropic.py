@@ -0,0 +1,166 @@
+import asyncio
+import json
+import random
+import time
+
+# 스텁 응답 본문 (출력 토큰 수에 맞춰 반복)
+FILLER = "네, 안내해 드리겠습니다. 자세한 내용은 상담 시 확인 부탁드립니다. "
+
+
+class StubAnthropicServer:
+    """로컬 Anthropic Messages API 스텁 (POST /v1/messages, 일반/스트리밍 응답)
+
+    - latency: 첫 토큰까지 걸리는 시간(초), jitter: 그 위에 더하는 무작위 시간(초)
+    - output_tokens: 응답 토큰 수, tokens_per_second: 스트리밍 속도
+    - error_rate: 429를 무작위로 돌려줄 확률, overload_rate: 529 확률, retry_after: 429/529의 retry-after(초)
+    - requests_per_minute: 키별 분당 요청 한도 (넘으면 429, anthropic-ratelimit-* 헤더도 이 값 기준)
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, output_tokens=200, tokens_per_second=200.0,
+                 error_rate=0.0, overload_rate=0.0, retry_after=1.0, requests_per_minute=4000, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.output_tokens = output_tokens
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.overload_rate = overload_rate
+        self.retry_after = retry_after
+        self.requests_per_minute = requests_per_minute
+        self.random = random.Random(seed)
+        self.windows = {}  # API 키 -> [분 단위 구간 시작 시각, 요청 수]
+        self.stats = {"requests": 0, "streamed": 0, "rate_limited": 0, "overloaded": 0}
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        # keep-alive: 연결이 닫힐 때까지 요청을 계속 처리
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                keep_open = await self._respond(writer, request_line.decode("latin-1").split(), headers, body)
+                if not keep_open:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _rate_limit_headers(self, key):
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= 60:
+            window = self.windows[key] = [now, 0]
+        window[1] += 1
+        remaining = max(0, self.requests_per_minute - window[1])
+        reset = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 60 - (now - window[0])))
+        return remaining, {
+            "anthropic-ratelimit-requests-limit": str(self.requests_per_minute),
+            "anthropic-ratelimit-requests-remaining": str(remaining),
+            "anthropic-ratelimit-requests-reset": reset
+        }
+
+    async def _respond(self, writer, request, headers, body):
+        if len(request) < 2 or request[0] != "POST" or not request[1].startswith("/v1/messages"):
+            self._write(writer, "404 Not Found", {}, b'{"type":"error","error":{"type":"not_found_error"}}')
+            return True
+
+        self.stats["requests"] += 1
+        payload = json.loads(body or b"{}")
+        remaining, limit_headers = self._rate_limit_headers(headers.get("x-api-key", ""))
+
+        roll = self.random.random()
+        if remaining == 0 or roll < self.error_rate:
+            self.stats["rate_limited"] += 1
+            self._error(writer, "429 Too Many Requests", "rate_limit_error", limit_headers)
+            return True
+        if roll < self.error_rate + self.overload_rate:
+            self.stats["overloaded"] += 1
+            self._error(writer, "529 Overloaded", "overloaded_error", limit_headers)
+            return True
+
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        input_tokens = max(1, len(body) // 4)
+        output_tokens = min(self.output_tokens, payload.get("max_tokens", self.output_tokens))
+        words = (FILLER * (output_tokens // 20 + 1)).split(" ")[:output_tokens]
+        message = {
+            "id": f"msg_stub_{self.stats['requests']}",
+            "type": "message",
+            "role": "assistant",
+            "model": payload.get("model", "stub"),
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": 0,
+                      "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        }
+
+        if not payload.get("stream"):
+            # 스트리밍이 아니면 전체 생성 시간만큼 기다린 뒤 한 번에 응답
+            await asyncio.sleep(output_tokens / self.tokens_per_second)
+            message["content"] = [{"type": "text", "text": " ".join(words)}]
+            message["stop_reason"] = "end_turn"
+            message["usage"]["output_tokens"] = output_tokens
+            self._write(writer, "200 OK", {**limit_headers, "Content-Type": "application/json"},
+                        json.dumps(message, ensure_ascii=False).encode("utf-8"))
+            return True
+
+        self.stats["streamed"] += 1
+        writer.write(self._head("200 OK", {**limit_headers, "Content-Type": "text/event-stream",
+                                           "Cache-Control": "no-cache", "Connection": "close"}))
+        self._event(writer, "message_start", {"type": "message_start", "message": message})
+        self._event(writer, "content_block_start",
+                    {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        # 10토큰씩 보내고 그만큼 기다림
+        for i in range(0, len(words), 10):
+            text = " ".join(words[i:i + 10]) + " "
+            self._event(writer, "content_block_delta",
+                        {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}})
+            await writer.drain()
+            await asyncio.sleep(10 / self.tokens_per_second)
+        self._event(writer, "content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._event(writer, "message_delta", {"type": "message_delta",
+                                              "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                              "usage": {"output_tokens": output_tokens}})
+        self._event(writer, "message_stop", {"type": "message_stop"})
+        await writer.drain()
+        return False
+
+    def _error(self, writer, status, error_type, limit_headers):
+        body = json.dumps({"type": "error", "error": {"type": error_type, "message": "stub"}}).encode("utf-8")
+        self._write(writer, status, {**limit_headers, "Content-Type": "application/json",
+                                     "retry-after": f"{self.retry_after:g}"}, body)
+
+    @staticmethod
+    def _head(status, headers):
+        lines = [f"HTTP/1.1 {status}"] + [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    def _write(self, writer, status, headers, body):
+        writer.write(self._head(status, {**headers, "Content-Length": str(len(body))}) + body)
+
+    @staticmethod
+    def _event(writer, name, data):
+        writer.write(f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
@@ -0,0 +1,55 @@
+import logging
+import time
+
+
+def kv(event, **fields):
+    """구조화 로그 메시지 ("event key=value ...", 공백이 있는 값은 따옴표)"""
+    parts = [event]
+    for key, value in fields.items():
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        else:
+            value = str(value)
+            if not value or any(c in value for c in ' ="\n'):
+                value = '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+
+class RateLimitFilter(logging.Filter):
+    """같은 이벤트 로그가 interval초 안에 burst번을 넘으면 버리고, 다음에 버린 개수를 함께 기록
+
+    이벤트는 로그 메시지의 첫 단어(kv()의 event)로 구분한다. WARNING 이상은 제한하지 않는다.
+    """
+
+    def __init__(self, interval=10.0, burst=20):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.windows = {}  # 이벤트 -> [구간 시작 시각, 구간 안 개수, 버린 개수]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        event = str(record.msg).split(" ", 1)[0]
+        now = time.monotonic()
+        window = self.windows.get(event)
+        if window is None or now - window[0] >= self.interval:
+            dropped = window[2] if window else 0
+            self.windows[event] = [now, 1, 0]
+            if dropped:
+                record.msg = f"{record.msg} suppressed={dropped}"
+            return True
+        if window[1] >= self.burst:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+def get_logger(name="bot", interval=10.0, burst=20):
+    """속도 제한 필터를 붙인 로거"""
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter(interval, burst))
+    return logger
@@ -2,40 +2,207 @@ import os
 import discord
 import asyncio
 import json
-import psycopg2
-from datetime import datetime
+import time
+import psycopg
+from contextlib import asynccontextmanager, contextmanager
 from discord.ext import commands
-from anthropic import Anthropic
-from itertools import cycle
+from anthropic import AsyncAnthropic
 from dotenv import load_dotenv
+from psycopg_pool import AsyncConnectionPool
+from conversation_store import ConversationStore
+from context_builder import (
+    build_messages, estimate_prompt_tokens, cacheable_system, add_cache_breakpoint, message_text, append_reference
+)
+from faq_router import FAQRouter
+from dialog_flow import DialogFlow, DialogEngine
+from response_templates import ResponseRenderer, check_accuracy
+from price_catalog import PriceCatalog, is_price_question
+from manual_index import ManualIndex
+from discord_stream import StreamingReply, split_message
+from key_scheduler import KeyScheduler, parse_retry_after
+from channel_queue import ChannelQueue
+from response_cache import ResponseCache, make_key, digest
+from log_utils import get_logger, kv
+import metrics
 
 load_dotenv()
 
 # 설정 및 환경변수
 DISCORD_TOKEN = os.environ['DISCORD_TOKEN']
-ANTHROPIC_API_KEYS = [
-    os.environ['ANTHROPIC_API_KEY_1'],
-    os.environ['ANTHROPIC_API_KEY_2']
-]
+# ANTHROPIC_API_KEY_1, ANTHROPIC_API_KEY_2, ... 순서대로 있는 만큼 사용
+ANTHROPIC_API_KEYS = []
+while os.environ.get(f'ANTHROPIC_API_KEY_{len(ANTHROPIC_API_KEYS) + 1}'):
+    ANTHROPIC_API_KEYS.append(os.environ[f'ANTHROPIC_API_KEY_{len(ANTHROPIC_API_KEYS) + 1}'])
 
 # API 키가 제대로 설정되었는지 확인
 if not DISCORD_TOKEN or not any(ANTHROPIC_API_KEYS):
     raise ValueError("필요한 환경 변수가 설정되지 않았습니다. .env 파일을 확인해주세요.")
 
+# API 동시 호출 제한 (전체 / 채널별)
+ANTHROPIC_MAX_CONCURRENCY = int(os.environ.get('ANTHROPIC_MAX_CONCURRENCY', 8))
+ANTHROPIC_CHANNEL_CONCURRENCY = int(os.environ.get('ANTHROPIC_CHANNEL_CONCURRENCY', 1))
+# 테스트용 스텁 서버 등 다른 API 주소를 사용할 때 설정 (없으면 기본 주소)
+ANTHROPIC_BASE_URL = os.environ.get('ANTHROPIC_BASE_URL') or None
+# 재시도 대기 (지수 백오프 기본값/최대값)와 429/529 응답 후 키 차단 시간(초)
+ANTHROPIC_RETRY_BASE_DELAY = float(os.environ.get('ANTHROPIC_RETRY_BASE_DELAY', 1.0))
+ANTHROPIC_RETRY_MAX_DELAY = float(os.environ.get('ANTHROPIC_RETRY_MAX_DELAY', 30.0))
+ANTHROPIC_KEY_COOLDOWN = float(os.environ.get('ANTHROPIC_KEY_COOLDOWN', 5.0))
+
+# DB 연결 풀 크기
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+
+# 메모리에 유지할 채널 컨텍스트 수와 유지 시간(초)
+CHANNEL_CACHE_SIZE = int(os.environ.get('CHANNEL_CACHE_SIZE', 1000))
+CHANNEL_CACHE_TTL = int(os.environ.get('CHANNEL_CACHE_TTL', 3600))
+# 메모리에 유지할 전체 대화 내용 한도 (글자 수)
+CHANNEL_MEMORY_BUDGET = int(os.environ.get('CHANNEL_MEMORY_BUDGET', 50_000_000))
+
+# 채널별 입력 토큰 한도 기본값 (시스템 프롬프트 + 고정 대화 + 최근 대화)
+DEFAULT_MAX_INPUT_TOKENS = int(os.environ.get('DEFAULT_MAX_INPUT_TOKENS', 40000))
+
+# FAQ/의도 데이터 폴더 (FAQ.csv, intents.csv, responses.json)와 바로 답변할 최소 유사도
+KNOWLEDGE_DIR = os.environ.get('KNOWLEDGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'training bot KR', 'save'))
+FAQ_THRESHOLD = float(os.environ.get('FAQ_THRESHOLD', 0.8))
+# 대화 흐름(KNOWLEDGE_DIR/dialog_flow.yaml): 다음 단계로 판단할 최소 의도 유사도 (0이면 끔)와 대화 위치 유지 시간 (초)
+# 흐름 밖에서 새 흐름을 시작할 때는 DIALOG_ENTRY_THRESHOLD 사용, 둘 다 채널의 FAQ 임계값보다 낮아지지 않음
+DIALOG_THRESHOLD = float(os.environ.get('DIALOG_THRESHOLD', 0.6))
+DIALOG_ENTRY_THRESHOLD = float(os.environ.get('DIALOG_ENTRY_THRESHOLD', 0.9))
+DIALOG_STATE_TTL = int(os.environ.get('DIALOG_STATE_TTL', 1800))
+# responses.json 고정 답변 템플릿: 파일이 바뀌었는지 확인할 간격 (초, 0이면 시작할 때 한 번만 읽음)
+RESPONSE_RELOAD_INTERVAL = float(os.environ.get('RESPONSE_RELOAD_INTERVAL', 5.0))
+# FAQ 라우터 의도 매칭을 바로 답변(템플릿/고정 답변)할 최소 유사도 (0이면 끔, FAQ 임계값보다 낮아지지 않음)
+# FAQ.csv 질문은 FAQ 임계값만 적용. 시작할 때 의도 예문으로 정확도를 측정해 TEMPLATE_MIN_ACCURACY 미만이거나 답변한 예문이 TEMPLATE_MIN_SAMPLES개 미만이면 끔
+TEMPLATE_THRESHOLD = float(os.environ.get('TEMPLATE_THRESHOLD', 0))
+TEMPLATE_MIN_ACCURACY = float(os.environ.get('TEMPLATE_MIN_ACCURACY', 0.9))
+TEMPLATE_MIN_SAMPLES = int(os.environ.get('TEMPLATE_MIN_SAMPLES', 20))
+
+# 가격표 JSON 파일 목록 (os.pathsep으로 구분, 없는 파일은 건너뜀)과 질문마다 프롬프트에 넣을 항목 수
+PRICE_FILES = os.environ.get('PRICE_FILES', os.pathsep.join([
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crawl_kr', 'price.json'),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crawl_kr', 'all_treatment_tabs.json'),
+    os.path.join(KNOWLEDGE_DIR, 'services.json'),
+    os.path.join(KNOWLEDGE_DIR, 'promotions.json')
+])).split(os.pathsep)
+PRICE_TOP_K = int(os.environ.get('PRICE_TOP_K', 8))
+# 크롤러가 올린 가격표 변경 사항(catalog_changes 테이블)을 확인할 간격 (초, 0이면 끔)
+CATALOG_POLL_INTERVAL = float(os.environ.get('CATALOG_POLL_INTERVAL', 60))
+
+# 매뉴얼 검색 모드: 0이면 매뉴얼 전체를 보내고, 1 이상이면 핵심 헤더 + 질문 관련 상위 N개 섹션만 보냄
+MANUAL_RETRIEVAL_TOP_K = int(os.environ.get('MANUAL_RETRIEVAL_TOP_K', 0))
+
+# 응답 스트리밍: 첫 토큰이 오면 바로 메시지를 보내고 STREAM_EDIT_INTERVAL초마다 수정
+STREAM_RESPONSES = os.environ.get('STREAM_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+STREAM_EDIT_INTERVAL = float(os.environ.get('STREAM_EDIT_INTERVAL', 1.0))
+
+# 채널별 대기열: 응답을 만드는 동안 쌓일 수 있는 최대 메시지 수와 넘쳤을 때 처리 방식 (drop_oldest 또는 reject)
+CHANNEL_QUEUE_MAX_DEPTH = int(os.environ.get('CHANNEL_QUEUE_MAX_DEPTH', 10))
+CHANNEL_QUEUE_SHED_POLICY = os.environ.get('CHANNEL_QUEUE_SHED_POLICY', 'drop_oldest')
+
+# 응답 캐시 (처음 질문 또는 온도 0일 때 같은 질문의 응답 재사용): 최대 항목 수, 유지 시간(초), DB 저장 여부
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1000))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 86400))
+RESPONSE_CACHE_DB = os.environ.get('RESPONSE_CACHE_DB', 'false').lower() in ('1', 'true', 'yes')
+
+# 지표 엔드포인트 (http://METRICS_HOST:METRICS_PORT/metrics, 0이면 끔)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9100))
+# 같은 종류의 로그는 LOG_RATE_INTERVAL초에 LOG_RATE_BURST개까지만 출력
+LOG_RATE_INTERVAL = float(os.environ.get('LOG_RATE_INTERVAL', 10.0))
+LOG_RATE_BURST = int(os.environ.get('LOG_RATE_BURST', 20))
+
+log = get_logger('bot', interval=LOG_RATE_INTERVAL, burst=LOG_RATE_BURST)
+
 # 시스템 프롬프트 로드
 SYSTEM_PROMPT = ""
+# 현재 매뉴얼 버전의 섹션 색인 (검색 모드에서만 사용)
+manual_index = None
+# 현재 매뉴얼 버전 ID (manual_history.id, 응답 캐시 키에 사용)
+manual_version = None
+# 마지막으로 반영한 가격표 변경 ID (catalog_changes.id, 가격 질문의 응답 캐시 키에 사용)
+catalog_version = 0
+catalog_poll_task = None
 
 class DatabaseManager:
-    def __init__(self):
-        self.conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        self.setup_database()
+    def __init__(self, dsn, min_size=1, max_size=10):
+        # 연결 풀은 이벤트 루프 안에서 connect()로 연다
+        self.pool = AsyncConnectionPool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            open=False,
+            check=AsyncConnectionPool.check_connection  # 끊긴 연결은 빌려주기 전에 교체
+        )
         self.backup_interval = 300  # 5분마다 백업
+        # 마지막 백업 이후 새로 추가된 메시지 (채널 ID -> [(role, content)])
+        self.pending_messages = {}
         
-    def setup_database(self):
+        # 아직 저장되지 않은 채널 설정 (채널 ID -> {컬럼: 값}), 같은 채널은 병합
+        self.pending_settings = {}
+        self.settings_batch_size = 50  # 이만큼 쌓이면 바로 저장
+        self.settings_flush_interval = 2  # 늦어도 2초 안에 저장
+        self.settings_flush_event = asyncio.Event()
+        self.settings_flush_task = None
+        
+        # 대기열을 꺼내 DB에 쓰는 중인 작업 (ConversationStore가 DB + 대기열을 합쳐 읽을 때 확인)
+        self.write_generation = 0
+        self.writes_in_flight = 0
+        self.writes_idle = asyncio.Event()
+        self.writes_idle.set()
+    
+    @contextmanager
+    def writing(self):
+        """대기열을 꺼내서 DB에 쓰는 구간 (실패해서 대기열에 되돌리는 것까지 포함)"""
+        self.write_generation += 1
+        self.writes_in_flight += 1
+        self.writes_idle.clear()
+        try:
+            yield
+        finally:
+            self.writes_in_flight -= 1
+            if not self.writes_in_flight:
+                self.writes_idle.set()
+    
+    async def connect(self):
+        """연결 풀 열기 및 테이블 설정"""
+        await self.pool.open()
+        await self.setup_database()
+        self.settings_flush_task = asyncio.create_task(self.start_settings_flush_loop())
+    
+    async def close(self):
+        """남은 설정/메시지를 모두 저장한 뒤 연결 풀 닫기"""
+        if self.settings_flush_task:
+            self.settings_flush_task.cancel()
+        await self.flush_channel_settings()
+        await self.backup_all_channels()
+        await self.pool.close()
+    
+    async def _run(self, work, retries=0):
+        """풀에서 연결을 빌려 작업 실행 (retries: 연결이 끊겼을 때 재연결 후 다시 시도할 횟수)
+
+        커밋은 됐는데 응답 전에 연결이 끊긴 경우 다시 실행하면 두 번 반영되므로,
+        재시도는 읽기/CREATE IF NOT EXISTS처럼 여러 번 실행해도 같은 작업에만 지정한다.
+        """
+        # 작업을 정의한 메서드 이름 (DatabaseManager.load_channel_context.<locals>.work -> load_channel_context)
+        method = work.__qualname__.split('.<locals>')[0].rsplit('.', 1)[-1]
+        for attempt in range(retries + 1):
+            try:
+                # 블록을 정상적으로 빠져나가면 커밋, 예외가 나면 롤백
+                with metrics.db_latency.time(method=method):
+                    async with self.pool.connection() as conn:
+                        async with conn.cursor() as cur:
+                            return await work(cur)
+            except psycopg.OperationalError as e:
+                if attempt == retries:
+                    raise
+                log.warning(kv("db_reconnect", method=method, error=e))
+                await self.pool.check()
+        
+    async def setup_database(self):
         """데이터베이스 테이블 초기 설정"""
-        with self.conn.cursor() as cur:
+        async def work(cur):
             # 채팅 백업용 테이블
-            cur.execute("""
+            await cur.execute("""
                 CREATE TABLE IF NOT EXISTS chat_history (
                     id SERIAL PRIMARY KEY,
                     channel_id BIGINT NOT NULL,
@@ -51,9 +218,26 @@ class DatabaseManager:
                     system_prompt TEXT,
                     permanent_history JSONB,
                     temperature FLOAT DEFAULT 0.7,
-                    max_tokens INT DEFAULT 4000
+                    max_tokens INT DEFAULT 4000,
+                    max_input_tokens INT,
+                    faq_threshold FLOAT
                 );
                 
+                ALTER TABLE channel_settings ADD COLUMN IF NOT EXISTS max_input_tokens INT;
+                ALTER TABLE channel_settings ADD COLUMN IF NOT EXISTS faq_threshold FLOAT;
+                
+                -- 채팅 메시지 로그 (추가 전용, 새 메시지만 기록)
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id BIGSERIAL PRIMARY KEY,
+                    channel_id BIGINT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                CREATE INDEX IF NOT EXISTS chat_messages_channel_idx
+                    ON chat_messages (channel_id, id);
+                
                 CREATE TABLE IF NOT EXISTS manual_history (
                     id SERIAL PRIMARY KEY,
                     content TEXT NOT NULL,
@@ -61,49 +245,85 @@ class DatabaseManager:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     is_current BOOLEAN DEFAULT true
                 );
+                
+                -- 응답 캐시 (RESPONSE_CACHE_DB 사용 시)
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    input_tokens INT DEFAULT 0,
+                    output_tokens INT DEFAULT 0,
+                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                CREATE INDEX IF NOT EXISTS response_cache_scope_idx
+                    ON response_cache (scope);
+                
+                -- 크롤러가 올리는 가격표 변경 사항 (crawl_kr/changes.py)
+                CREATE TABLE IF NOT EXISTS catalog_changes (
+                    id BIGSERIAL PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    item JSONB,
+                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+                );
             """)
-        self.conn.commit()
+        
+        await self._run(work, retries=1)
         print("데이터베이스 설정 완료")
 
     async def update_manual(self, content: str, user_id: int):
         """새로운 매뉴얼 내용 저장"""
+        async def work(cur):
+            # 기존 현재 버전 비활성화
+            await cur.execute(
+                "UPDATE manual_history SET is_current = false WHERE is_current = true"
+            )
+            
+            # 새 버전 추가
+            await cur.execute(
+                """
+                INSERT INTO manual_history (content, updated_by)
+                VALUES (%s, %s)
+                RETURNING id
+                """,
+                (content, user_id)
+            )
+            return (await cur.fetchone())[0]
+        
         try:
-            with self.conn.cursor() as cur:
-                # 기존 현재 버전 비활성화
-                cur.execute(
-                    "UPDATE manual_history SET is_current = false WHERE is_current = true"
-                )
-                
-                # 새 버전 추가
-                cur.execute(
-                    """
-                    INSERT INTO manual_history (content, updated_by)
-                    VALUES (%s, %s)
-                    RETURNING id
-                    """,
-                    (content, user_id)
-                )
-                new_id = cur.fetchone()[0]
-            self.conn.commit()
-            return new_id
+            return await self._run(work)
         except Exception as e:
             print(f"매뉴얼 업데이트 중 오류: {e}")
-            self.conn.rollback()
             raise
     
-    def get_current_manual(self):
+    async def get_current_manual(self):
         """현재 활성화된 매뉴얼 내용 조회"""
-        with self.conn.cursor() as cur:
-            cur.execute(
+        async def work(cur):
+            await cur.execute(
                 "SELECT content FROM manual_history WHERE is_current = true"
             )
-            result = cur.fetchone()
+            result = await cur.fetchone()
             return result[0] if result else None
+        
+        return await self._run(work, retries=1)
     
-    def get_manual_history(self, limit=5):
+    async def get_current_manual_version(self):
+        """현재 활성화된 매뉴얼의 버전 ID와 내용 조회"""
+        async def work(cur):
+            await cur.execute(
+                "SELECT id, content FROM manual_history WHERE is_current = true ORDER BY id DESC LIMIT 1"
+            )
+            return await cur.fetchone()
+        
+        return await self._run(work, retries=1)
+    
+    async def get_manual_history(self, limit=5):
         """매뉴얼 변경 이력 조회"""
-        with self.conn.cursor() as cur:
-            cur.execute(
+        async def work(cur):
+            await cur.execute(
                 """
                 SELECT id, updated_by, updated_at, is_current
                 FROM manual_history
@@ -112,7 +332,34 @@ class DatabaseManager:
                 """,
                 (limit,)
             )
-            return cur.fetchall()
+            return await cur.fetchall()
+        
+        return await self._run(work, retries=1)
+    
+    async def get_latest_catalog_change_id(self):
+        """가장 최근 가격표 변경 ID (없으면 0)"""
+        async def work(cur):
+            await cur.execute("SELECT COALESCE(MAX(id), 0) FROM catalog_changes")
+            return (await cur.fetchone())[0]
+        
+        return await self._run(work, retries=1)
+    
+    async def load_catalog_changes(self, after_id, limit=500):
+        """after_id 이후의 가격표 변경 사항 (id, source, kind, category, name, item) 순서대로"""
+        async def work(cur):
+            await cur.execute(
+                """
+                SELECT id, source, kind, category, name, item
+                FROM catalog_changes
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+                """,
+                (after_id, limit)
+            )
+            return await cur.fetchall()
+        
+        return await self._run(work, retries=1)
     
     async def start_backup_loop(self):
         """주기적 백업 실행"""
@@ -120,154 +367,364 @@ class DatabaseManager:
             await self.backup_all_channels()
             await asyncio.sleep(self.backup_interval)
     
+    def queue_message(self, channel_id, message):
+        """다음 백업 때 기록할 메시지 추가"""
+        self.pending_messages.setdefault(channel_id, []).append(
+            (message["role"], message["content"])
+        )
+    
+    def clear_channel_history(self, channel_id):
+        """최근 대화 초기화 기록 (이전 메시지는 복원되지 않음)"""
+        # 아직 백업되지 않은 메시지는 버리고 초기화 표시만 남김
+        self.pending_messages[channel_id] = [("clear", "")]
+    
     async def backup_all_channels(self):
-        """모든 채널의 대화 내용 백업"""
-        try:
-            with self.conn.cursor() as cur:
-                for channel_id, messages in channel_message_history.items():
-                    if messages:  # 메시지가 있는 경우만 백업
-                        cur.execute(
-                            """
-                            INSERT INTO chat_history (channel_id, message_history)
-                            VALUES (%s, %s)
-                            """,
-                            (channel_id, json.dumps(messages))
-                        )
-                        
-                        # 마지막 백업 시간 업데이트
-                        cur.execute(
-                            """
-                            INSERT INTO channel_settings (channel_id, last_backup)
-                            VALUES (%s, CURRENT_TIMESTAMP)
-                            ON CONFLICT (channel_id) 
-                            DO UPDATE SET last_backup = CURRENT_TIMESTAMP
-                            """,
-                            (channel_id,)
-                        )
-            self.conn.commit()
-            print(f"모든 채널 백업 완료: {datetime.now()}")
+        """마지막 백업 이후 새로 추가된 메시지만 백업"""
+        if not self.pending_messages:
+            return  # 변경된 채널이 없으면 아무 작업도 하지 않음
+        
+        with self.writing():
+            # 백업 도중 추가되는 메시지는 다음 백업으로 넘어가도록 교체
+            pending, self.pending_messages = self.pending_messages, {}
+            rows = [
+                (channel_id, role, content)
+                for channel_id, messages in pending.items()
+                for role, content in messages
+            ]
             
-        except Exception as e:
-            print(f"백업 중 오류 발생: {e}")
-            self.conn.rollback()
-    
-    async def load_channel_history(self, channel_id):
-        """채널의 가장 최근 백업 불러오기"""
-        try:
-            with self.conn.cursor() as cur:
-                cur.execute(
+            async def work(cur):
+                await cur.executemany(
                     """
-                    SELECT message_history 
-                    FROM chat_history 
-                    WHERE channel_id = %s 
-                    ORDER BY created_at DESC 
-                    LIMIT 1
+                    INSERT INTO chat_messages (channel_id, role, content)
+                    VALUES (%s, %s, %s)
                     """,
-                    (channel_id,)
+                    rows
                 )
-                result = cur.fetchone()
-                if result:
-                    return result[0]
-        except Exception as e:
-            print(f"히스토리 불러오기 실패: {e}")
-        return []
-    
-    def save_channel_context(self, channel_id, system_prompt=None, permanent_history=None, temperature=None, max_tokens=None):
-        """채널별 컨텍스트 정보 저장"""
-        try:
-            # 디버깅을 위한 파라미터 출력
-            print(f"저장 시도 - 채널: {channel_id}, 프롬프트: {system_prompt is not None}, 고정대화: {permanent_history is not None}, 온도: {temperature}, 토큰: {max_tokens}")
-
-            update_fields = []
-            params = [channel_id]
             
-            if system_prompt is not None:
-                update_fields.append("system_prompt = %s")
-                params.append(system_prompt)
-                
-            if permanent_history is not None:
-                update_fields.append("permanent_history = %s")
-                params.append(json.dumps(permanent_history))
-                
-            if temperature is not None:
-                update_fields.append("temperature = %s")
-                params.append(temperature)
-                
-            if max_tokens is not None:
-                update_fields.append("max_tokens = %s")
-                params.append(max_tokens)
-                
-            if not update_fields:
-                return False
-                
-            with self.conn.cursor() as cur:
-                query = f"""
-                    INSERT INTO channel_settings (channel_id, {', '.join(field.split(' = ')[0] for field in update_fields)})
-                    VALUES (%s, {', '.join(['%s'] * len(update_fields))})
+                # 마지막 백업 시간 업데이트 (변경된 채널 전체를 한 번에)
+                await cur.execute(
+                    """
+                    INSERT INTO channel_settings (channel_id, last_backup)
+                    SELECT unnest(%s::bigint[]), CURRENT_TIMESTAMP
                     ON CONFLICT (channel_id) 
-                    DO UPDATE SET {', '.join(update_fields)}
+                    DO UPDATE SET last_backup = CURRENT_TIMESTAMP
+                    """,
+                    (list(pending),)
+                )
+            
+            started = time.perf_counter()
+            try:
+                await self._run(work)
+                elapsed = time.perf_counter() - started
+                metrics.backup_duration.observe(elapsed)
+                log.info(kv("backup_done", channels=len(pending), messages=len(rows), seconds=elapsed))
+            
+            except Exception as e:
+                log.error(kv("backup_failed", channels=len(pending), messages=len(rows), error=e))
+                # 실패한 메시지는 다음 백업 때 다시 시도 (순서 유지)
+                for channel_id, messages in pending.items():
+                    if self.pending_messages.get(channel_id, [None])[0] == ("clear", ""):
+                        continue  # 그 사이 초기화된 채널은 버림
+                    self.pending_messages[channel_id] = messages + self.pending_messages.get(channel_id, [])
+    
+    async def load_channel_history(self, channel_id, limit=20):
+        """채널의 최근 대화 불러오기 (마지막 초기화 이후 메시지만)"""
+        async def work(cur):
+            await cur.execute(
+                """
+                SELECT role, content
+                FROM chat_messages
+                WHERE channel_id = %s
+                ORDER BY id DESC
+                LIMIT %s
+                """,
+                (channel_id, limit)
+            )
+            rows = await cur.fetchall()
+            if rows:
+                history = []
+                for role, content in rows:
+                    if role == "clear":
+                        break  # 초기화 이전 메시지는 복원하지 않음
+                    history.append({"role": role, "content": content})
+                history.reverse()
+                return history
+            
+            # 예전 방식(전체 스냅샷) 백업만 있는 채널
+            await cur.execute(
                 """
-                cur.execute(query, params)
-            self.conn.commit()
-            print(f"채널 {channel_id}의 컨텍스트 정보 저장 완료")
-            return True
+                SELECT message_history 
+                FROM chat_history 
+                WHERE channel_id = %s 
+                ORDER BY created_at DESC 
+                LIMIT 1
+                """,
+                (channel_id,)
+            )
+            result = await cur.fetchone()
+            if result:
+                return result[0][-limit:]
+            return []
+        
+        try:
+            return await self._run(work, retries=1)
         except Exception as e:
-            print(f"컨텍스트 저장 중 오류: {e}")
-            import traceback
-            traceback.print_exc()  # 더 상세한 에러 스택 출력
-            self.conn.rollback()
+            print(f"히스토리 불러오기 실패: {e}")
+        return []
+    
+    @staticmethod
+    def _context_fields(system_prompt=None, permanent_history=None, temperature=None, max_tokens=None, max_input_tokens=None, faq_threshold=None):
+        """설정된 값만 {컬럼: 값} 형태로 정리"""
+        fields = {}
+        if system_prompt is not None:
+            fields["system_prompt"] = system_prompt
+        if permanent_history is not None:
+            fields["permanent_history"] = json.dumps(permanent_history)
+        if temperature is not None:
+            fields["temperature"] = temperature
+        if max_tokens is not None:
+            fields["max_tokens"] = max_tokens
+        if max_input_tokens is not None:
+            fields["max_input_tokens"] = max_input_tokens
+        if faq_threshold is not None:
+            fields["faq_threshold"] = faq_threshold
+        return fields
+    
+    @staticmethod
+    def _context_upsert_query(columns):
+        """채널 설정 INSERT ... ON CONFLICT 쿼리 생성"""
+        # ON CONFLICT 절에서도 같은 값을 쓰기 위해 EXCLUDED 사용
+        return f"""
+            INSERT INTO channel_settings (channel_id, {', '.join(columns)})
+            VALUES (%s, {', '.join(['%s'] * len(columns))})
+            ON CONFLICT (channel_id) 
+            DO UPDATE SET {', '.join(f'{column} = EXCLUDED.{column}' for column in columns)}
+        """
+    
+    def queue_channel_context(self, channel_id, system_prompt=None, permanent_history=None, temperature=None, max_tokens=None, max_input_tokens=None, faq_threshold=None):
+        """채널별 컨텍스트 정보 저장 예약 (바로 반환, 백그라운드에서 모아서 저장)"""
+        fields = self._context_fields(system_prompt, permanent_history, temperature, max_tokens, max_input_tokens, faq_threshold)
+        if not fields:
             return False
+        
+        self.pending_settings.setdefault(channel_id, {}).update(fields)
+        if len(self.pending_settings) >= self.settings_batch_size:
+            self.settings_flush_event.set()
+        return True
+    
+    async def start_settings_flush_loop(self):
+        """예약된 채널 설정을 주기적으로 (또는 일정 개수가 쌓이면) 저장"""
+        while True:
+            try:
+                await asyncio.wait_for(self.settings_flush_event.wait(), timeout=self.settings_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.settings_flush_event.clear()
+            await self.flush_channel_settings()
+    
+    async def flush_channel_settings(self):
+        """예약된 채널 설정을 한 번의 트랜잭션으로 저장"""
+        if not self.pending_settings:
+            return
+        
+        with self.writing():
+            pending, self.pending_settings = self.pending_settings, {}
             
-    def load_channel_context(self, channel_id):
+            # 같은 컬럼 조합끼리 묶어서 executemany
+            groups = {}
+            for channel_id, fields in pending.items():
+                groups.setdefault(tuple(fields), []).append([channel_id, *fields.values()])
+            
+            async def work(cur):
+                for columns, rows in groups.items():
+                    await cur.executemany(self._context_upsert_query(columns), rows)
+            
+            try:
+                await self._run(work)
+                print(f"채널 설정 {len(pending)}개 저장 완료")
+            except Exception as e:
+                print(f"채널 설정 저장 중 오류: {e}")
+                # 실패한 값은 다시 예약 (그 사이 들어온 새 값이 우선)
+                for channel_id, fields in pending.items():
+                    self.pending_settings[channel_id] = {**fields, **self.pending_settings.get(channel_id, {})}
+            
+    async def load_channel_context(self, channel_id):
         """채널별 컨텍스트 정보 로드"""
+        async def work(cur):
+            await cur.execute(
+                """
+                SELECT system_prompt, permanent_history, temperature, max_tokens, is_active, max_input_tokens, faq_threshold
+                FROM channel_settings
+                WHERE channel_id = %s
+                """,
+                (channel_id,)
+            )
+            return await cur.fetchone()
+        
         try:
-            with self.conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT system_prompt, permanent_history, temperature, max_tokens
-                    FROM channel_settings
-                    WHERE channel_id = %s
-                    """,
-                    (channel_id,)
-                )
-                result = cur.fetchone()
-                if result:
-                    system_prompt, permanent_history, temperature, max_tokens = result
-                    return system_prompt, permanent_history, temperature, max_tokens
-            return None, None, 0.7, 4000  # 기본 temperature 값 0.7 반환, 기본 max_tokens 값 4000 반환
+            result = await self._run(work, retries=1)
+            if result:
+                system_prompt, permanent_history, temperature, max_tokens, is_active, max_input_tokens, faq_threshold = result
+                return system_prompt, permanent_history, temperature, max_tokens, is_active, max_input_tokens, faq_threshold
+            return None, None, 0.7, 4000, True, None, None  # 기본 temperature 값 0.7 반환, 기본 max_tokens 값 4000 반환
         except Exception as e:
             print(f"컨텍스트 로드 중 오류: {e}")
-            return None, None, 0.7, 4000  # 오류 발생 시 기본값 반환
+            return None, None, 0.7, 4000, True, None, None  # 오류 발생 시 기본값 반환
     
-    def cleanup_old_backups(self, days=30):
+    async def cleanup_old_backups(self, days=30):
         """오래된 백업 삭제"""
+        async def work(cur):
+            await cur.execute(
+                """
+                DELETE FROM chat_history 
+                WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                """,
+                (days,)
+            )
+            await cur.execute(
+                """
+                DELETE FROM chat_messages 
+                WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                """,
+                (days,)
+            )
+        
         try:
-            with self.conn.cursor() as cur:
-                cur.execute(
-                    """
-                    DELETE FROM chat_history 
-                    WHERE created_at < CURRENT_TIMESTAMP - INTERVAL '%s days'
-                    """,
-                    (days,)
-                )
-            self.conn.commit()
+            await self._run(work)
         except Exception as e:
             print(f"오래된 백업 정리 중 오류: {e}")
-            self.conn.rollback()
+    
+    async def load_cached_response(self, cache_key, ttl):
+        """캐시된 응답 조회 (ttl초가 지난 항목은 제외)"""
+        async def work(cur):
+            await cur.execute(
+                """
+                SELECT response, scope, input_tokens, output_tokens, EXTRACT(EPOCH FROM created_at)
+                FROM response_cache
+                WHERE cache_key = %s
+                  AND created_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+                """,
+                (cache_key, ttl)
+            )
+            row = await cur.fetchone()
+            return (row[0], row[1], row[2], row[3], float(row[4])) if row else None
+        
+        return await self._run(work, retries=1)
+    
+    async def save_cached_response(self, cache_key, entry):
+        """응답 캐시 저장 (같은 키가 있으면 덮어씀)"""
+        async def work(cur):
+            await cur.execute(
+                """
+                INSERT INTO response_cache (cache_key, scope, response, input_tokens, output_tokens)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    scope = EXCLUDED.scope,
+                    response = EXCLUDED.response,
+                    input_tokens = EXCLUDED.input_tokens,
+                    output_tokens = EXCLUDED.output_tokens,
+                    created_at = CURRENT_TIMESTAMP
+                """,
+                (cache_key, entry.scope, entry.text, entry.input_tokens, entry.output_tokens)
+            )
+        
+        await self._run(work)
+    
+    async def delete_cached_responses(self, scope):
+        """scope("manual" 또는 채널 ID)의 응답 캐시 삭제"""
+        async def work(cur):
+            await cur.execute("DELETE FROM response_cache WHERE scope = %s", (scope,))
+        
+        await self._run(work)
 
 class AnthropicClient:
-    def __init__(self, api_keys):
-        self.clients = [Anthropic(api_key=key) for key in api_keys]
-        self.client_cycle = cycle(self.clients)
-        self.current_client_index = 0
+    def __init__(self, api_keys, max_concurrency=8, channel_concurrency=1, base_url=None,
+                 retry_base_delay=1.0, retry_max_delay=30.0, key_cooldown=5.0):
+        # 재시도는 KeyScheduler가 키를 바꿔 가며 처리하므로 SDK 자체 재시도는 끔
+        self.clients = [AsyncAnthropic(api_key=key, base_url=base_url, max_retries=0) for key in api_keys]
+        self.scheduler = KeyScheduler(
+            len(self.clients),
+            base_delay=retry_base_delay,
+            max_delay=retry_max_delay,
+            cooldown=key_cooldown
+        )
+        
+        # 전체 동시 호출 수와 채널별 동시 호출 수 제한
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.channel_concurrency = channel_concurrency
+        self.channel_semaphores = {}  # 채널 ID -> [Semaphore, 사용 중인 호출 수]
+        
+        # 누적 토큰 사용량 (프롬프트 캐시 적중률 계산용)
+        self.usage = {
+            "requests": 0,
+            "input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "output_tokens": 0
+        }
+    
+    async def create(self, index, request, on_text=None):
+        """index번 키로 호출하고 응답 헤더의 남은 한도를 스케줄러에 반영
+
+        on_text가 있으면 스트리밍으로 호출하고 받은 텍스트 조각마다 on_text를 호출한다.
+        """
+        client = self.clients[index]
+        self.scheduler.begin(index)
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            if on_text is None:
+                raw = await client.messages.with_raw_response.create(**request)
+                response = await raw.parse()
+                headers = raw.headers
+            else:
+                async with client.messages.stream(**request) as stream:
+                    headers = stream.response.headers
+                    async for text in stream.text_stream:
+                        await on_text(text)
+                    response = await stream.get_final_message()
+            outcome = "ok"
+        finally:
+            self.scheduler.end(index)
+            metrics.api_latency.observe(time.perf_counter() - started, key=str(index + 1), outcome=outcome)
+        self.scheduler.record_success(index, headers)
+        return response
     
-    def get_next_client(self):
-        client = next(self.client_cycle)
-        return client
+    def record_usage(self, usage):
+        """응답의 usage 정보를 누적"""
+        self.usage["requests"] += 1
+        for key in ("input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens", "output_tokens"):
+            value = getattr(usage, key, None) or 0
+            self.usage[key] += value
+            metrics.tokens.inc(value, direction=key.replace("_tokens", ""))
     
+    def cache_hit_rate(self):
+        """전체 입력 토큰 중 캐시에서 읽은 비율"""
+        total = (
+            self.usage["input_tokens"]
+            + self.usage["cache_read_input_tokens"]
+            + self.usage["cache_creation_input_tokens"]
+        )
+        return self.usage["cache_read_input_tokens"] / total if total else 0.0
     
-    def get_specific_client(self, index):
-        return self.clients[index % len(self.clients)]
+    @asynccontextmanager
+    async def slot(self, channel_id):
+        """채널별 제한 -> 전체 제한 순서로 호출 슬롯 확보"""
+        entry = self.channel_semaphores.get(channel_id)
+        if entry is None:
+            entry = [asyncio.Semaphore(self.channel_concurrency), 0]
+            self.channel_semaphores[channel_id] = entry
+        entry[1] += 1
+        
+        try:
+            async with entry[0]:
+                async with self.semaphore:
+                    yield
+        finally:
+            # 사용하는 호출이 없으면 정리 (채널 수만큼 계속 쌓이지 않도록)
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.channel_semaphores[channel_id]
 
 def trim_history_by_count(messages, max_messages=30):
     """메시지 개수 제한"""
@@ -281,58 +738,189 @@ def trim_history_by_count(messages, max_messages=30):
     
     return messages
 
-async def try_api_call(channel_id, max_retries=3):
-    """API 호출 재시도 로직"""
-    used_clients = set()
+def attach_price_context(messages):
+    """마지막 user 메시지가 가격 질문이면 가격표 검색 결과를 텍스트 블록으로 추가 (원본 메시지는 바꾸지 않음)"""
+    if not price_catalog or not messages or messages[-1]["role"] != "user":
+        return messages, 0
+    question = message_text(messages[-1])
+    if not is_price_question(question):
+        return messages, 0
+    items = price_catalog.search(question, limit=PRICE_TOP_K)
+    if not items:
+        return messages, 0
+
+    reference = "\n".join(item.format() for item in items)
+    return append_reference(messages, f"참고 가격 정보 (가격표 검색 결과):\n{reference}"), len(items)
+
+def manual_sections_for(recent):
+    """마지막 질문(연속된 user 메시지는 합쳐서)과 관련된 매뉴얼 섹션 (반환값: 참고 텍스트 또는 None, 토큰 수)"""
+    question = []
+    for message in reversed(recent):
+        if message["role"] != "user":
+            break
+        question.append(message_text(message))
+    if not question:
+        return None, 0
+    reference, tokens = manual_index.reference("\n\n".join(reversed(question)), limit=MANUAL_RETRIEVAL_TOP_K)
+    if not reference:
+        return None, 0
+    return f"참고 매뉴얼 섹션 (질문 관련 검색 결과):\n{reference}", tokens
+
+async def load_manual_index(version, content):
+    """매뉴얼 버전별 섹션 색인 생성 (이벤트 루프를 막지 않도록 스레드에서 실행)"""
+    global manual_index
+    if MANUAL_RETRIEVAL_TOP_K <= 0:
+        return
+    index = await asyncio.to_thread(ManualIndex, content, version)
+    # 색인하는 동안 다른 버전이 올라왔으면 버림
+    if version == manual_version:
+        manual_index = index
+        print(f"매뉴얼 색인 완료 (버전 ID: {version}, 섹션 {len(index.sections)}개, "
+              f"핵심 헤더 {index.header_tokens} / 전체 {index.full_tokens} 토큰)")
+
+async def poll_catalog_changes():
+    """크롤러가 올린 가격표 변경 사항을 주기적으로 읽어 바뀐 항목만 교체 (재시작/전체 다시 읽기 없음)"""
+    global catalog_version
+    while True:
+        await asyncio.sleep(CATALOG_POLL_INTERVAL)
+        try:
+            while True:
+                rows = await db.load_catalog_changes(catalog_version)
+                if not rows:
+                    break
+                for change_id, source, kind, category, name, item in rows:
+                    price_catalog.apply_change(source, kind, category, name, item)
+                    catalog_version = change_id
+                log.info(kv("catalog_changes_applied", count=len(rows), version=catalog_version, items=len(price_catalog)))
+        except Exception as e:
+            log.warning(kv("catalog_poll_failed", error=e))
+
+async def try_api_call(channel_id, max_retries=3, on_text=None):
+    """API 호출 재시도 로직
+
+    on_text가 있으면 스트리밍으로 호출하고 받은 텍스트 조각마다 on_text를 호출한다.
+    이미 텍스트를 보낸 뒤에 실패하면 응답이 섞이지 않도록 재시도하지 않는다.
+    """
+    tried_keys = set()
     
     # 채널별 컨텍스트 정보 로드
-    channel_system_prompt = channel_system_prompts.get(channel_id, SYSTEM_PROMPT)
-    permanent = channel_permanent_history.get(channel_id, [])
-    recent = channel_message_history.get(channel_id, [])
-    temperature = channel_temperature.get(channel_id, 0.7)  # 기본값 0.7
-    max_tokens = channel_max_tokens.get(channel_id, 4000)  # 기본값 4000
+    context = await conversations.get(channel_id)
+    channel_system_prompt = context.system_prompt or SYSTEM_PROMPT
+    # 검색 모드: 전역 매뉴얼을 쓰는 채널은 매뉴얼 전체 대신 핵심 헤더만 시스템 프롬프트로 사용
+    use_manual_index = (
+        not context.system_prompt and manual_index is not None and manual_index.version == manual_version
+    )
+    if use_manual_index:
+        channel_system_prompt = manual_index.header
+    permanent = context.permanent_history
+    recent = context.recent_history
+    temperature = context.temperature  # 기본값 0.7
+    max_tokens = context.max_tokens  # 기본값 4000
+    max_input_tokens = context.max_input_tokens or DEFAULT_MAX_INPUT_TOKENS
     
     # 메시지가 없으면 API 호출이 실패하므로, 최소 1개의 메시지가 필요
     if not recent and not permanent:
-        print("메시지가 없어 API 호출을 진행할 수 없습니다.")
+        log.warning(kv("api_skipped", channel=channel_id, reason="no_messages"))
         return None
 
-    # 완전한 메시지 히스토리 구성 (최대 20개 메시지까지만 - 유저 10개, 클로드 10개)
-    full_history = permanent + recent
+    # 관련 매뉴얼 섹션은 최근 대화를 채우기 전에 입력 토큰 한도에서 먼저 떼어 둠
+    system_tokens = estimate_prompt_tokens(channel_system_prompt)
+    manual_reference, section_tokens = manual_sections_for(recent) if use_manual_index else (None, 0)
+    
+    # 입력 토큰 한도 안에서 메시지 히스토리 구성 (고정 대화는 항상 포함, 오래된 최근 대화부터 제외)
+    full_history, history_tokens, dropped = build_messages(
+        permanent,
+        context.permanent_token_count(),
+        recent,
+        context.recent_tokens,
+        max_input_tokens - system_tokens - section_tokens
+    )
+    # 매뉴얼 섹션은 마지막 질문에 덧붙임 (시스템 프롬프트/고정 대화의 캐시는 그대로 유지)
+    if manual_reference and full_history and full_history[-1]["role"] == "user":
+        full_history = append_reference(full_history, manual_reference)
+        system_tokens += section_tokens
+    
+    # 채널 안에서 매번 같은 시스템 프롬프트와 고정 대화는 프롬프트 캐시 대상으로 표시
+    system_blocks = cacheable_system(channel_system_prompt) if channel_system_prompt else channel_system_prompt
+    if permanent and full_history[len(permanent) - 1] is permanent[-1]:
+        full_history = add_cache_breakpoint(full_history, len(permanent) - 1)
+
+    # 가격 질문이면 가격표 전체 대신 관련 항목만 마지막 질문에 덧붙임 (대화 기록에는 저장하지 않음)
+    full_history, price_items = attach_price_context(full_history)
     
     # 컨텍스트 정보 로깅
-    print(f"\n채널 {channel_id} API 호출 컨텍스트 정보:")
-    print(f"- 시스템 프롬프트: {len(channel_system_prompt)} 자")
-    print(f"- 고정 대화: {len(permanent)}개 메시지")
-    print(f"- 최근 대화: {len(recent)}개 메시지")
-    print(f"- 총 메시지: {len(full_history)}개")
-    print(f"- 온도(Temperature): {temperature}")
-    print(f"- 최대 토큰(Max Tokens): {max_tokens}")
+    log.debug(kv(
+        "api_context",
+        channel=channel_id,
+        system_chars=len(channel_system_prompt),
+        manual_retrieval=use_manual_index,
+        permanent=len(permanent),
+        recent=len(recent),
+        dropped=dropped,
+        messages=len(full_history),
+        estimated_input_tokens=system_tokens + history_tokens,
+        input_budget=max_input_tokens,
+        price_items=price_items,
+        temperature=temperature,
+        max_tokens=max_tokens
+    ))
+    
+    request = dict(
+        model="claude-3-7-sonnet-20250219",  # 3.7 Sonnet 모델 사용
+        max_tokens=max_tokens,  # 채널별 max_tokens 값 사용
+        temperature=temperature,  # 채널별 temperature 값 사용
+        system=system_blocks,
+        messages=full_history
+    )
+    streamed = False
+    
+    async def forward_text(text):
+        nonlocal streamed
+        streamed = True
+        await on_text(text)
     
+    retry_delay = 0.0
     for attempt in range(max_retries):
-        client = anthropic.get_next_client()
-        
-        while client in used_clients and len(used_clients) < len(anthropic.clients):
-            client = anthropic.get_next_client()
-            
-        used_clients.add(client)
+        # 남은 한도가 가장 많은 키 선택 (이번 요청에서 실패한 키는 다른 키가 있으면 피함)
+        key_index, wait = anthropic.scheduler.pick(exclude=tried_keys)
+        if key_index in tried_keys:
+            # 같은 키로 다시 시도해야 하면 백오프
+            wait = max(wait, retry_delay)
+        if wait > 0:
+            log.info(kv("api_wait", channel=channel_id, key=key_index + 1, seconds=wait))
+            await asyncio.sleep(wait)
+        tried_keys.add(key_index)
         
         try:
-            response = client.messages.create(
-                model="claude-3-7-sonnet-20250219",  # 3.7 Sonnet 모델 사용
-                max_tokens=max_tokens,  # 채널별 max_tokens 값 사용
-                temperature=temperature,  # 채널별 temperature 값 사용
-                system=channel_system_prompt,
-                messages=full_history
-            )
-            print(f"API 호출 성공 (시도: {attempt + 1}, temperature: {temperature}, max_tokens: {max_tokens})")
+            # 이벤트 루프를 막지 않도록 비동기 클라이언트로 호출
+            async with anthropic.slot(channel_id):
+                response = await anthropic.create(key_index, request, forward_text if on_text else None)
+            usage = response.usage
+            anthropic.record_usage(usage)
+            log.info(kv(
+                "api_ok",
+                channel=channel_id,
+                attempt=attempt + 1,
+                key=key_index + 1,
+                input_tokens=usage.input_tokens,
+                cache_read=getattr(usage, 'cache_read_input_tokens', None) or 0,
+                cache_write=getattr(usage, 'cache_creation_input_tokens', None) or 0,
+                output_tokens=usage.output_tokens
+            ))
             return response
             
         except Exception as e:
-            print(f"API 호출 시도 {attempt + 1} 실패: {e}")
-            if attempt == max_retries - 1:
+            status = getattr(e, 'status_code', None)
+            headers = getattr(getattr(e, 'response', None), 'headers', None)
+            retryable = anthropic.scheduler.record_failure(key_index, status, headers)
+            log.warning(kv("api_failed", channel=channel_id, attempt=attempt + 1, key=key_index + 1, status=status, error=e))
+            # 이미 일부를 보낸 스트리밍 응답이나 잘못된 요청(400 등)은 재시도하지 않음
+            if attempt == max_retries - 1 or streamed or not retryable:
                 raise e
-            await asyncio.sleep(1)
+            metrics.api_retries.inc(status=status or "connection")
+            retry_delay = anthropic.scheduler.backoff(
+                attempt, parse_retry_after(headers.get('retry-after')) if headers else None
+            )
     
     return None
 
@@ -342,56 +930,132 @@ intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents)
 
 # Anthropic 클라이언트 초기화
-anthropic = AnthropicClient(ANTHROPIC_API_KEYS)
-
-# 채널별 메시지 히스토리 관리
-channel_message_history = {}  # 최근 대화 내용 (가변)
-channel_permanent_history = {}  # 고정 대화 내용
-channel_system_prompts = {}  # 채널별 시스템 프롬프트
-channel_temperature = {}  # 채널별 temperature 값
-channel_max_tokens = {}  # 채널별 max_tokens 값
-
-# 채널별 활성화 상태 관리
-channel_active_status = {}
+anthropic = AnthropicClient(
+    ANTHROPIC_API_KEYS,
+    max_concurrency=ANTHROPIC_MAX_CONCURRENCY,
+    channel_concurrency=ANTHROPIC_CHANNEL_CONCURRENCY,
+    base_url=ANTHROPIC_BASE_URL,
+    retry_base_delay=ANTHROPIC_RETRY_BASE_DELAY,
+    retry_max_delay=ANTHROPIC_RETRY_MAX_DELAY,
+    key_cooldown=ANTHROPIC_KEY_COOLDOWN
+)
 
 # 명령어 응답 추적을 위한 변수
 command_response_ids = set()  # 명령어 응답 메시지 ID를 저장
 
-# 데이터베이스 매니저 초기화
-db = DatabaseManager()
+# 데이터베이스 매니저 초기화 (연결 풀은 setup_hook에서 연다)
+db = DatabaseManager(
+    os.environ['DATABASE_URL'],
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE
+)
+
+# 가격표 (크롤링/학습 데이터 JSON을 시작할 때 한 번만 읽어 색인)
+price_catalog = PriceCatalog.from_files(PRICE_FILES)
+print(f"가격표 준비 완료: {len(price_catalog)}개 항목")
+
+# FAQ/의도 라우터 (학습 데이터 폴더가 있을 때만 사용)
+faq_router = FAQRouter.from_directory(KNOWLEDGE_DIR) if os.path.isdir(KNOWLEDGE_DIR) else None
+if faq_router:
+    print(f"FAQ 라우터 준비 완료: {len(faq_router.documents)}개 질문/예문 ({KNOWLEDGE_DIR})")
+
+# 의도별 고정 답변 템플릿 (값은 대화 흐름에서 모은 값이나 가격표로 채우고, 변형은 돌아가며 사용)
+response_renderer = None
+if os.path.exists(os.path.join(KNOWLEDGE_DIR, 'responses.json')):
+    response_renderer = ResponseRenderer(
+        os.path.join(KNOWLEDGE_DIR, 'responses.json'),
+        catalog=price_catalog,
+        price_limit=PRICE_TOP_K,
+        reload_interval=RESPONSE_RELOAD_INTERVAL
+    )
+    print(f"답변 템플릿 준비 완료: {len(response_renderer)}개 의도/응답")
+
+# 의도 매칭 답변(템플릿/고정 답변)은 이 데이터에서 정확도를 확인했을 때만 사용 (아니면 LLM이 답변)
+template_threshold = 0.0
+if faq_router and TEMPLATE_THRESHOLD > 0:
+    passed, answered, accuracy = check_accuracy(
+        faq_router,
+        ResponseRenderer(
+            response_renderer.path, catalog=price_catalog, price_limit=PRICE_TOP_K, reload_interval=0
+        ) if response_renderer else None,
+        TEMPLATE_THRESHOLD, TEMPLATE_MIN_ACCURACY, TEMPLATE_MIN_SAMPLES
+    )
+    template_threshold = TEMPLATE_THRESHOLD if passed else 0.0
+    print(f"의도 매칭 답변 {'사용' if passed else '끔'}: 임계값 {TEMPLATE_THRESHOLD} 이상 예문 {answered}개, 정확도 {accuracy:.1%} "
+          f"(기준 {TEMPLATE_MIN_ACCURACY:.0%}, 최소 {TEMPLATE_MIN_SAMPLES}개)")
+
+# 예약 등 정해진 대화 흐름 (시작할 때 한 번 컴파일, 의도 판단은 FAQ 라우터 색인 사용)
+dialog_engine = None
+if faq_router and DIALOG_THRESHOLD > 0 and os.path.exists(os.path.join(KNOWLEDGE_DIR, 'dialog_flow.yaml')):
+    dialog_engine = DialogEngine(
+        DialogFlow.from_directory(KNOWLEDGE_DIR),
+        faq_router,
+        threshold=DIALOG_THRESHOLD,
+        entry_threshold=DIALOG_ENTRY_THRESHOLD,
+        ttl=DIALOG_STATE_TTL,
+        renderer=response_renderer
+    )
+    print(f"대화 흐름 준비 완료: {len(dialog_engine.flow.states) - 1}개 상태")
+
+# 채널별 컨텍스트 (설정, 고정 대화, 최근 대화, 활성화 상태)는 처음 사용할 때 불러옴
+conversations = ConversationStore(
+    db,
+    max_channels=CHANNEL_CACHE_SIZE,
+    ttl=CHANNEL_CACHE_TTL,
+    history_limit=20,  # 최대 20개 메시지만 유지 (유저 10개, 클로드 10개 최대)
+    memory_budget=CHANNEL_MEMORY_BUDGET
+)
+
+# 응답 캐시 (RESPONSE_CACHE_DB이면 재시작 후에도 유지되도록 DB에도 저장)
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    db=db if RESPONSE_CACHE_DB else None
+)
+
+# 채널별 메시지 대기열 (채널 안에서는 순서대로 하나씩, 처리 중에 온 메시지는 모아서 처리)
+channel_queue = ChannelQueue(
+    lambda channel_id, messages: handle_channel_messages(channel_id, messages),
+    max_depth=CHANNEL_QUEUE_MAX_DEPTH,
+    shed_policy=CHANNEL_QUEUE_SHED_POLICY
+)
+
+# 대기열 지표 (수집할 때 현재 값을 계산)
+metrics.registry.gauge("bot_queue_depth", "채널 대기열에서 처리를 기다리는 메시지 수", callback=channel_queue.depth)
+metrics.registry.gauge("bot_queue_max_depth", "채널 하나의 최대 대기 메시지 수", callback=lambda: channel_queue.stats["max_depth"])
+metrics.registry.gauge("bot_queue_shed_total", "대기열이 가득 차서 버린 메시지 수", callback=lambda: channel_queue.stats["shed"])
+metrics.registry.gauge("bot_queue_coalesced_total", "다른 메시지와 합쳐서 처리된 메시지 수", callback=lambda: channel_queue.stats["coalesced"])
+metrics.registry.gauge("bot_channels_loaded", "메모리에 있는 채널 컨텍스트 수", callback=lambda: len(conversations))
+if dialog_engine:
+    metrics.registry.gauge("bot_dialog_sessions", "대화 흐름을 진행 중인 채널/사용자 수", callback=lambda: len(dialog_engine.sessions))
+
+@bot.event
+async def setup_hook():
+    await db.connect()
+    # 지표 엔드포인트 (로컬에서만 접근)
+    if METRICS_PORT:
+        await metrics.registry.serve(METRICS_HOST, METRICS_PORT)
+        log.info(kv("metrics_listening", url=f"http://{METRICS_HOST}:{METRICS_PORT}/metrics"))
 
 @bot.event
 async def on_ready():
-    global SYSTEM_PROMPT
+    global SYSTEM_PROMPT, manual_version, catalog_version, catalog_poll_task
     
     print(f'{bot.user.name}이 성공적으로 시작되었습니다!')
     
-    # 채널 설정 불러오기
-    with db.conn.cursor() as cur:
-        cur.execute("SELECT channel_id, is_active, system_prompt, permanent_history, temperature, max_tokens FROM channel_settings")
-        for row in cur.fetchall():
-            if len(row) >= 2:
-                channel_id, is_active = row[0], row[1]
-                channel_active_status[channel_id] = is_active
-                
-                if len(row) >= 6:
-                    system_prompt, permanent_history, temperature, max_tokens = row[2], row[3], row[4], row[5]
-                    if system_prompt:
-                        channel_system_prompts[channel_id] = system_prompt
-                    if permanent_history:
-                        channel_permanent_history[channel_id] = permanent_history
-                    if temperature is not None:
-                        channel_temperature[channel_id] = temperature
-                    if max_tokens is not None:
-                        channel_max_tokens[channel_id] = max_tokens
-    
     # DB에서 현재 매뉴얼 로드
-    manual_content = db.get_current_manual()
-    if manual_content:
-        SYSTEM_PROMPT = manual_content
+    current_manual = await db.get_current_manual_version()
+    if current_manual:
+        manual_version, SYSTEM_PROMPT = current_manual
+        await load_manual_index(manual_version, SYSTEM_PROMPT)
     else:
         print("⚠️ 등록된 매뉴얼이 없습니다. '!manual update' 명령어로 매뉴얼을 등록해주세요.")
 
+    # 가격표 변경 확인 시작 (시작 시점까지의 변경은 가격표 파일에 이미 반영된 것으로 봄)
+    if CATALOG_POLL_INTERVAL > 0 and catalog_poll_task is None:
+        catalog_version = await db.get_latest_catalog_change_id()
+        catalog_poll_task = bot.loop.create_task(poll_catalog_changes())
+    
     # 백업 루프 시작
     print("백업 루프 시작 시도 중...")
     bot.loop.create_task(db.start_backup_loop())
@@ -431,10 +1095,14 @@ async def setup_context(ctx, action=None):
                 return
                 
             # 채널별 시스템 프롬프트 설정
-            channel_system_prompts[channel_id] = prompt_text
+            context = await conversations.get(channel_id)
+            context.system_prompt = prompt_text
+            conversations.update_size(context)
             
-            # DB에 저장
-            db.save_channel_context(channel_id, system_prompt=prompt_text)
+            # DB 저장 예약 (백그라운드에서 모아서 저장)
+            db.queue_channel_context(channel_id, system_prompt=prompt_text)
+            # 이전 프롬프트로 만든 이 채널의 응답 캐시 삭제
+            await response_cache.invalidate(channel_id)
             
             message = await ctx.send(f"✅ 채널별 시스템 프롬프트가 설정되었습니다! ({len(prompt_text)} 자)")
             command_response_ids.add(message.id)
@@ -479,10 +1147,14 @@ async def setup_context(ctx, action=None):
                     return
                 
             # 채널별 고정 대화 내용 설정
-            channel_permanent_history[channel_id] = initial_messages
+            context = await conversations.get(channel_id)
+            context.permanent_history = initial_messages
+            conversations.update_size(context)
             
-            # DB에 저장
-            db.save_channel_context(channel_id, permanent_history=initial_messages)
+            # DB 저장 예약 (백그라운드에서 모아서 저장)
+            db.queue_channel_context(channel_id, permanent_history=initial_messages)
+            # 이전 고정 대화로 만든 이 채널의 응답 캐시 삭제
+            await response_cache.invalidate(channel_id)
             
             message = await ctx.send(f"✅ 초기 대화 컨텍스트가 설정되었습니다! ({len(initial_messages)}개 메시지)")
             command_response_ids.add(message.id)
@@ -497,27 +1169,32 @@ async def setup_context(ctx, action=None):
             
     elif action == 'status':
         # 현재 컨텍스트 상태 확인
-        system_prompt = channel_system_prompts.get(channel_id, SYSTEM_PROMPT)
-        permanent = channel_permanent_history.get(channel_id, [])
-        recent = channel_message_history.get(channel_id, [])
-        temperature = channel_temperature.get(channel_id, 0.7)
-        max_tokens = channel_max_tokens.get(channel_id, 4000)
+        context = await conversations.get(channel_id)
+        system_prompt = context.system_prompt or SYSTEM_PROMPT
+        permanent = context.permanent_history
+        recent = context.recent_history
+        temperature = context.temperature
+        max_tokens = context.max_tokens
         
         status_text = f"📊 채널 {ctx.channel.name}의 컨텍스트 상태:\n"
         status_text += f"- 시스템 프롬프트: {'설정됨' if system_prompt else '기본값 사용'} ({len(system_prompt) if system_prompt else 0} 자)\n"
         status_text += f"- 고정 대화: {len(permanent)}개 메시지\n"
         status_text += f"- 최근 대화: {len(recent)}개 메시지\n"
         status_text += f"- 온도(Temperature): {temperature}\n"
-        status_text += f"- 최대 토큰(Max Tokens): {max_tokens}"
+        status_text += f"- 최대 토큰(Max Tokens): {max_tokens}\n"
+        status_text += f"- 입력 토큰 한도(Input Budget): {context.max_input_tokens or DEFAULT_MAX_INPUT_TOKENS}"
         
         message = await ctx.send(status_text)
         command_response_ids.add(message.id)
         
     elif action == 'clear':
         # 컨텍스트 초기화 (최근 대화만)
-        if channel_id in channel_message_history:
-            old_count = len(channel_message_history[channel_id])
-            channel_message_history[channel_id] = []
+        context = await conversations.get(channel_id)
+        if context.recent_history:
+            old_count = len(context.recent_history)
+            conversations.clear(context)
+            if dialog_engine:
+                dialog_engine.reset(channel_id)
             message = await ctx.send(f"✅ 최근 대화 내용이 초기화되었습니다. ({old_count}개 메시지 삭제)")
             command_response_ids.add(message.id)
             print(f"채널 {channel_id}의 최근 대화 내용 초기화")
@@ -536,7 +1213,7 @@ async def set_temperature(ctx, value=None):
     channel_id = ctx.channel.id
     
     if value is None:
-        current_temp = channel_temperature.get(channel_id, 0.7)
+        current_temp = (await conversations.get(channel_id)).temperature
         message = await ctx.send(f"🌡️ 현재 이 채널의 온도(Temperature) 설정값: {current_temp}\n"
                                f"설정 방법: `!temp [값]` (범위: 0.0~1.0, 예: !temp 0.7)")
         command_response_ids.add(message.id)
@@ -550,10 +1227,11 @@ async def set_temperature(ctx, value=None):
             return
         
         # 채널별 temperature 설정
-        channel_temperature[channel_id] = temp_value
+        context = await conversations.get(channel_id)
+        context.temperature = temp_value
         
-        # DB에 저장
-        db.save_channel_context(channel_id, temperature=temp_value)
+        # DB 저장 예약 (백그라운드에서 모아서 저장)
+        db.queue_channel_context(channel_id, temperature=temp_value)
         
         message = await ctx.send(f"✅ 온도(Temperature)가 {temp_value}로 설정되었습니다.")
         command_response_ids.add(message.id)
@@ -573,7 +1251,7 @@ async def set_max_tokens(ctx, value=None):
     channel_id = ctx.channel.id
     
     if value is None:
-        current_tokens = channel_max_tokens.get(channel_id, 4000)
+        current_tokens = (await conversations.get(channel_id)).max_tokens
         message = await ctx.send(f"🔢 현재 이 채널의 최대 토큰(Max Tokens) 설정값: {current_tokens}\n"
                                f"설정 방법: `!tokens [값]` (범위: 1~4096, 예: !tokens 4000)")
         command_response_ids.add(message.id)
@@ -587,10 +1265,11 @@ async def set_max_tokens(ctx, value=None):
             return
         
         # 채널별 max_tokens 설정
-        channel_max_tokens[channel_id] = tokens_value
+        context = await conversations.get(channel_id)
+        context.max_tokens = tokens_value
         
-        # DB에 저장
-        db.save_channel_context(channel_id, max_tokens=tokens_value)
+        # DB 저장 예약 (백그라운드에서 모아서 저장)
+        db.queue_channel_context(channel_id, max_tokens=tokens_value)
         
         message = await ctx.send(f"✅ 최대 토큰(Max Tokens)이 {tokens_value}로 설정되었습니다.")
         command_response_ids.add(message.id)
@@ -603,6 +1282,107 @@ async def set_max_tokens(ctx, value=None):
         message = await ctx.send(f"❌ 최대 토큰 설정 중 오류가 발생했습니다: {str(e)}")
         command_response_ids.add(message.id)
 
+@bot.command(name='budget')
+@commands.has_role('Manual Manager')
+async def set_max_input_tokens(ctx, value=None):
+    """입력 토큰 한도 설정 명령어"""
+    channel_id = ctx.channel.id
+    
+    if value is None:
+        current_budget = (await conversations.get(channel_id)).max_input_tokens or DEFAULT_MAX_INPUT_TOKENS
+        message = await ctx.send(f"📏 현재 이 채널의 입력 토큰 한도(Input Budget) 설정값: {current_budget}\n"
+                               f"설정 방법: `!budget [값]` (범위: 1000~200000, 예: !budget 40000)")
+        command_response_ids.add(message.id)
+        return
+    
+    try:
+        budget_value = int(value)
+        if budget_value < 1000 or budget_value > 200000:
+            message = await ctx.send("❌ 입력 토큰 한도는 1000에서 200000 사이여야 합니다.")
+            command_response_ids.add(message.id)
+            return
+        
+        # 채널별 입력 토큰 한도 설정
+        context = await conversations.get(channel_id)
+        context.max_input_tokens = budget_value
+        
+        # DB 저장 예약 (백그라운드에서 모아서 저장)
+        db.queue_channel_context(channel_id, max_input_tokens=budget_value)
+        
+        message = await ctx.send(f"✅ 입력 토큰 한도(Input Budget)가 {budget_value}로 설정되었습니다.")
+        command_response_ids.add(message.id)
+        print(f"채널 {channel_id}의 입력 토큰 한도 설정 완료: {budget_value}")
+        
+    except ValueError:
+        message = await ctx.send("❌ 유효한 숫자 형식이 아닙니다. 예: !budget 40000")
+        command_response_ids.add(message.id)
+    except Exception as e:
+        message = await ctx.send(f"❌ 입력 토큰 한도 설정 중 오류가 발생했습니다: {str(e)}")
+        command_response_ids.add(message.id)
+
+
+@bot.command(name='faq')
+@commands.has_role('Manual Manager')
+async def set_faq_threshold(ctx, value=None):
+    """FAQ 바로 답변 임계값 설정 명령어"""
+    channel_id = ctx.channel.id
+    
+    if value is None:
+        context = await conversations.get(channel_id)
+        current = FAQ_THRESHOLD if context.faq_threshold is None else context.faq_threshold
+        stats = (f"적중 {faq_router.hits}회 / 미적중 {faq_router.misses}회 (적중률 {faq_router.hit_rate():.1%})"
+                 if faq_router else "FAQ 데이터 없음")
+        message = await ctx.send(f"💬 현재 이 채널의 FAQ 임계값: {current if current > 0 else '꺼짐'}\n"
+                               f"- 전체 통계: {stats}\n"
+                               f"설정 방법: `!faq [값]` (범위: 0.5~1.0, 예: !faq 0.8) 또는 `!faq off`")
+        command_response_ids.add(message.id)
+        return
+    
+    try:
+        threshold_value = 0.0 if value == 'off' else float(value)
+        if threshold_value != 0.0 and (threshold_value < 0.5 or threshold_value > 1.0):
+            message = await ctx.send("❌ FAQ 임계값은 0.5에서 1.0 사이여야 합니다.")
+            command_response_ids.add(message.id)
+            return
+        
+        # 채널별 FAQ 임계값 설정
+        context = await conversations.get(channel_id)
+        context.faq_threshold = threshold_value
+        
+        # DB 저장 예약 (백그라운드에서 모아서 저장)
+        db.queue_channel_context(channel_id, faq_threshold=threshold_value)
+        
+        if threshold_value == 0.0:
+            message = await ctx.send("✅ 이 채널에서 FAQ 바로 답변을 껐습니다.")
+        else:
+            message = await ctx.send(f"✅ FAQ 임계값이 {threshold_value}로 설정되었습니다.")
+        command_response_ids.add(message.id)
+        print(f"채널 {channel_id}의 FAQ 임계값 설정 완료: {threshold_value}")
+        
+    except ValueError:
+        message = await ctx.send("❌ 유효한 숫자 형식이 아닙니다. 예: !faq 0.8")
+        command_response_ids.add(message.id)
+    except Exception as e:
+        message = await ctx.send(f"❌ FAQ 임계값 설정 중 오류가 발생했습니다: {str(e)}")
+        command_response_ids.add(message.id)
+
+@bot.command(name='price')
+async def lookup_price(ctx, *, query=None):
+    """가격표 검색 명령어 (LLM 호출 없이 바로 답변)"""
+    if not query:
+        message = await ctx.send(f"💰 가격표 항목: {len(price_catalog)}개\n"
+                               f"사용 방법: `!price [시술명]` (예: !price 울쎄라 300샷)")
+        command_response_ids.add(message.id)
+        return
+
+    items = price_catalog.search(query, limit=PRICE_TOP_K)
+    if not items:
+        message = await ctx.send(f"❌ '{query}'에 해당하는 가격 정보를 찾지 못했습니다.")
+    else:
+        reply = f"💰 '{query}' 검색 결과:\n" + "\n".join(item.format() for item in items)
+        # Discord 메시지 길이 제한
+        message = await ctx.send(reply[:1990])
+    command_response_ids.add(message.id)
 
 @bot.command(name='manual')
 @commands.has_role('Manual Manager')
@@ -639,8 +1419,14 @@ async def manual(ctx, action=None):
             new_id = await db.update_manual(manual_text, ctx.author.id)
             
             # 전역 변수 업데이트
-            global SYSTEM_PROMPT
+            global SYSTEM_PROMPT, manual_version
             SYSTEM_PROMPT = manual_text
+            manual_version = new_id
+            
+            # 검색 모드용 섹션 색인은 버전마다 한 번만 생성
+            await load_manual_index(new_id, manual_text)
+            # 이전 매뉴얼로 만든 응답 캐시 삭제
+            await response_cache.invalidate("manual")
             
             message = await ctx.send(f"✅ 매뉴얼이 성공적으로 업데이트되었습니다! (버전 ID: {new_id})")
             command_response_ids.add(message.id)
@@ -650,7 +1436,7 @@ async def manual(ctx, action=None):
             command_response_ids.add(message.id)
             
     elif action == 'show':
-        manual_content = db.get_current_manual()
+        manual_content = await db.get_current_manual()
         if not manual_content:
             message = await ctx.send("❌ 저장된 매뉴얼이 없습니다.")
             command_response_ids.add(message.id)
@@ -668,7 +1454,7 @@ async def manual(ctx, action=None):
             command_response_ids.add(message.id)
             
     elif action == 'history':
-        history = db.get_manual_history()
+        history = await db.get_manual_history()
         if not history:
             message = await ctx.send("📜 매뉴얼 변경 이력이 없습니다.")
             command_response_ids.add(message.id)
@@ -692,21 +1478,49 @@ async def manual(ctx, action=None):
 async def check_status(ctx):
     """클로드 봇 상태 확인 명령어"""
     channel_id = ctx.channel.id
-    status = "활성화" if channel_active_status.get(channel_id, True) else "비활성화"
+    context = await conversations.get(channel_id)
+    status = "활성화" if context.is_active else "비활성화"
     
     # 추가 컨텍스트 정보
-    system_prompt = channel_system_prompts.get(channel_id, SYSTEM_PROMPT)
-    permanent = channel_permanent_history.get(channel_id, [])
-    recent = channel_message_history.get(channel_id, [])
-    temperature = channel_temperature.get(channel_id, 0.7)
-    max_tokens = channel_max_tokens.get(channel_id, 4000)
+    system_prompt = context.system_prompt or SYSTEM_PROMPT
+    permanent = context.permanent_history
+    recent = context.recent_history
+    temperature = context.temperature
+    max_tokens = context.max_tokens
     
     status_text = f"🤖 현재 이 채널에서 Claude는 {status} 상태입니다.\n"
     status_text += f"- 시스템 프롬프트: {'설정됨' if system_prompt else '기본값 사용'} ({len(system_prompt) if system_prompt else 0} 자)\n"
     status_text += f"- 고정 대화: {len(permanent)}개 메시지\n"
     status_text += f"- 최근 대화: {len(recent)}개 메시지\n"
     status_text += f"- 온도(Temperature): {temperature}\n"
-    status_text += f"- 최대 토큰(Max Tokens): {max_tokens}"
+    status_text += f"- 최대 토큰(Max Tokens): {max_tokens}\n"
+    status_text += f"- 입력 토큰 한도(Input Budget): {context.max_input_tokens or DEFAULT_MAX_INPUT_TOKENS}\n"
+    status_text += f"- 프롬프트 캐시 적중률: {anthropic.cache_hit_rate():.1%} ({anthropic.usage['requests']}회 호출 기준)\n"
+    status_text += "".join(f"- API {line}\n" for line in anthropic.scheduler.summary())
+    status_text += (f"- 응답 캐시: {len(response_cache)}개 항목, 적중률 {response_cache.hit_rate():.1%} "
+                    f"({response_cache.hits}회), 절약 토큰 입력 {response_cache.saved_input_tokens} / "
+                    f"출력 {response_cache.saved_output_tokens}\n")
+    queue_stats = channel_queue.stats
+    status_text += (f"- 대기열: 이 채널 {channel_queue.depth(channel_id)}개 / 전체 {channel_queue.depth()}개 대기, "
+                    f"최대 {queue_stats['max_depth']}개, 응답 {queue_stats['batches']}회 "
+                    f"(합쳐서 처리 {queue_stats['coalesced']}개, 버림 {queue_stats['shed']}개)\n")
+    status_text += f"- 가격표: {len(price_catalog)}개 항목 (변경 반영 ID {catalog_version})\n"
+    if dialog_engine:
+        dialog_stats = dialog_engine.stats
+        status_text += (f"- 대화 흐름: 직접 답변 {dialog_stats['local']}회, LLM에 넘김 {dialog_stats['llm']}회, "
+                        f"흐름 밖 {dialog_stats['unmatched']}회, 진행 중 {len(dialog_engine.sessions)}명\n")
+    if response_renderer:
+        renderer_stats = response_renderer.stats
+        status_text += (f"- 답변 템플릿: {len(response_renderer)}개, 렌더링 {renderer_stats['rendered']}회 "
+                        f"(값 부족 {renderer_stats['missing']}회), 다시 읽음 {renderer_stats['reloads']}회 "
+                        f"(실패 {renderer_stats['errors']}회)\n")
+    if faq_router:
+        status_text += f"- FAQ 의도 매칭 답변: {f'유사도 {template_threshold} 이상' if template_threshold else '꺼짐'}\n"
+    if manual_index is not None and not context.system_prompt:
+        status_text += (f"- 매뉴얼 검색 모드: 버전 ID {manual_index.version}, 상위 {MANUAL_RETRIEVAL_TOP_K}개 섹션 "
+                        f"(핵심 헤더 {manual_index.header_tokens} / 전체 {manual_index.full_tokens} 토큰)")
+    else:
+        status_text += "- 매뉴얼 검색 모드: 꺼짐 (매뉴얼 전체 사용)"
     
     message = await ctx.send(status_text)
     command_response_ids.add(message.id)
@@ -726,15 +1540,48 @@ async def on_message(message):
         
     channel_id = message.channel.id
     
-    # 해당 채널이 비활성화 상태면 응답하지 않음
-    if not channel_active_status.get(channel_id, True):
+    # 이미 불러온 채널이 비활성화 상태면 대기열에 넣지 않음
+    context = conversations.peek(channel_id)
+    if context is not None and not context.is_active:
         return
     
-    # 채널별 메시지 히스토리 초기화 (없으면)
-    if channel_id not in channel_message_history:
-        channel_message_history[channel_id] = []
+    # 채널별 대기열에 추가 (앞의 응답을 만드는 중이면 모아서 다음 차례에 한 번에 처리)
+    if not channel_queue.submit(channel_id, message):
+        print(f"채널 {channel_id} 대기열 가득 참 ({channel_queue.depth(channel_id)}개), 메시지 거절")
+        await message.channel.send("죄송합니다. 지금 요청이 많아 처리할 수 없습니다. 잠시 후 다시 보내주세요.")
+
+def response_cache_key(context, new_count):
+    """응답 캐시 키와 무효화 범위 (캐시를 쓰지 않는 경우 (None, None))
+
+    이전 대화가 없는 첫 질문이거나 온도가 0일 때만 사용한다.
+    온도 0이면서 이전 대화가 있으면 이전 대화 해시도 키에 넣는다.
+    """
+    recent = list(context.recent_history)
+    prior, new = recent[:-new_count], recent[-new_count:]
+    if prior and context.temperature != 0:
+        return None, None
     
-    # 메시지 내용 구성 (텍스트 + 첨부파일 정보)
+    if context.system_prompt:
+        system_version = f"prompt:{digest(context.system_prompt)}"
+    else:
+        system_version = f"manual:{manual_version}:{MANUAL_RETRIEVAL_TOP_K}"
+    question = "\n".join(message["content"] for message in new)
+    # 가격 질문은 가격표가 바뀌면 다른 키 (가격표 검색 결과가 프롬프트에 들어가므로)
+    if is_price_question(question):
+        system_version += f":catalog:{catalog_version}"
+    # 채널 전용 프롬프트/고정 대화를 쓰면 채널 단위, 아니면 매뉴얼 단위로 무효화
+    scope = str(context.channel_id) if context.system_prompt or context.permanent_history else "manual"
+    key = make_key(
+        question,
+        system_version,
+        context.permanent_digest(),
+        context.temperature,
+        digest(prior) if prior else ""
+    )
+    return key, scope
+
+async def build_user_content(message):
+    """메시지 내용 구성 (텍스트 + 첨부파일 정보)"""
     content = message.content
     
     # 첨부파일 처리
@@ -753,27 +1600,103 @@ async def on_message(message):
             else:
                 content += f"\n\n첨부파일: {attachment.filename} (크기: {attachment.size} bytes)"
     
-    # 새 메시지 추가
-    new_message = {
-        "role": "user",
-        "content": content
-    }
+    return content
+
+def render_intent_answer(match, text):
+    """의도 매칭이면 responses.json 템플릿으로 답변 (값을 채울 수 없으면 None -> 고정 답변 또는 LLM)
+
+    의도 매칭은 route의 intent_threshold(정확도를 확인한 template_threshold) 이상일 때만 여기까지 옴
+    """
+    if match.kind != "intent" or not response_renderer:
+        return None
+    return response_renderer.render(match.key, text=text)
+
+async def handle_channel_messages(channel_id, messages):
+    """채널 대기열에서 꺼낸 메시지들에 한 번에 답변 (같은 채널에서는 동시에 실행되지 않음)"""
+    # 채널 컨텍스트 로드 (처음이면 DB에서 설정과 최근 대화를 불러옴)
+    context = await conversations.get(channel_id)
+    
+    # 해당 채널이 비활성화 상태면 응답하지 않음
+    if not context.is_active:
+        return
+    
+    if len(messages) > 1:
+        log.info(kv("messages_coalesced", channel=channel_id, count=len(messages)))
+    
+    def observe_latency(path):
+        """가장 먼저 받은 메시지부터 답변을 보낼 때까지 걸린 시간 기록"""
+        metrics.message_latency.observe((discord.utils.utcnow() - messages[0].created_at).total_seconds(), path=path)
     
-    # 메시지 히스토리에 새 메시지 추가
-    channel_message_history[channel_id].append(new_message)
+    # 메시지 히스토리에 새 메시지 추가 (받은 순서대로)
+    # (최근 대화는 링 버퍼라 최대 개수를 넘으면 오래된 메시지부터 밀려남,
+    #  연속된 user 메시지는 API 호출 때 하나로 합쳐짐)
+    for message in messages:
+        content = await build_user_content(message)
+        conversations.append(context, {"role": "user", "content": content})
+    message = messages[-1]
     
-    # 최대 20개 메시지만 유지 (유저 10개, 클로드 10개 최대)
-    MAX_MESSAGES = 20
-    if len(channel_message_history[channel_id]) > MAX_MESSAGES:
-        channel_message_history[channel_id] = channel_message_history[channel_id][-MAX_MESSAGES:]
+    faq_threshold = FAQ_THRESHOLD if context.faq_threshold is None else context.faq_threshold
+    
+    # 예약 등 대화 흐름의 정해진 단계면 API 호출 없이 답변 (FAQ 바로 답변을 끈 채널 제외, 메시지 하나일 때만)
+    if dialog_engine and faq_threshold > 0 and len(messages) == 1 and not message.attachments:
+        turn = dialog_engine.handle((channel_id, message.author.id), content, min_threshold=faq_threshold)
+        metrics.cache_lookups.inc(cache="dialog", result="hit" if turn and turn.reply else "miss")
+        if turn and turn.reply:
+            log.info(kv("dialog_answer", channel=channel_id, state=turn.state, intent=turn.intent, slots=",".join(turn.slots)))
+            await message.channel.send(turn.reply)
+            conversations.append(context, {"role": "assistant", "content": turn.reply})
+            observe_latency("dialog")
+            return
+    
+    # FAQ/의도와 충분히 비슷한 질문이면 API 호출 없이 바로 답변 (메시지 하나일 때만)
+    if faq_router and faq_threshold > 0 and len(messages) == 1 and not message.attachments:
+        # 의도 매칭(고정 답변 포함)은 FAQ 임계값이 아니라 정확도를 확인한 template_threshold로 판단 (꺼져 있으면 LLM)
+        match = faq_router.route(
+            content, faq_threshold,
+            answer=lambda match: render_intent_answer(match, content),
+            intent_threshold=template_threshold
+        )
+        metrics.cache_lookups.inc(cache="faq", result="hit" if match else "miss")
+        if match:
+            log.info(kv("faq_answer", channel=channel_id, kind=match.kind, key=match.key, score=match.score))
+            await message.channel.send(match.answer)
+            conversations.append(context, {"role": "assistant", "content": match.answer})
+            observe_latency("faq")
+            return
+    
+    # 같은 질문에 대한 이전 응답이 캐시에 있으면 API 호출 없이 답변
+    cache_key, cache_scope = response_cache_key(context, len(messages))
+    if cache_key:
+        cached = await response_cache.get(cache_key)
+        metrics.cache_lookups.inc(cache="response", result="hit" if cached else "miss")
+        if cached:
+            log.info(kv("response_cache_hit", channel=channel_id, hit_rate=response_cache.hit_rate()))
+            for chunk in split_message(cached):
+                await message.channel.send(chunk)
+            conversations.append(context, {"role": "assistant", "content": cached})
+            observe_latency("cache")
+            return
     
     # API 호출 및 응답 처리
+    reply = StreamingReply(message.channel, edit_interval=STREAM_EDIT_INTERVAL) if STREAM_RESPONSES else None
     async with message.channel.typing():
         try:
-            response = await try_api_call(channel_id)
+            started = time.monotonic()
+            response = await try_api_call(channel_id, on_text=reply.feed if reply else None)
             
             if response:
                 response_text = response.content[0].text
+                if reply:
+                    # 스트리밍 중 마지막 간격 안에 받은 부분까지 반영
+                    await reply.finish(response_text)
+                    if reply.first_sent_at is not None:
+                        log.info(kv(
+                            "stream_done",
+                            channel=channel_id,
+                            first_message_seconds=reply.first_sent_at - started,
+                            total_seconds=time.monotonic() - started,
+                            messages=len(reply.messages)
+                        ))
                 
                 # 디버깅: API 응답의 원시 형태 확인
                 #print(f"\n---- API 응답 원본 (채널: {channel_id}) ----")
@@ -807,34 +1730,59 @@ async def on_message(message):
                             await message.channel.send(file=discord.File(file_name))
                             os.remove(file_name)
                 
-                # 일반 텍스트 응답 전송
-                if len(response_text) > 2000:
-                    for i in range(0, len(response_text), 2000):
-                        chunk = response_text[i:i+2000]
-                        # 디버깅: 각 청크의 첫 부분과 마지막 부분을 확인
-                        print(f"청크 {i//2000 + 1} 첫 20자: {repr(chunk[:20])}")
-                        print(f"청크 {i//2000 + 1} 마지막 20자: {repr(chunk[-20:] if len(chunk) >= 20 else chunk)}")
-                        await message.channel.send(chunk)
-                else:
-                    await message.channel.send(response_text)
+                # 일반 텍스트 응답 전송 (스트리밍이면 이미 보냄)
+                if reply is None:
+                    if len(response_text) > 2000:
+                        # 코드 블록과 글자가 중간에 깨지지 않도록 나눠서 전송
+                        chunks = split_message(response_text)
+                        log.debug(kv("reply_split", channel=channel_id, chars=len(response_text), chunks=len(chunks)))
+                        for chunk in chunks:
+                            await message.channel.send(chunk)
+                    else:
+                        await message.channel.send(response_text)
                 
                 # 클로드의 응답을 메시지 히스토리에 추가
                 claude_response = {
                     "role": "assistant",
                     "content": response_text
                 }
-                channel_message_history[channel_id].append(claude_response)
+                conversations.append(context, claude_response)
+                observe_latency("api")
                 
-                # 최대 20개 메시지만 유지 (유저 10개, 클로드 10개 최대)
-                if len(channel_message_history[channel_id]) > MAX_MESSAGES:
-                    channel_message_history[channel_id] = channel_message_history[channel_id][-MAX_MESSAGES:]
+                # 끝까지 생성된 응답만 캐시 (max_tokens로 잘린 응답은 제외)
+                if cache_key and response.stop_reason == "end_turn":
+                    usage = response.usage
+                    await response_cache.put(
+                        cache_key,
+                        response_text,
+                        cache_scope,
+                        input_tokens=usage.input_tokens
+                        + (getattr(usage, 'cache_read_input_tokens', None) or 0)
+                        + (getattr(usage, 'cache_creation_input_tokens', None) or 0),
+                        output_tokens=usage.output_tokens
+                    )
                 
             else:
                 await message.channel.send("죄송합니다. API 응답을 받지 못했습니다. 잠시 후 다시 시도해주세요.")
+                observe_latency("error")
                     
         except Exception as e:
-            print(f"최종 에러: {e}")
+            log.error(kv("reply_failed", channel=channel_id, error=e))
+            observe_latency("error")
             await message.channel.send("죄송합니다. 일시적인 오류가 발생했습니다. 잠시 후 다시 시도해주세요.")
 
-# 봇 실행
-bot.run(DISCORD_TOKEN)   
\ No newline at end of file
+async def main():
+    async with bot:
+        try:
+            await bot.start(DISCORD_TOKEN)
+        finally:
+            # 종료 전에 남은 설정과 메시지를 모두 저장
+            await db.close()
+
+# 봇 실행 (부하 테스트 등에서 import할 때는 실행하지 않음)
+if __name__ == "__main__":
+    discord.utils.setup_logging()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
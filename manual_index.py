@@ -0,0 +1,203 @@
+import csv
+import math
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter, defaultdict
+
+from context_builder import estimate_tokens
+from price_catalog import ALIASES
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*)$")
+WORD_PATTERN = re.compile(r"[a-z]+|\d+|[ㄱ-ㆎ가-힣]+|[一-鿿]+")
+
+# 질문과 상관없이 항상 보내는 섹션 (제목에 이 단어가 있으면 핵심 헤더에 포함)
+DEFAULT_CORE_KEYWORDS = ("응대", "CUSTOMER SERVICE")
+
+
+def tokenize(text):
+    """BM25용 토큰 (영문/숫자는 단어, 한글/한자는 2글자씩, 시술 별칭은 대표 이름도 추가)"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        if word.isascii():
+            tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            # 조사/어미가 붙어도 맞도록 글자 2개 단위로 자름
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        if word in ALIASES:
+            tokens.append(ALIASES[word])
+    return tokens
+
+
+class ManualSection:
+    """매뉴얼 섹션 하나 (제목 경로 + 본문)"""
+    __slots__ = ("title", "text", "tokens")
+
+    def __init__(self, title, text):
+        self.title = title  # "## 3. 시술 정보 > ### HIFU 기술"
+        self.text = text  # 제목 줄을 포함한 원문
+        self.tokens = estimate_tokens(text)
+
+
+def split_sections(text, max_chars=3000):
+    """마크다운 제목(#, ##, ###...) 기준으로 매뉴얼을 섹션으로 나눔
+
+    반환값: (첫 제목 전까지의 머리말, 섹션 목록)
+    제목 없이 긴 섹션은 빈 줄 기준으로 max_chars 이하로 다시 나누고, 나눈 조각마다 제목을 붙인다.
+    """
+    text = text.lstrip("﻿")
+    preamble = []
+    sections = []
+    path = []  # [(레벨, 제목)]
+    current = None
+    for line in text.splitlines():
+        match = HEADING_PATTERN.match(line)
+        # 문서 제목(# 하나)은 머리말로 취급
+        if match and len(match.group(1)) > 1:
+            level = len(match.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, line.strip()))
+            current = [" > ".join(title for _, title in path), [line]]
+            sections.append(current)
+        elif current is None:
+            preamble.append(line)
+        else:
+            current[1].append(line)
+
+    result = []
+    for title, lines in sections:
+        body = "\n".join(lines).strip()
+        # 하위 제목만 있고 내용이 없는 상위 섹션은 건너뜀
+        if len(lines) <= 1 or not "\n".join(lines[1:]).strip():
+            continue
+        for part in _split_long(body, max_chars):
+            if not part.startswith(lines[0]):
+                part = f"{title}\n{part}"
+            result.append(ManualSection(title, part))
+    return "\n".join(preamble).strip(), result
+
+
+def _split_long(body, max_chars):
+    if len(body) <= max_chars:
+        return [body]
+    parts = []
+    current = ""
+    for paragraph in body.split("\n\n"):
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            parts.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        parts.append(current)
+    return parts
+
+
+class ManualIndex:
+    """매뉴얼 한 버전을 섹션 단위로 나눠 BM25로 색인 (매뉴얼을 올릴 때 한 번만 생성)
+
+    요청마다 핵심 헤더(머리말 + 목차 + 응대 지침 등)와 질문 관련 상위 섹션만 보내
+    매번 매뉴얼 전체를 보내는 것보다 입력 토큰을 줄인다.
+    """
+
+    def __init__(self, text, version=None, core_keywords=DEFAULT_CORE_KEYWORDS, k1=1.5, b=0.75):
+        self.version = version  # manual_history.id
+        self.full_text = text
+        self.full_tokens = estimate_tokens(text)
+        self.k1 = k1
+        self.b = b
+
+        preamble, sections = split_sections(text)
+        core = [s for s in sections if any(k.lower() in s.title.lower() for k in core_keywords)]
+        self.sections = [s for s in sections if s not in core]
+
+        # 핵심 헤더: 머리말 + 전체 목차 + 항상 필요한 섹션 (프롬프트 캐시 대상)
+        titles = list(dict.fromkeys(s.title for s in sections))
+        header = [preamble] if preamble else []
+        header.append("매뉴얼 목차 (아래 참고 섹션에 없는 내용은 추측하지 말고 확인 후 안내):\n"
+                      + "\n".join(f"- {title}" for title in titles))
+        header.extend(s.text for s in core)
+        self.header = "\n\n".join(header)
+        self.header_tokens = estimate_tokens(self.header)
+
+        self.term_frequencies = [Counter(tokenize(s.text)) for s in self.sections]
+        self.lengths = [sum(tf.values()) for tf in self.term_frequencies]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        document_frequency = Counter()
+        for tf in self.term_frequencies:
+            document_frequency.update(tf.keys())
+        total = len(self.sections)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+        self.postings = defaultdict(list)  # 토큰 -> [섹션 번호]
+        for section_id, tf in enumerate(self.term_frequencies):
+            for term in tf:
+                self.postings[term].append(section_id)
+
+    def search(self, query, limit=3):
+        """질문과 관련된 섹션을 BM25 점수 순으로 반환"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for section_id in self.postings[term]:
+                tf = self.term_frequencies[section_id][term]
+                length_ratio = self.lengths[section_id] / self.average_length
+                scores[section_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length_ratio))
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [self.sections[section_id] for section_id, _ in ranked[:limit]]
+
+    def reference(self, query, limit=3):
+        """질문과 함께 보낼 참고 섹션 텍스트 (매뉴얼 순서대로 정렬)"""
+        found = self.search(query, limit)
+        found.sort(key=self.sections.index)
+        return "\n\n".join(section.text for section in found), sum(section.tokens for section in found)
+
+
+def load_questions(path):
+    """벤치마크용 질문 (FAQ.csv 질문 + intents.csv 예문)"""
+    questions = []
+    faq_path = os.path.join(path, "FAQ.csv")
+    if os.path.exists(faq_path):
+        with open(faq_path, encoding="utf-8") as f:
+            questions.extend(row["question"] for row in csv.DictReader(f))
+    intents_path = os.path.join(path, "intents.csv")
+    if os.path.exists(intents_path):
+        with open(intents_path, encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                examples = row.get("examples") or row.get("samples") or ""
+                questions.extend(e.strip() for e in examples.split(",") if e.strip())
+    return questions
+
+
+def benchmark(manual_path, questions_path, limit=3):
+    """매뉴얼 전체를 보낼 때와 검색 모드의 요청당 입력 토큰(시스템 프롬프트 + 참고 섹션) 비교"""
+    with open(manual_path, encoding="utf-8") as f:
+        index = ManualIndex(f.read())
+    questions = load_questions(questions_path)
+    if not questions:
+        print("질문 데이터가 없습니다.")
+        return
+
+    totals = sorted(index.header_tokens + index.reference(question, limit)[1] for question in questions)
+    average = sum(totals) / len(totals)
+    print(f"매뉴얼: {manual_path} (섹션 {len(index.sections)}개, 질문 {len(questions)}개, 상위 {limit}개 섹션)")
+    print(f"- 전체 매뉴얼: 요청당 {index.full_tokens} 토큰")
+    print(f"- 검색 모드: 핵심 헤더 {index.header_tokens} 토큰 + 참고 섹션 "
+          f"= 평균 {average:.0f}, p95 {totals[int(len(totals) * 0.95) - 1]}, 최대 {totals[-1]} 토큰")
+    print(f"- 절감률: {1 - average / index.full_tokens:.1%}")
+
+
+if __name__ == "__main__":
+    # 사용법: python manual_index.py "training bot KR/KR-muse-clinic-train.txt" "training bot KR/save" [섹션 수]
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else "training bot KR/KR-muse-clinic-train.txt",
+              sys.argv[2] if len(sys.argv) > 2 else "training bot KR/save",
+              int(sys.argv[3]) if len(sys.argv) > 3 else 3)
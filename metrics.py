@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+
+# 지연 시간 히스토그램 기본 구간 (초)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+class Counter:
+    """누적 카운터 (라벨별)"""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # 라벨 값 튜플 -> 값
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_label_text(self.labels, key)} {value}"
+
+
+class Gauge:
+    """현재 값 (set으로 설정하거나, callback이 있으면 수집할 때 계산)"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.callback = callback  # () -> 값 또는 {라벨 값 튜플: 값}
+        self.values = {}
+
+    def set(self, value, **labels):
+        self.values[tuple(labels.get(name, "") for name in self.labels)] = value
+
+    def samples(self):
+        values = self.values
+        if self.callback is not None:
+            result = self.callback()
+            values = result if isinstance(result, dict) else {(): result}
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labels, key)} {value}"
+
+
+class Histogram:
+    """구간별 누적 개수 + 합계 + 개수 (Prometheus histogram 형식)"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # 라벨 값 튜플 -> [구간별 개수..., 합계, 개수]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """with 블록 실행 시간 기록 (예외가 나도 기록)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        names = self.labels + ("le",)
+        for key, state in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield f"{self.name}_bucket{_label_text(names, key + (f'{bound:g}',))} {cumulative}"
+            yield f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {state[-1]}"
+            yield f"{self.name}_sum{_label_text(self.labels, key)} {state[-2]}"
+            yield f"{self.name}_count{_label_text(self.labels, key)} {state[-1]}"
+
+
+class Registry:
+    """지표 모음 (Prometheus 텍스트 형식으로 출력)"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), callback=None):
+        return self._register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.samples())
+            except Exception as e:
+                logging.getLogger("bot.metrics").warning("metric_failed name=%s error=%r", metric.name, e)
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host="127.0.0.1", port=9100):
+        """GET /metrics 요청에 응답하는 로컬 HTTP 서버 시작 (외부 의존성 없이 asyncio로 처리)"""
+        async def handle(reader, writer):
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+                # 나머지 헤더는 읽고 버림
+                while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                    pass
+                parts = request_line.decode("latin-1").split()
+                if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                    status, body = "200 OK", self.render().encode("utf-8")
+                else:
+                    status, body = "404 Not Found", b"not found\n"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+            except (asyncio.TimeoutError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+
+# 봇 전체에서 함께 쓰는 지표
+registry = Registry()
+
+message_latency = registry.histogram(
+    "bot_message_latency_seconds", "Discord 메시지 수신부터 답변 전송까지 걸린 시간", ("path",)
+)
+api_latency = registry.histogram(
+    "bot_api_latency_seconds", "Anthropic API 호출 시간 (키별)", ("key", "outcome")
+)
+db_latency = registry.histogram(
+    "bot_db_query_seconds", "DatabaseManager 메서드별 DB 작업 시간", ("method",)
+)
+backup_duration = registry.histogram(
+    "bot_backup_duration_seconds", "채팅/설정 백업 한 번에 걸린 시간"
+)
+tokens = registry.counter(
+    "bot_tokens_total", "API 토큰 사용량", ("direction",)
+)
+api_retries = registry.counter(
+    "bot_api_retries_total", "API 호출 재시도 횟수", ("status",)
+)
+cache_lookups = registry.counter(
+    "bot_cache_lookups_total", "캐시/바로 답변 조회 결과", ("cache", "result")
+)
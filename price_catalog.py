@@ -0,0 +1,277 @@
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+from collections import defaultdict
+
+# 같은 시술을 가리키는 여러 표기 (한국어/영어/광둥어) -> 대표 이름
+ALIASES = {
+    "울쎄라": "ulthera", "ultherapy": "ulthera", "ulthera": "ulthera",
+    "써마지": "thermage", "thermage": "thermage",
+    "슈링크": "shurink", "shurink": "shurink",
+    "올리지오": "oligio", "oligio": "oligio",
+    "덴서티": "density", "density": "density",
+    "앰페이스": "emface", "엠페이스": "emface", "emface": "emface",
+    "인모드": "inmode", "inmode": "inmode",
+    "포텐자": "potenza", "potenza": "potenza",
+    "리쥬란": "rejuran", "rejuran": "rejuran",
+    "쥬베룩": "juvelook", "juvelook": "juvelook",
+    "리즈네": "lizne", "lizne": "lizne",
+    "스킨바이브": "skinvive", "skinvive": "skinvive",
+    "보톡스": "botox", "botox": "botox", "톡신": "botox", "toxin": "botox", "肉毒": "botox",
+    "필러": "filler", "filler": "filler",
+    "피코": "pico", "pico": "pico",
+    "프락셀": "fraxel", "fraxel": "fraxel",
+    "시크릿": "secret", "secret": "secret",
+    "제모": "hairremoval", "脫毛": "hairremoval",
+    "샷": "shots", "shot": "shots", "shots": "shots", "發": "shots",
+}
+
+# 가격을 묻는 표현
+PRICE_KEYWORDS = ("가격", "얼마", "비용", "금액", "price", "cost", "how much", "幾錢", "價錢", "價格", "收費")
+
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+(?:\.\d+)?|[ㄱ-ㆎ가-힣]+|[一-鿿]+")
+
+
+def parse_price(value):
+    """가격 문자열을 숫자로 변환 ("1.690.000KRW" -> 1690000, "$1,980" -> 1980)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    digits = re.sub(r"[^\d.,]", "", value)
+    if not digits:
+        return None
+    # 점/쉼표가 천 단위 구분자로 쓰인 경우 (1.690.000, 1,980)
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", digits):
+        return int(re.sub(r"[.,]", "", digits))
+    try:
+        return float(digits.replace(",", ""))
+    except ValueError:
+        return None
+
+
+def parse_discount(value):
+    """할인율 문자열을 숫자로 변환 ("45.7%" -> 45.7)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    match = re.search(r"\d+(?:\.\d+)?", value)
+    return float(match.group()) if match else None
+
+
+def tokenize(text):
+    """검색용 토큰 (소문자, 숫자/한글/한자/영문 분리, 별칭은 대표 이름으로)"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        tokens.append(ALIASES.get(token, token))
+    # 띄어쓰기 없이 붙어 쓴 별칭 ("울쎄라가격", "ulthera300")도 찾음
+    for alias, canonical in ALIASES.items():
+        if alias in text and canonical not in tokens:
+            tokens.append(canonical)
+    return tokens
+
+
+class CatalogItem:
+    """가격표 항목 하나"""
+    __slots__ = ("name", "category", "price", "origin_price", "discount", "currency", "vat_included", "details", "source")
+
+    def __init__(self, name, category, price, origin_price, discount, currency, vat_included, details, source):
+        self.name = name
+        self.category = category  # 탭/카테고리 경로 ("Popular", "울쎄라(Ulthera)" 등)
+        self.price = price
+        self.origin_price = origin_price
+        self.discount = discount
+        self.currency = currency
+        self.vat_included = vat_included  # None이면 정보 없음
+        self.details = details
+        self.source = source
+
+    def key(self):
+        return (self.category, self.name)
+
+    def format(self):
+        """프롬프트/명령어 응답용 한 줄 요약"""
+        line = f"- {self.name}"
+        if self.category:
+            line += f" [{self.category}]"
+        if self.price is not None:
+            line += f": {self.price:,.0f} {self.currency}"
+            extras = []
+            if self.origin_price:
+                extras.append(f"정가 {self.origin_price:,.0f}")
+            if self.discount:
+                extras.append(f"{self.discount:g}% 할인")
+            if self.vat_included is False:
+                extras.append("VAT 별도")
+            if extras:
+                line += f" ({', '.join(extras)})"
+        if self.details:
+            line += f" - {self.details}"
+        return line
+
+
+class PriceCatalog:
+    """크롤링/학습 데이터의 가격 정보를 한 번 읽어 두고 시술명/별칭으로 검색"""
+
+    def __init__(self):
+        self.items = []  # 삭제된 항목 자리는 None
+        self.index = defaultdict(set)  # 토큰 -> 항목 번호
+        self.lengths = []  # 항목별 토큰 수 (짧은 이름이 정확히 맞으면 위로)
+        self.keys = {}  # (파일 이름, 카테고리, 이름) -> 항목 번호 (크롤링 변경 사항 반영용)
+        self.count = 0
+
+    @classmethod
+    def from_files(cls, paths):
+        catalog = cls()
+        for path in paths:
+            if os.path.exists(path):
+                catalog.load_file(path)
+        return catalog
+
+    def load_file(self, path, currency=None):
+        """JSON 파일의 name + price(또는 details)가 있는 항목을 모두 읽음"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if currency is None:
+            currency = "HKD" if "HK" in path else "KRW"
+        source = os.path.basename(path)
+        self._walk(data, [], currency, source)
+
+    def _walk(self, node, path, currency, source):
+        if isinstance(node, list):
+            for child in node:
+                self._walk(child, path, currency, source)
+            return
+        if not isinstance(node, dict):
+            return
+
+        if "name" in node and ("price" in node or "details" in node):
+            self.add(self._make_item(node, path, currency, source))
+            return
+
+        # 탭/카테고리/상위 시술 이름은 하위 항목의 카테고리로 사용
+        label = node.get("tab") or node.get("name") or node.get("category")
+        if node.get("subcategory"):
+            label = f"{label} {node['subcategory']}" if label else node["subcategory"]
+        child_path = path + [" ".join(label.split())] if isinstance(label, str) else path
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                self._walk(value, child_path, currency, source)
+
+    @staticmethod
+    def _make_item(node, path, currency, source):
+        price = node.get("price")
+        if isinstance(price, str) and "HKD" not in price and "$" in price:
+            currency = "HKD"
+        vat_notice = node.get("vat_notice", "")
+        if "vat_included" in node:
+            vat_included = node["vat_included"]
+        elif vat_notice:
+            vat_included = "excluded" not in vat_notice.lower()
+        else:
+            vat_included = None
+
+        details = node.get("details") or node.get("description") or ""
+        if node.get("package_price"):
+            details = f"{node.get('package_sessions', '')}회 패키지 {node['package_price']:,}".strip()
+        return CatalogItem(
+            name=" ".join(str(node["name"]).split()),
+            category=" / ".join(path),
+            price=parse_price(price),
+            origin_price=parse_price(node.get("origin_price")),
+            discount=parse_discount(node.get("discount")),
+            currency=currency,
+            vat_included=vat_included,
+            details=details if isinstance(details, str) else "",
+            source=source
+        )
+
+    @staticmethod
+    def _tokens(item):
+        return set(tokenize(f"{item.name} {item.category}"))
+
+    def add(self, item):
+        item_id = len(self.items)
+        self.items.append(item)
+        tokens = self._tokens(item)
+        self.lengths.append(len(tokens))
+        for token in tokens:
+            self.index[token].add(item_id)
+        self.keys[(item.source, *item.key())] = item_id
+        self.count += 1
+        return item_id
+
+    def remove(self, source, category, name):
+        """항목 삭제 (색인에서 그 항목의 토큰만 제거). 없으면 False"""
+        item_id = self.keys.pop((source, category, name), None)
+        if item_id is None:
+            return False
+        for token in self._tokens(self.items[item_id]):
+            item_ids = self.index.get(token)
+            if item_ids is not None:
+                item_ids.discard(item_id)
+                if not item_ids:
+                    del self.index[token]
+        self.items[item_id] = None
+        self.count -= 1
+        return True
+
+    def apply_change(self, source, kind, category, name, data=None):
+        """크롤링 변경 사항 하나 반영 (added/changed: data로 항목 교체, removed: 삭제)
+
+        바뀐 항목의 토큰만 다시 색인하므로 전체 가격표 크기와 관계없다.
+        """
+        self.remove(source, category, name)
+        if kind == "removed" or not data:
+            return None
+        currency = "HKD" if "HK" in source else "KRW"
+        return self.add(self._make_item({**data, "name": name}, [category] if category else [], currency, source))
+
+    def search(self, query, limit=8):
+        """질문과 관련된 항목 검색 (시술명/별칭이 하나도 안 맞으면 빈 목록)"""
+        tokens = set(tokenize(query))
+        scores = defaultdict(float)
+        matched_name = False
+        total = self.count or 1
+        for token in tokens:
+            item_ids = self.index.get(token)
+            if not item_ids:
+                continue
+            weight = math.log(1 + total / len(item_ids))
+            if not token.isdigit() and token != "shots":
+                matched_name = True
+            for item_id in item_ids:
+                scores[item_id] += weight
+        if not matched_name:
+            return []
+
+        ranked = sorted(
+            ((score / math.sqrt(self.lengths[item_id]), item_id) for item_id, score in scores.items()),
+            key=lambda pair: (-pair[0], pair[1])
+        )
+        return [self.items[item_id] for _, item_id in ranked[:limit]]
+
+    def __len__(self):
+        return self.count
+
+
+def is_price_question(text):
+    lowered = text.lower()
+    return any(keyword in lowered for keyword in PRICE_KEYWORDS)
+
+
+if __name__ == "__main__":
+    # 사용법: python price_catalog.py "울쎄라 300샷 얼마예요?" [JSON 파일 ...]
+    files = sys.argv[2:] or [
+        "crawl_kr/price.json", "crawl_kr/all_treatment_tabs.json",
+        "training bot KR/save/services.json", "training bot KR/save/promotions.json"
+    ]
+    catalog = PriceCatalog.from_files(files)
+    print(f"가격표 항목 {len(catalog)}개")
+    for item in catalog.search(sys.argv[1] if len(sys.argv) > 1 else "울쎄라 300샷 가격"):
+        print(item.format())
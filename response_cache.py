@@ -0,0 +1,110 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from faq_router import normalize
+
+
+def digest(value):
+    """캐시 키용 해시 (문자열이 아니면 JSON으로 변환)"""
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def make_key(question, system_version, permanent_digest, temperature, context_digest=""):
+    """정규화한 질문 + 시스템 프롬프트/매뉴얼 버전 + 고정 대화 해시 + 온도 (+ 이전 대화 해시)"""
+    return digest("\x1f".join((
+        normalize(question), system_version, permanent_digest, f"{temperature:g}", context_digest
+    )))
+
+
+class CachedResponse:
+    """캐시된 응답 하나"""
+    __slots__ = ("text", "scope", "input_tokens", "output_tokens", "created_at")
+
+    def __init__(self, text, scope, input_tokens=0, output_tokens=0, created_at=None):
+        self.text = text
+        self.scope = scope  # 무효화 단위 ("manual" 또는 채널 ID 문자열)
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.created_at = time.time() if created_at is None else created_at
+
+
+class ResponseCache:
+    """같은 질문에 대한 응답 캐시 (LRU + TTL, db가 있으면 Postgres에도 저장)
+
+    키에 시스템 프롬프트/매뉴얼 버전과 고정 대화 해시가 들어가므로 설정이 바뀌면 자연히 다른 키가 되고,
+    invalidate()로 바뀐 범위의 항목을 바로 지워 메모리/DB에 남지 않게 한다.
+    """
+
+    def __init__(self, max_entries=1000, ttl=86400, db=None):
+        self.max_entries = max_entries
+        self.ttl = ttl  # 초
+        self.db = db  # DatabaseManager (None이면 메모리만 사용)
+        self.entries = OrderedDict()  # 키 -> CachedResponse (오래된 순)
+        self.hits = 0
+        self.misses = 0
+        self.saved_input_tokens = 0
+        self.saved_output_tokens = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    async def get(self, key):
+        """캐시된 응답 텍스트 조회 (없거나 만료되었으면 None)"""
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry.created_at > self.ttl:
+            del self.entries[key]
+            entry = None
+        if entry is None and self.db is not None:
+            try:
+                row = await self.db.load_cached_response(key, self.ttl)
+            except Exception as e:
+                print(f"응답 캐시 조회 중 오류: {e}")
+                row = None
+            if row:
+                entry = CachedResponse(*row)
+                self._remember(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        self.saved_input_tokens += entry.input_tokens
+        self.saved_output_tokens += entry.output_tokens
+        return entry.text
+
+    async def put(self, key, text, scope, input_tokens=0, output_tokens=0):
+        entry = CachedResponse(text, scope, input_tokens, output_tokens)
+        self._remember(key, entry)
+        if self.db is not None:
+            try:
+                await self.db.save_cached_response(key, entry)
+            except Exception as e:
+                print(f"응답 캐시 저장 중 오류: {e}")
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def invalidate(self, scope):
+        """scope("manual" 또는 채널 ID)로 저장된 항목 삭제"""
+        scope = str(scope)
+        stale = [key for key, entry in self.entries.items() if entry.scope == scope]
+        for key in stale:
+            del self.entries[key]
+        if self.db is not None:
+            try:
+                await self.db.delete_cached_responses(scope)
+            except Exception as e:
+                print(f"응답 캐시 삭제 중 오류: {e}")
+        print(f"응답 캐시 무효화 ({scope}): {len(stale)}개 항목")
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,346 @@
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+# {{값}} 자리표시자 (채워서 보냄)
+SLOT_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+# [가격 정보]처럼 대괄호로 적은 자리표시자는 LLM이 채워야 하므로 직접 보낼 수 없음
+BRACKET_PATTERN = re.compile(r"\[[^\]\n]+\]")
+
+# 가격표에서 채울 수 있는 값 (메시지에 나온 시술을 검색)
+CATALOG_SLOTS = frozenset(("selected_service", "treatment_name", "service_price", "service_price_info"))
+
+# KR 형식은 언어별 답변이 있음: 메시지 글자로 언어 선택 (없으면 첫 번째 언어)
+HANGUL_PATTERN = re.compile(r"[가-힣]")
+VIETNAMESE_PATTERN = re.compile(r"[ăâđêôơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ]", re.I)
+LATIN_PATTERN = re.compile(r"[a-z]", re.I)
+LANGUAGES = ("korean", "english", "vietnamese")
+
+
+class Template:
+    """미리 컴파일한 답변 템플릿 ({{값}} -> str.format_map 형식으로 한 번 변환)"""
+    __slots__ = ("text", "slots", "format", "sendable")
+
+    def __init__(self, text):
+        self.text = text
+        pieces = SLOT_PATTERN.split(text)  # [글자, 값 이름, 글자, ...]
+        self.slots = frozenset(pieces[1::2])
+        self.format = "".join(
+            "{" + piece + "}" if i % 2 else piece.replace("{", "{{").replace("}", "}}")
+            for i, piece in enumerate(pieces)
+        ) if self.slots else text
+        # 대괄호 자리표시자는 {{값}}을 채운 뒤에도 남으므로 미리 확인
+        self.sendable = not BRACKET_PATTERN.search(SLOT_PATTERN.sub("", text))
+
+    def render(self, slots):
+        """값을 채운 답변 (빠진 값이 있거나 LLM이 채워야 하는 자리표시자가 있으면 None)"""
+        if not self.sendable:
+            return None
+        if not self.slots:
+            return self.text
+        for name in self.slots:
+            if slots.get(name) in (None, ""):
+                return None
+        return self.format.format_map(slots)
+
+
+def detect_language(text):
+    """메시지 언어 (KR 형식 답변 선택용, 알 수 없으면 None)"""
+    if not text:
+        return None
+    if HANGUL_PATTERN.search(text):
+        return "korean"
+    if VIETNAMESE_PATTERN.search(text):
+        return "vietnamese"
+    if LATIN_PATTERN.search(text):
+        return "english"
+    return None
+
+
+def catalog_slots(catalog, text, limit=8):
+    """메시지에 나온 시술을 가격표에서 찾아 템플릿 값으로 (찾지 못하면 빈 dict)"""
+    items = catalog.search(text, limit=limit) if catalog and text else []
+    if not items:
+        return {}
+    first = items[0]
+    slots = {
+        "selected_service": first.name,
+        "treatment_name": first.name,
+        "service_price_info": "\n".join(item.format() for item in items),
+    }
+    if first.price is not None:
+        slots["service_price"] = f"{first.price:,.0f} {first.currency}"
+    return slots
+
+
+def compile_responses(data):
+    """responses.json -> {의도/응답 ID: {언어: [Template, ...]}}
+
+    HK 형식: {"responses": [{intent, response_id, text, variations}]} (언어 하나, 변형 여러 개)
+    KR 형식: {분류: {키: {korean, english, vietnamese, intent?}}} (키 또는 intent로 찾음)
+    """
+    entries = {}
+    if isinstance(data, dict) and isinstance(data.get("responses"), list):
+        for response in data["responses"]:
+            texts = [response.get("text"), *(response.get("variations") or ())]
+            variants = {None: [Template(text) for text in texts if text]}
+            if not variants[None]:
+                continue
+            for key in (response.get("response_id"), response.get("intent")):
+                if key:
+                    entries.setdefault(key, variants)
+        return entries
+
+    for group in (data or {}).values():
+        if not isinstance(group, dict):
+            continue
+        for key, response in group.items():
+            if not isinstance(response, dict):
+                continue
+            variants = {
+                language: [Template(text)]
+                for language, text in response.items()
+                if language != "intent" and isinstance(text, str) and text
+            }
+            if not variants:
+                continue
+            entries.setdefault(key, variants)
+            if response.get("intent"):
+                entries.setdefault(response["intent"], variants)
+    return entries
+
+
+class ResponseRenderer:
+    """responses.json의 고정 답변을 채워서 보냄
+
+    템플릿은 읽을 때 한 번 컴파일하고, 변형(variations)은 돌아가며 사용해 같은 답변이 반복되지 않게 한다.
+    파일이 바뀌면 (reload_interval초마다 수정 시각 확인) 다시 읽음. 읽다가 실패하면 이전 템플릿 유지.
+    """
+
+    def __init__(self, path, catalog=None, price_limit=8, reload_interval=5.0):
+        self.path = path
+        self.catalog = catalog
+        self.price_limit = price_limit
+        self.reload_interval = reload_interval  # 0이면 다시 읽지 않음
+        self.entries = {}
+        self.cursors = {}  # (키, 언어) -> 다음에 쓸 변형 번호
+        self.signature = None
+        self.checked_at = 0.0
+        self.stats = {"rendered": 0, "missing": 0, "reloads": 0, "errors": 0}
+        self.load()
+
+    def load(self):
+        """파일을 읽어 템플릿 컴파일 (처음 읽기 실패는 예외, 다시 읽기 실패는 경고 후 이전 템플릿 유지)"""
+        stat = os.stat(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            entries = compile_responses(json.load(f))
+        self.entries = entries
+        self.cursors = {}
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.checked_at = time.monotonic()
+
+    def check_reload(self, now=None):
+        """파일이 바뀌었으면 다시 읽음 (True: 다시 읽음)"""
+        if not self.reload_interval:
+            return False
+        now = time.monotonic() if now is None else now
+        if now - self.checked_at < self.reload_interval:
+            return False
+        self.checked_at = now
+        try:
+            stat = os.stat(self.path)
+            if (stat.st_mtime_ns, stat.st_size) == self.signature:
+                return False
+            self.load()
+        except (OSError, ValueError) as e:
+            # 저장 중인 파일을 읽었거나 JSON이 잘못됨: 다음 확인 때 다시 시도
+            self.stats["errors"] += 1
+            logging.getLogger("bot.responses").warning("responses_reload_failed path=%s error=%r", self.path, e)
+            return False
+        self.stats["reloads"] += 1
+        return True
+
+    def variants(self, key, text=None):
+        """(키, 언어, 변형 목록), 없으면 (키, None, [])"""
+        entry = self.entries.get(key)
+        if not entry:
+            return key, None, []
+        language = detect_language(text) if len(entry) > 1 else None
+        if language not in entry:
+            language = next((language for language in LANGUAGES if language in entry), next(iter(entry)))
+        return key, language, entry[language]
+
+    def render(self, key, slots=None, text=None):
+        """의도/응답 ID의 답변 (slots: 대화에서 모은 값, text: 언어 선택과 가격표 검색에 쓸 메시지)
+
+        채울 수 없는 값이 있으면 None (LLM이 답변).
+        """
+        self.check_reload()
+        key, language, variants = self.variants(key, text)
+        if not variants:
+            return None
+        values = slots or {}
+        if any(name not in values for name in variants[0].slots & CATALOG_SLOTS):
+            values = {**catalog_slots(self.catalog, text, self.price_limit), **values}
+
+        # 다음 변형부터 차례로 시도 (변형마다 필요한 값이 다를 수 있음)
+        cursor = self.cursors.get((key, language), 0)
+        for offset in range(len(variants)):
+            index = (cursor + offset) % len(variants)
+            reply = variants[index].render(values)
+            if reply is not None:
+                self.cursors[(key, language)] = index + 1
+                self.stats["rendered"] += 1
+                return reply
+        self.stats["missing"] += 1
+        return None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# ---------- 정확도 확인 ----------
+
+def template_accuracy(router, renderer, threshold):
+    """의도 예문마다 자기 자신을 뺀 색인에서 의도 판단 + 렌더링 (faq_router.evaluate와 같은 방식)
+
+    (의도 답변(템플릿 또는 미리 읽은 고정 답변)을 보낸 예문 수, 그중 의도가 맞은 수).
+    여러 의도에 중복된 예문은 맞힐 수 없으므로 제외. renderer가 None이면 고정 답변만.
+    """
+    from faq_router import normalize
+
+    samples = [(doc_id, key, question) for doc_id, (kind, key, question, _) in enumerate(router.documents) if kind == "intent"]
+    labels = {}
+    for _, key, question in samples:
+        labels.setdefault(normalize(question), set()).add(key)
+    answered = correct = 0
+    for doc_id, key, question in samples:
+        if len(labels[normalize(question)]) > 1:
+            continue
+        matches = router.search(question, exclude=doc_id)
+        match = matches[0] if matches and matches[0].score >= threshold else None
+        if match is None or match.kind != "intent":
+            continue
+        if not ((renderer.render(match.key, text=question) if renderer else None) or match.answer):
+            continue
+        answered += 1
+        if match.key == key:
+            correct += 1
+    return answered, correct
+
+
+def check_accuracy(router, renderer, threshold, min_accuracy, min_samples=20):
+    """의도 매칭 답변을 바로 보내도 되는지: (통과 여부, 답변한 예문 수, 정확도)
+
+    답변한 예문이 min_samples개 미만이면 정확도를 측정했다고 볼 수 없으므로 통과하지 않음.
+    """
+    answered, correct = template_accuracy(router, renderer, threshold)
+    accuracy = correct / answered if answered else 0.0
+    return answered >= min_samples and accuracy >= min_accuracy, answered, accuracy
+
+
+# ---------- 마이크로벤치마크 ----------
+
+def _naive_render(text, slots):
+    """비교용: 매번 정규식으로 치환 (컴파일하지 않은 방식)"""
+    text = SLOT_PATTERN.sub(lambda match: str(slots.get(match.group(1), match.group(0))), text)
+    return None if SLOT_PATTERN.search(text) or BRACKET_PATTERN.search(text) else text
+
+
+def _timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def benchmark(path, repeat=20000, threshold=0.8):
+    """템플릿 로드/렌더링 속도와, 의도 판단 + 렌더링으로 API 호출 없이 답변할 수 있는 예문 비율 측정"""
+    from faq_router import FAQRouter
+
+    responses_path = os.path.join(path, "responses.json")
+    started = time.perf_counter()
+    renderer = ResponseRenderer(responses_path, reload_interval=0)
+    load_time = time.perf_counter() - started
+    templates = [template for entry in renderer.entries.values() for variants in entry.values() for template in variants]
+    print(f"데이터: {responses_path} (키 {len(renderer)}개, 템플릿 {len(set(map(id, templates)))}개, "
+          f"로드+컴파일 {load_time * 1000:.2f}ms)")
+
+    slots = {
+        "customer_name": "Kim Minji", "appointment_date": "2025-06-03", "appointment_time": "15:00",
+        "selected_branch": "TST", "selected_service": "Ulthera", "service_price": "9,800 HKD",
+    }
+    # 준비한 값으로 채울 수 있는 템플릿 중 값이 가장 많은 것
+    key = max(
+        (name for name in renderer.entries if renderer.variants(name)[2][0].render(slots) is not None),
+        key=lambda name: len(renderer.variants(name)[2][0].slots)
+    )
+    template = renderer.variants(key)[2][0]
+    compiled = _timed(lambda: template.render(slots), repeat)
+    naive = _timed(lambda: _naive_render(template.text, slots), repeat)
+    full = _timed(lambda: renderer.render(key, slots), repeat)
+    renderer.reload_interval = 5.0
+    checked = _timed(lambda: renderer.render(key, slots), repeat)
+    print(f"- 렌더링 ({key}, 값 {len(template.slots)}개): 컴파일 {compiled * 1e6:.2f}µs, "
+          f"매번 정규식 {naive * 1e6:.2f}µs, 변형 순환 포함 {full * 1e6:.2f}µs, 파일 변경 확인 포함 {checked * 1e6:.2f}µs")
+
+    # 같은 의도를 여러 번 렌더링할 때 변형이 돌아가는지
+    rotated = [renderer.render(key, slots) for _ in range(len(renderer.variants(key)[2]) * 2)]
+    print(f"- 변형 순환: {len(rotated)}번 중 서로 다른 답변 {len(set(rotated))}개")
+
+    # intents.csv 예문마다 자기 자신을 뺀 색인에서 의도 판단 + 렌더링 (faq_router.evaluate와 같은 방식)
+    router = FAQRouter.from_directory(path)
+    samples = [(doc_id, question) for doc_id, (kind, _, question, _) in enumerate(router.documents) if kind == "intent"]
+    fixed = rendered = 0
+    latencies = []
+    for doc_id, question in samples:
+        started = time.perf_counter()
+        matches = router.search(question, exclude=doc_id)
+        match = matches[0] if matches and matches[0].score >= threshold else None
+        reply = renderer.render(match.key, text=question) if match and match.kind == "intent" else None
+        latencies.append(time.perf_counter() - started)
+        if match and match.answer:
+            fixed += 1
+        if match and (reply or match.answer):
+            rendered += 1
+    latencies.sort()
+    total = len(latencies)
+    if total:
+        print(f"- 의도 예문 {total}개 중 API 호출 없이 답변 (임계값 {threshold}): "
+              f"고정 답변만 {fixed / total:.1%} -> 템플릿 렌더링 포함 {rendered / total:.1%}")
+        print(f"- 의도 판단+렌더링: 평균 {sum(latencies) / total * 1000:.3f}ms, "
+              f"p95 {latencies[int(total * 0.95) - 1] * 1000:.3f}ms")
+    answered, correct = template_accuracy(router, ResponseRenderer(responses_path, reload_interval=0), threshold)
+    print(f"- 의도 답변 정확도 (임계값 {threshold}, 고정 답변 포함): {correct}/{answered}" + (f" ({correct / answered:.1%})" if answered else ""))
+
+
+def check(path, threshold, min_accuracy, min_samples=20):
+    """의도 답변(템플릿/고정 답변) 정확도가 기준 미만이면 False (CLI에서는 종료 코드 1)"""
+    from faq_router import FAQRouter
+
+    router = FAQRouter.from_directory(path)
+    renderer = ResponseRenderer(os.path.join(path, "responses.json"), reload_interval=0)
+    passed, answered, accuracy = check_accuracy(router, renderer, threshold, min_accuracy, min_samples)
+    print(f"데이터: {path} (임계값 {threshold}): 의도 답변 {answered}개, 정확도 {accuracy:.1%} "
+          f"(기준 {min_accuracy:.0%}, 최소 {min_samples}개) -> {'통과' if passed else '실패'}")
+    return passed
+
+
+if __name__ == "__main__":
+    # 사용법: python response_templates.py "training bot HK/save" [임계값] [반복 횟수]
+    #         python response_templates.py check "training bot HK/save" [임계값] [최소 정확도] [최소 예문 수]
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        sys.exit(0 if check(sys.argv[2] if len(sys.argv) > 2 else "training bot KR/save",
+                            threshold=float(sys.argv[3]) if len(sys.argv) > 3 else 0.9,
+                            min_accuracy=float(sys.argv[4]) if len(sys.argv) > 4 else 0.9,
+                            min_samples=int(sys.argv[5]) if len(sys.argv) > 5 else 20) else 1)
+    else:
+        benchmark(sys.argv[1] if len(sys.argv) > 1 else "training bot KR/save",
+                  threshold=float(sys.argv[2]) if len(sys.argv) > 2 else 0.8,
+                  repeat=int(sys.argv[3]) if len(sys.argv) > 3 else 20000)
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from dialog_flow import DialogEngine, DialogFlow, parse_name, parse_time
+from faq_router import FAQRouter
+
+KR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "training bot KR", "save")
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return DialogEngine(DialogFlow.from_directory(KR), FAQRouter.from_directory(KR), threshold=0.6)
+
+
+def test_parse_time_ignores_durations():
+    assert parse_time("울쎄라 시술 시간은 1시간 정도인가요?") is None
+    assert parse_time("내일 2시간 정도 괜찮을까요") is None
+    assert parse_time("내일 오후 3시 반") == "15:30"
+
+
+def test_parse_name_rejects_replies_and_list_pieces():
+    assert parse_name("네", alone=True) is None
+    assert parse_name("내일 가능해요? 가격이 얼마죠, 울쎄라") is None
+    assert parse_name("김민지", alone=True) == "김민지"
+    assert parse_name("제 이름은 김민지입니다") == "김민지"
+
+
+@pytest.mark.parametrize("text", [
+    "울쎄라 시술 시간은 1시간 정도인가요?",
+    "내일 가능해요? 가격이 얼마죠, 울쎄라",
+    "내일 2시간 정도 괜찮을까요",
+])
+def test_questions_are_not_collected_as_reservation_info(engine, text):
+    key = ("channel", text)
+    assert engine.handle(key, "예약하고 싶어요", min_threshold=0.8).reply
+    assert engine.handle(key, text, min_threshold=0.8) is None
+    assert engine.session(key).slots is None
+
+
+def test_completed_reservation_is_answered_by_llm(engine):
+    key = ("channel", "reservation")
+    engine.handle(key, "예약하고 싶어요", min_threshold=0.8)
+    turn = engine.handle(key, "예약 정보는 김민지, 1990-05-17입니다", min_threshold=0.8)
+    assert turn.intent == "provide_reservation_info" and turn.reply
+    engine.handle(key, "guest@example.com, 내일 오후 3시", min_threshold=0.8)
+    turn = engine.handle(key, "김민지", min_threshold=0.8)
+    # 예약이 실제로 기록되지 않았으므로 완료 안내를 직접 보내지 않음
+    assert turn.reply is None
+    assert turn.slots["customer_name"] == "김민지"
@@ -0,0 +1,23 @@
+from discord_stream import DISCORD_MESSAGE_LIMIT, split_message
+
+
+def test_split_message_long_run_of_combining_marks():
+    # 자를 위치를 앞으로 당길 곳이 없어도 끝나야 함 (예전에는 무한 루프)
+    text = "a" + "\u0301" * 5000
+    chunks = split_message(text)
+    assert "".join(chunks) == text
+    assert all(len(chunk) <= DISCORD_MESSAGE_LIMIT for chunk in chunks)
+
+
+def test_split_message_long_run_of_zwj():
+    text = "\u200d" * 4500
+    chunks = split_message(text)
+    assert "".join(chunks) == text
+    assert all(len(chunk) <= DISCORD_MESSAGE_LIMIT for chunk in chunks)
+
+
+def test_split_message_keeps_combining_mark_with_base():
+    text = "x" * 1995 + "é" + "y" * 100
+    chunks = split_message(text)
+    assert "".join(chunks) == text
+    assert not chunks[1].startswith("\u0301")
@@ -0,0 +1,45 @@
+from faq_router import FAQRouter, evaluate, negated
+
+
+def _router():
+    router = FAQRouter()
+    router.add("faq", 0, "주차 가능한가요?", "건물 지하 주차장을 이용해 주세요.")
+    router.add("intent", "greeting", "안녕하세요", "안녕하세요! 무엇을 도와드릴까요?")
+    router.add("intent", "parking", "주차 가능한가요?", "주차는 2시간 무료입니다.")
+    router.build()
+    return router
+
+
+def test_intent_answers_follow_intent_threshold():
+    router = _router()
+    assert router.route("안녕하세요", 0.8).kind == "intent"
+    # 고정 답변이 있는 의도도 정확도를 확인하지 않았으면 (0) 바로 답변하지 않음
+    assert router.route("안녕하세요", 0.8, intent_threshold=0) is None
+    assert router.route("안녕하세요", 0.8, intent_threshold=0.9).kind == "intent"
+
+
+def test_faq_rows_still_use_faq_threshold():
+    router = _router()
+    match = router.route("주차 가능한가요?", 0.8, intent_threshold=0)
+    assert match.kind == "faq" and match.answer == "건물 지하 주차장을 이용해 주세요."
+
+
+def test_negated_question_is_not_answered_with_positive_faq():
+    router = FAQRouter()
+    router.add("faq", 0, "워크인 방문이 가능한가요?", "네, 워크인 방문도 가능합니다.")
+    router.add("faq", 1, "주차장이 있나요?", "건물 지하 주차장을 이용해 주세요.")
+    router.build()
+    assert router.route("워크인 방문이 가능한가요?", 0.8).key == 0
+    assert router.route("워크인 방문이 불가능한가요?", 0.8) is None
+
+
+def test_negated_ignores_cantonese_question_forms():
+    assert not negated("可唔可以改時間?")
+    assert not negated("有冇禮券?")
+    assert negated("我可唔可以唔預約直接去?")
+
+
+def test_evaluate_with_only_ambiguous_examples(tmp_path, capsys):
+    (tmp_path / "intents.csv").write_text('intent,samples\na,"같은 문장"\nb,"같은 문장"\n', encoding="utf-8")
+    evaluate(str(tmp_path))
+    assert "평가할 수 있는 의도 예문이 없습니다" in capsys.readouterr().out
@@ -0,0 +1,47 @@
+import json
+import os
+
+from faq_router import FAQRouter
+from response_templates import ResponseRenderer, check_accuracy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIN_ACCURACY = 0.9
+
+
+def _write_dataset(path, intents, responses):
+    with open(os.path.join(path, "intents.csv"), "w", encoding="utf-8") as f:
+        f.write("intent,samples\n")
+        for intent, samples in intents.items():
+            f.write(f'{intent},"{",".join(samples)}"\n')
+    with open(os.path.join(path, "responses.json"), "w", encoding="utf-8") as f:
+        json.dump({"responses": [{"intent": intent, "text": text} for intent, text in responses.items()]}, f)
+
+
+def _check(path, threshold, min_samples=20):
+    router = FAQRouter.from_directory(path)
+    renderer = ResponseRenderer(os.path.join(path, "responses.json"), reload_interval=0)
+    return check_accuracy(router, renderer, threshold, MIN_ACCURACY, min_samples)
+
+
+def test_kr_templates_fail_accuracy_floor():
+    # KR은 임계값을 넘은 의도 매칭도 대부분 틀리므로 템플릿 답변을 켜면 안 됨
+    passed, answered, accuracy = _check(os.path.join(ROOT, "training bot KR", "save"), 0.8)
+    assert not passed
+    assert accuracy < MIN_ACCURACY
+
+
+def test_accurate_templates_pass(tmp_path):
+    _write_dataset(tmp_path, {
+        "opening_hours": ["영업시간 언제", "영업시간 몇시", "영업시간 알려줘"],
+        "parking": ["주차장 있어", "주차장 위치", "주차장 요금"],
+    }, {"opening_hours": "10시부터 8시까지 영업합니다.", "parking": "건물 지하 주차장을 이용해 주세요."})
+    passed, answered, accuracy = _check(tmp_path, 0.1, min_samples=4)
+    assert passed
+    assert answered >= 4 and accuracy == 1.0
+
+
+def test_unmeasured_templates_fail(tmp_path):
+    # 임계값을 넘은 예문이 없으면 정확도를 측정할 수 없으므로 통과하지 않음
+    _write_dataset(tmp_path, {"opening_hours": ["영업시간", "몇 시까지 하나요"]}, {"opening_hours": "10시부터 8시까지 영업합니다."})
+    passed, answered, _ = _check(tmp_path, 0.99, min_samples=1)
+    assert not passed and answered == 0